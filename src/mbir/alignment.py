@@ -991,7 +991,7 @@ def project_mask(mask0, projector, reproject=False, mask_threshold=0.5):
     #inverse projection
     if reproject:
         mask_2d = mask0.reshape(-1)  # vectorise
-        mask_2d_projected=projector.weight.T.dot(mask_2d).reshape(projector.dim) #project and reshape
+        mask_2d_projected=projector.jac_T_dot(mask_2d).reshape(projector.dim) #project and reshape
         if mask_2d_projected.shape[0] == 1:
             mask00=mask_2d_projected[0,...] #make into image
         else:
@@ -1193,10 +1193,14 @@ def align_wire_directions(phasemaps, tilts, plot_fits=False, plot_aligned_masks=
     
     
 def make_projection_data(phase_maps, zrots, xtilts, camera_rots, pixel_spacing, center = None, subcount=5, dim=None, 
-                                plot_results=True, save_data=False, data_path="data.pickle"):
+                                plot_results=True, save_data=False, data_path="data.pickle", projector_cache=None,
+                                n_jobs=1, executor=None):
     """
     add phasemaps into a pr.DataSet object.
     calculates the projectors for each phasemap as well
+    projector_cache: pr.ProjectorCache, reuses projectors with the same geometry instead of recalculating them.
+    n_jobs: int, number of processes calculating the projectors in parallel. -1 uses all cores.
+    executor: concurrent.futures.Executor, used instead of a new process pool if given.
     """
     
     if dim==None:
@@ -1224,18 +1228,12 @@ def make_projection_data(phase_maps, zrots, xtilts, camera_rots, pixel_spacing,
     RP_Projector=pr.projector.RotTiltProjector
     
     print("starting projector calculation")
-    for i in range(len(phase_maps)):
-        
-        #create phasemap object
-        phasemap=phase_maps[i]
-        
-        x_ang=x_angs[i]
-        z_ang=z_angs[i]
-        c_ang=c_angs[i]
-        
-        projector = RP_Projector(dim, z_ang, x_ang, camera_rotation=c_ang, center=center[i], subcount=subcount, dim_uv=phasemap.dim_uv)
-        print("%d/%d"%(i+1,len(phase_maps)),end="; ")
-
+    args_list = [(dim, z_angs[i], x_angs[i]) for i in range(len(phase_maps))]
+    kwargs_list = [dict(camera_rotation=c_angs[i], center=center[i], subcount=subcount, dim_uv=phase_maps[i].dim_uv)
+                   for i in range(len(phase_maps))]
+    projectors = pr.make_projectors(RP_Projector, args_list, kwargs_list, n_jobs=n_jobs, executor=executor,
+                                    projector_cache=projector_cache, verbose=True)
+    for phasemap, projector in zip(phase_maps, projectors):
         data.append(phasemap, projector)
     print("projector calculation finished\n")
         
@@ -1318,7 +1316,8 @@ def rotate_3d_mask(data_series, plot_results=True):
           ["z projection after rotation","y projection after rotation"])
 
 
-def project_scalar_array(array, zrot=0, xrot=0, crot=0, dim_uv=None, subcount=1, center=None, center_offset=(0,0,0)):
+def project_scalar_array(array, zrot=0, xrot=0, crot=0, dim_uv=None, subcount=1, center=None, center_offset=(0,0,0),
+                         projector_cache=None):
     scalar_field = pr.ScalarData(1, array.copy())
     RP_Projector=pr.projector.RotTiltProjector
     dim=array.shape
@@ -1327,8 +1326,12 @@ def project_scalar_array(array, zrot=0, xrot=0, crot=0, dim_uv=None, subcount=1,
         center = (dim_z / 2.+center_offset[0], dim_y / 2.+center_offset[1], dim_x / 2.+center_offset[2])
     if dim_uv is None:
         dim_uv=(np.max(array.shape),np.max(array.shape))
-    projector = RP_Projector(dim, np.radians(zrot), np.radians(xrot), camera_rotation=np.radians(crot), 
-                             subcount=subcount, dim_uv=dim_uv, center=center)
+    if projector_cache is None:
+        projector = RP_Projector(dim, np.radians(zrot), np.radians(xrot), camera_rotation=np.radians(crot), 
+                                 subcount=subcount, dim_uv=dim_uv, center=center)
+    else:
+        projector = projector_cache.get(RP_Projector, dim, np.radians(zrot), np.radians(xrot), camera_rotation=np.radians(crot), 
+                                        subcount=subcount, dim_uv=dim_uv, center=center)
     field_proj = projector(scalar_field)
     proj=field_proj.field[0,...]
     return(proj)
@@ -16,7 +16,7 @@ from .simulation import simulate_reconstruction
 from .alignment import find_edges, make_projection_data
 
 def reconstruct_from_phasemaps_simple(data, lam=1e-3, max_iter=100, ramp_order=1, 
-                               verbose=True, plot_input=False, plot_results=True, b_0 = 1, **kwargs):
+                               verbose=True, plot_input=False, plot_results=True, b_0 = 1, pool=None, **kwargs):
     """
     Takes a dataset of phasemaps created by 'make_phasemap_dataset'functin and returns a 3D Magnetisation vector field
     Reconstructs the magnetisation.
@@ -30,9 +30,13 @@ def reconstruct_from_phasemaps_simple(data, lam=1e-3, max_iter=100, ramp_order=1
     plot_results=True
     kwargs passed on as phasemap.plot_phase(**kwargs)
     b_0=1 units of mag field in T.
+    pool=None #optional running pr.WorkerPool of the same data. Its processes are reused instead of setting up a new forward model.
     """
 
-    fwd_model = pr.ForwardModel(data, ramp_order=ramp_order) #define a forward model
+    if pool is None:
+        fwd_model = pr.ForwardModel(data, ramp_order=ramp_order) #define a forward model
+    else:
+        fwd_model = pr.DistributedForwardModel(data, ramp_order=ramp_order, pool=pool) #pool keeps running after finalize
     reg = pr.FirstOrderRegularisator(data.mask, lam, add_params=fwd_model.ramp.n) #define the regularisator order
     cost = pr.Costfunction(fwd_model, reg) #define the cost function
     # Reconstruct
@@ -317,7 +321,7 @@ class ExchangeRegulariser(pr.Regularisator):
 def reconstruct_from_phasemaps(data, lam=1e-3, max_iter=100, ramp_order=1, 
                                verbose=True, plot_input=True, plot_results=True, b_0 = 1, 
                                    regulariser_type='exchange', mean=None, abs_tol=1e-20, rel_tol=1e-20,
-                                   mag_0=None, reg_mask=None):
+                                   mag_0=None, reg_mask=None, pool=None):
     """
     Takes a dataset of phasemaps created by 'make_phasemap_dataset'functin and returns a 3D Magnetisation vector field
     Reconstructs the magnetisation.
@@ -331,9 +335,14 @@ def reconstruct_from_phasemaps(data, lam=1e-3, max_iter=100, ramp_order=1,
     plot_results=True
     kwargs passed on as phasemap.plot_phase(**kwargs)
     b_0=1 units of mag field in T.
+    mag_0=None #starting magnetisation (warm start), e.g. the result of a previous reconstruction.
+    pool=None #optional running pr.WorkerPool of the same data. Its processes are reused instead of setting up a new forward model.
     """
 
-    fwd_model = pr.ForwardModel(data, ramp_order=ramp_order) #define a forward model. How are ramps implemented?
+    if pool is None:
+        fwd_model = pr.ForwardModel(data, ramp_order=ramp_order) #define a forward model. How are ramps implemented?
+    else:
+        fwd_model = pr.DistributedForwardModel(data, ramp_order=ramp_order, pool=pool) #pool keeps running after finalize
     if regulariser_type == 'amplitude':
         lam1,lam2 = lam
         reg1 = AmplitudeRegulariser(data_mask=data.mask, reg_mask=reg_mask, lam=lam1, add_params=fwd_model.ramp.n)
@@ -450,13 +459,17 @@ def append_valid_costfunction_values (cost_list, cost_function):
 def translate_trim_data_series(data_series, auto_centre=True, x_extension = 0, 
                                last_valid_x_slice = None, tip_x_position = None,  
                                free_space_y_width = 0, free_space_z_width = 0,
-                            z_shift=0, y_shift=0, plot_results=False, subcount=1): 
+                            z_shift=0, y_shift=0, plot_results=False, subcount=1,
+                            projector_cache=None, n_jobs=1, executor=None): 
 
     """
     move the mask to the improved position, trim empty space, add a region for edge moments, and recalculate the projectors.
     If 'autocentre = True' measures the extent of the mask and centres it to remove as much free space as possible.
     Shifts are implemented as reductions to cropping and will fail 
     if they would translate outside the space defined by the mask.
+    'projector_cache' (pr.ProjectorCache) reuses projectors with the same geometry instead of recalculating them.
+    'n_jobs' (int) number of processes calculating the projectors in parallel. -1 uses all cores.
+    'executor' (concurrent.futures.Executor) used instead of a new process pool if given.
     """
     
     data = data_series
@@ -517,7 +530,9 @@ def translate_trim_data_series(data_series, auto_centre=True, x_extension = 0,
         
     
     data_e =  make_projection_data(phasemaps, zrots, xtilts, camera_rots, data.a, center = centers, dim=dim, 
-                                     plot_results=False, save_data=False, subcount=subcount)
+                                     plot_results=False, save_data=False, subcount=subcount, 
+                                     projector_cache=projector_cache, n_jobs=n_jobs,
+                                     executor=executor)
     
     #reshape the original mask 
     dz, dy, dx = data_e.dim
@@ -29,7 +29,7 @@ def simulate_reconstruction(data, magdata_rec, cost, b_0=1, unit='rad', plot_res
         mag_projection=projector(magdata_rec) #project magnetic field
         
         #calculate phase map
-        mapper_kernel=pr.Kernel(data.a, phasemap.dim_uv, b_0=b_0) #define phase calculator parameters
+        mapper_kernel=pr.get_kernel(data.a, phasemap.dim_uv, b_0=b_0) #shared kernel from the global cache
         phas_mapper=pr.PhaseMapperRDFC(mapper_kernel) #create a phase calculator
         phasemap_r=phas_mapper(mag_projection)
         
@@ -57,7 +57,8 @@ def simulate_reconstruction(data, magdata_rec, cost, b_0=1, unit='rad', plot_res
 
 
 def make_phasemap_dataset (projection_x_ang, projection_z_ang, mag_field, b_s, camera_rotation=0, center=None,
-                           subcount=5, b_unit=1, mask_threshold=0, mask_overlap_threshold=1, plot_results=False, dim_uv=None):
+                           subcount=5, b_unit=1, mask_threshold=0, mask_overlap_threshold=1, plot_results=False, dim_uv=None,
+                           projector_cache=None, n_jobs=1, executor=None):
     """
     TODO: Include option to calculate phase for voxels that are not visible in the phase images.
     
@@ -78,6 +79,9 @@ def make_phasemap_dataset (projection_x_ang, projection_z_ang, mag_field, b_s, c
         Magnetisation = b_s * mag_field / b_unit
     mask_threshold=0 #field amplitude > thresholf is included in the mask
     mask_overlap_threshold=0.9 #if calculating 3D mask from multiple 2D masks, point is included if >90% of masks overlap there
+    projector_cache=pr.ProjectorCache(path) #reuses projectors with the same geometry instead of recalculating them
+    n_jobs=1 #number of processes calculating the projectors in parallel. -1 uses all cores.
+    executor=None #concurrent.futures.Executor, used instead of a new process pool if given.
     
     
     """
@@ -92,16 +96,18 @@ def make_phasemap_dataset (projection_x_ang, projection_z_ang, mag_field, b_s, c
     if dim_uv==None:
         dim_uv=(np.max(dim), np.max(dim))
     
-    mapper_kernel=pr.Kernel(a_spacing, dim_uv, b_0=b_s) #define phase calculator parameters
+    mapper_kernel=pr.get_kernel(a_spacing, dim_uv, b_0=b_s) #shared kernel from the global cache
     phas_mapper=pr.PhaseMapperRDFC(mapper_kernel) #create a phase calculator
 
+    #define the projections
+    args_list = [(dim, z_ang, x_ang) for z_ang, x_ang in zip(projection_z_ang, projection_x_ang)]
+    kwargs = dict(camera_rotation=camera_rotation, center=center, subcount=subcount, dim_uv=dim_uv)
+    projectors = pr.make_projectors(RP_Projector, args_list, [kwargs] * len(args_list), n_jobs=n_jobs,
+                                    executor=executor, projector_cache=projector_cache)
+
     #inside for loop
     for i in range(len(projection_x_ang)):
-        x_ang=projection_x_ang[i]
-        z_ang=projection_z_ang[i]
-        
-        #define the projection
-        projector = RP_Projector(dim, z_ang, x_ang, camera_rotation=camera_rotation, center=center, subcount=subcount, dim_uv=dim_uv)
+        projector = projectors[i]
         mag_projection=projector(mag_field) #project magnetic field
 
         #create phase map
@@ -145,8 +145,12 @@ class Costfunction(object):
         if self.track_cost_iterations > 0 and self.cnt_hess_dot % self.track_cost_iterations == 0:
             self.calculate_costs(vector)
             # print(self.cnt_hess_dot, len(self.chisq_a)) # TODO:!!!
-        return (2 * self.fwd_model.jac_T_dot(x, self.Se_inv.dot(self.fwd_model.jac_dot(x, vector)))
-                + self.regularisator.hess_dot(x, vector))
+        if hasattr(self.fwd_model, 'normal_dot') and self.Se_inv is self.fwd_model.Se_inv:
+            normal = self.fwd_model.normal_dot(x, vector)  # Fused, if the model supports it!
+        else:
+            weighted = self.Se_inv.dot(self.fwd_model.jac_dot(x, vector))
+            normal = self.fwd_model.jac_T_dot(x, weighted)
+        return 2 * normal + self.regularisator.hess_dot(x, vector)
 
     def hess_diag(self, _):
         # TODO: needed for preconditioner?
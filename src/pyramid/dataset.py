@@ -13,10 +13,10 @@ and additional data like corresponding projectors."""
 import logging
 from numbers import Number
 
-from pyramid.kernel import Kernel, KernelCharge
+from pyramid.kernel import KernelCharge, get_kernel
 from pyramid.phasemap import PhaseMap
 from pyramid.phasemapper import PhaseMapperRDFC, PhaseMapperCharge
-from pyramid.projector import Projector
+from pyramid.projector import Projector, StackedProjector
 from pyramid.fielddata import ScalarData
 from pyramid.ramp import Ramp
 
@@ -186,7 +186,7 @@ class DataSet(object):
         elif phasemapper is not None:  # Use given one (do nothing):
             pass
         else:  # Create new standard (RDFC) phasemapper:
-            phasemapper = PhaseMapperRDFC(Kernel(self.a, dim_uv, self.b_0))
+            phasemapper = PhaseMapperRDFC(get_kernel(self.a, dim_uv, self.b_0))
         self._phasemapper_dict[key] = phasemapper
         # Append everything to the lists (just contain pointers to objects!):
         self._phasemaps.append(phasemap)
@@ -262,6 +262,28 @@ class DataSet(object):
             phasemaps.append(phasemap)
         return phasemaps
 
+    def get_stacked_projector(self, compressed=False):
+        """Stack the weight matrices of all projectors into one :class:`~.StackedProjector`.
+
+        Parameters
+        ----------
+        compressed: bool, optional
+            If True, the stacked projector only acts on the voxels inside the 3D `mask` (see
+            :func:`~.Projector.compress`). Default is False.
+
+        Returns
+        -------
+        stacked_projector : :class:`~.StackedProjector`
+            Projector, which projects all images at once. Its `hook_points` are the same as the
+            ones of the phase maps, but doubled for the `u`- and `v`-components.
+
+        """
+        self._log.debug('Calling get_stacked_projector')
+        stacked_projector = StackedProjector(self.projectors)
+        if compressed:
+            stacked_projector = stacked_projector.compress(self.mask)
+        return stacked_projector
+
     def set_Se_inv_block_diag(self, cov_list):
         """Set the Se_inv matrix as a block diagonal matrix
 
@@ -327,7 +349,7 @@ class DataSet(object):
         for i, projector in enumerate(self.projectors):
             mask_2d = self.phasemaps[i].mask.reshape(-1)  # 2D mask
             # Add extrusion of 2D mask:
-            mask_2d_projected=projector.weight.T.dot(mask_2d).reshape(self.dim)
+            mask_2d_projected=projector.jac_T_dot(mask_2d).reshape(self.dim)
             #correction for space-streching by z-rotation
             mask_2d_projected[mask_2d_projected > 0.9] = 1.0  #threshold 0.9 works
             mask_3d += mask_2d_projected
@@ -751,7 +773,7 @@ class DataSetCharge(object):
             for i, projector in enumerate(self.projectors):
                 mask_2d = self.phasemaps[i].mask.reshape(-1)  # 2D mask
                 # Add extrusion of 2D mask:
-                mask_3d += projector.weight.T.dot(mask_2d).reshape(self.dim)
+                mask_3d += projector.jac_T_dot(mask_2d).reshape(self.dim)
             self.mask = np.where(mask_3d >= threshold * self.count, True, False)
 
     def save(self, filename, overwrite=True):
@@ -515,19 +515,26 @@ class LCurve(object):
         with open('{}/lcurve.pkl'.format(self.save_dir), 'rb') as f:
             self.l_dict = pickle.load(f)
 
-    def calculate(self, lambdas, overwrite=False):
+    def calculate(self, lambdas, overwrite=False, warm_start=False):
         # TODO: Docstring!
+        # The forward model (e.g. attached to a WorkerPool) and the costfunction are set up once,
+        # only the regularisator is swapped for each lambda. With `warm_start`, each
+        # reconstruction starts from the previous result (lambdas should be sorted for this).
         lams = np.atleast_1d(lambdas)
+        cost = Costfunction(fwd_model=self.fwd_model)
+        mag_0, ramp_0 = None, None
         for lam in tqdm(lams, disable=not self.verbose):
             if lam not in self.l_dict.keys() or overwrite:
-                # Create new regularisator and costfunction: # TODO: Not hardcoding FirstOrder!
-                # TODO: Not necessary if lambda can be extracted from regularisator? self.cost?
-                reg = FirstOrderRegularisator(self.fwd_model.data_set.mask, lam,
-                                              add_params=self.fwd_model.ramp.n)
-                cost = Costfunction(fwd_model=self.fwd_model, regularisator=reg)
+                # Swap in new regularisator: # TODO: Not hardcoding FirstOrder!
+                cost.regularisator = FirstOrderRegularisator(self.fwd_model.data_set.mask, lam,
+                                                             add_params=self.fwd_model.ramp.n)
                 # Reconstruct:
-                magdata_rec = reconstruction.optimize_linear(cost, max_iter=self.max_iter,
+                magdata_rec = reconstruction.optimize_linear(cost, mag_0=mag_0, ramp_0=ramp_0,
+                                                             max_iter=self.max_iter,
                                                              verbose=self.verbose)
+                if warm_start:  # Copy, optimize_linear uses mag_0 as scratch space:
+                    mag_0 = magdata_rec.copy()
+                    ramp_0 = self.fwd_model.ramp if self.fwd_model.ramp.n > 0 else None
                 # Add new values to dictionary:
                 chisq_m, chisq_a = cost.chisq_m[-1], cost.chisq_a[-1]  # TODO: chisq_m list or not?
                 self.l_dict[lam] = (chisq_m, chisq_a)
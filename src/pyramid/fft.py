@@ -2,19 +2,30 @@
 # Copyright 2014 by Forschungszentrum Juelich GmbH
 # Author: J. Caron
 #
-"""Custom FFT module with numpy and FFTW support.
+"""Custom FFT module with numpy, scipy and FFTW support.
 
 This module provides custom methods for FFTs including inverse, adjoint and real variants. The
-FFTW library is supported and is used as a default if the import succeeds. Otherwise the numpy.fft
-pack will be used. FFTW objects are saved in a cache after creation which speeds up further similar
-FFT operations.
+FFTW library is supported and is used as a default if the import succeeds. Otherwise the
+multithreaded scipy.fft pack (or, if scipy is missing, the numpy.fft pack) will be used. FFTW
+objects are saved in a cache after creation which speeds up further similar FFT operations.
+The number of threads is set globally with :func:`~.configure_backend` (per process, e.g. the
+processes of a :class:`~.WorkerPool` divide the threads among themselves) and can be overridden
+with the `workers` argument of every FFT function and of the phasemappers. The results can be
+written into preallocated arrays with the `out` argument. The FFTW backend then runs a plan
+directly on the given input and output arrays (cached per pair of arrays, the input of
+:func:`~.irfftn` may be overwritten), so that repeated FFTs do not allocate or copy memory. The
+numpy and scipy backends still allocate the full result and copy it into `out`.
 
 """
-# TODO: is this still in use or deprecated by jutil???
 
+import atexit
+import itertools
 import pickle
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 
 import numpy as np
 
@@ -25,8 +36,16 @@ try:
     BACKEND = 'fftw'
 except ImportError:
     pyfftw = None
-    BACKEND = 'numpy'
-    _log.info('pyFFTW module not found. Using numpy implementation.')
+    BACKEND = 'scipy'
+    _log.info('pyFFTW module not found. Using scipy implementation.')
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+    if pyfftw is None:
+        BACKEND = 'numpy'
+        _log.info('scipy.fft module not found. Using numpy implementation.')
 
 try:
     import multiprocessing
@@ -38,19 +57,39 @@ except ImportError:
 
 
 __all__ = ['plans', 'FLOAT', 'COMPLEX', 'dump_wisdom', 'load_wisdom',
-           'zeros', 'empty', 'ones', 'configure_backend',
+           'zeros', 'empty', 'ones', 'configure_backend', 'configure_padding',
+           'configure_wisdom', 'next_fast_len', 'get_padded_shape',
            'fftn', 'ifftn', 'rfftn', 'irfftn', 'rfftn_adj', 'irfftn_adj']
 
+PADDING = 'fast'  # Padding policy for convolutions, see `configure_padding`!
+
 
 class FFTWCache(object):
     """Class for adding FFTW Plans and on-demand lookups.
 
     This class is instantiated in this module to store FFTW plans and for the lookup of the former.
+    The cache is bounded by the number of plans and by the memory of their aligned input and
+    output arrays, the least recently used plans are evicted first. Plans are never shared
+    between threads (every thread gets its own plan instances), because an FFTW object can not
+    be executed by several threads at once.
 
     Attributes
     ----------
-    cache: dict
-        Cache for storing the FFTW plans.
+    cache: :class:`~collections.OrderedDict`
+        Cache for storing the FFTW plans (in the order of their last use).
+    max_plans: int or None, optional
+        Maximum number of cached plans. If None, the number of plans is not bounded.
+    max_memory: int or None, optional
+        Maximum memory in bytes of the arrays of all cached plans. If None, the memory is not
+        bounded.
+    nbytes: int
+        Memory in bytes of the arrays of all cached plans.
+    hits: int
+        Number of lookups which found a plan.
+    misses: int
+        Number of lookups which did not find a plan.
+    evictions: int
+        Number of plans which were evicted to stay within the bounds.
 
     Notes
     -----
@@ -60,12 +99,33 @@ class FFTWCache(object):
 
     _log = logging.getLogger(__name__ + '.FFTWCache')
 
-    def __init__(self):
+    def __init__(self, max_plans=64, max_memory=2**30):
         self._log.debug('Calling __init__')
-        self.cache = dict()
+        self.max_plans = max_plans
+        self.max_memory = max_memory
+        self._lock = threading.Lock()
+        self.clear_cache()
         self._log.debug('Created ' + str(self))
 
-    def add_fftw(self, fft_type, fftw_obj, s, axes, nthreads):
+    def __repr__(self):
+        self._log.debug('Calling __repr__')
+        return '%s(max_plans=%r, max_memory=%r)' % (self.__class__, self.max_plans,
+                                                    self.max_memory)
+
+    def __str__(self):
+        self._log.debug('Calling __str__')
+        return 'FFTWCache(plans=%s, nbytes=%s, hits=%s, misses=%s, evictions=%s)' % \
+               (len(self.cache), self.nbytes, self.hits, self.misses, self.evictions)
+
+    @staticmethod
+    def _get_key(fft_type, in_arr, s, axes, nthreads, out_arr=None):
+        key = (fft_type, in_arr.shape, in_arr.dtype, s, axes, nthreads, threading.get_ident())
+        if out_arr is not None:  # Plans on preallocated arrays are bound to their memory:
+            key += tuple((arr.__array_interface__['data'][0], arr.shape, arr.strides, arr.dtype)
+                         for arr in (in_arr, out_arr))
+        return key
+
+    def add_fftw(self, fft_type, fftw_obj, s, axes, nthreads, inplace=False):
         """Add an FFTW object to the cache.
 
         Parameters
@@ -73,21 +133,36 @@ class FFTWCache(object):
         fft_type: basestring
             Identifier sting for the FFT type ('fftn', 'ifftn', 'rfftn', 'irfftn').
         fftw_obj: :class:`~pyfftw.FFTW` object
-            The FFTW object which should be added to the cache.
+            The FFTW object which should be added to the cache (for the current thread).
         s: tuple of ints
             Shape of the output array.
         axes: tuple of ints
             The axes along which the FFTW should be executed.
         nthreads: int
             Number of threads which should be used.
+        inplace: bool, optional
+            If True, the FFTW object runs directly on the arrays of the caller (instead of its own
+            internal arrays) and is only looked up for the same input and output arrays.
 
         """
         self._log.debug('Calling add_fftw')
-        in_arr = fftw_obj.get_input_array()
-        key = (fft_type, in_arr.shape, in_arr.dtype, s, axes, nthreads)
-        self.cache[key] = fftw_obj
-
-    def lookup_fftw(self, fft_type, in_arr, s, axes, nthreads):
+        out_arr = fftw_obj.get_output_array() if inplace else None
+        key = self._get_key(fft_type, fftw_obj.get_input_array(), s, axes, nthreads, out_arr)
+        nbytes = fftw_obj.get_input_array().nbytes + fftw_obj.get_output_array().nbytes
+        with self._lock:
+            if key in self.cache:
+                self.nbytes -= self.cache.pop(key)[1]
+            self.cache[key] = (fftw_obj, nbytes)
+            self.nbytes += nbytes
+            # Evict least recently used plans (but keep the new one):
+            while len(self.cache) > 1 and (
+                    (self.max_plans is not None and len(self.cache) > self.max_plans) or
+                    (self.max_memory is not None and self.nbytes > self.max_memory)):
+                _, (_, evicted_nbytes) = self.cache.popitem(last=False)
+                self.nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def lookup_fftw(self, fft_type, in_arr, s, axes, nthreads, out_arr=None):
         """
 
         Parameters
@@ -102,21 +177,36 @@ class FFTWCache(object):
             The axes along which the FFTW should be executed.
         nthreads: int
             Number of threads which should be used.
+        out_arr: :class:`~numpy.ndarray`, optional
+            Preallocated output array. If given, the FFTW object which runs directly on `in_arr`
+            and `out_arr` is requested (see `inplace` in :func:`~.add_fftw`).
 
         Returns
         -------
         fftw_obj: :class:`~pyfftw.FFTW` object
-            The requested FFTW object.
+            The requested FFTW object of the current thread (None, if not in the cache).
 
         """
         self._log.debug('Calling lookup_fftw')
-        key = (fft_type, in_arr.shape, in_arr.dtype, s, axes, nthreads)
-        return self.cache.get(key, None)
+        key = self._get_key(fft_type, in_arr, s, axes, nthreads, out_arr)
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[0]
 
     def clear_cache(self):
-        """Clear the cache."""
+        """Clear the cache (and reset the statistics)."""
         self._log.debug('Calling clear_cache')
-        self.cache = dict()
+        with self._lock:
+            self.cache = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
 
 
 plans = FFTWCache()
@@ -124,33 +214,42 @@ FLOAT = np.float32  # One convenient place to
 COMPLEX = np.complex64  # change from 32 to 64 bit
 
 
+def _to_out(result, out):
+    # Write the result into the preallocated output array (if given):
+    if out is None:
+        return result
+    out[...] = result
+    return out
+
+
 # Numpy functions:
 
-def _fftn_numpy(a, s=None, axes=None):
-    return np.fft.fftn(a, s, axes)
+def _fftn_numpy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(np.fft.fftn(a, s, axes), out)
 
 
-def _ifftn_numpy(a, s=None, axes=None):
-    return np.fft.ifftn(a, s, axes)
+def _ifftn_numpy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(np.fft.ifftn(a, s, axes), out)
 
 
-def _rfftn_numpy(a, s=None, axes=None):
-    return np.fft.rfftn(a, s, axes)
+def _rfftn_numpy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(np.fft.rfftn(a, s, axes), out)
 
 
-def _irfftn_numpy(a, s=None, axes=None):
-    return np.fft.irfftn(a, s, axes)
+def _irfftn_numpy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(np.fft.irfftn(a, s, axes), out)
 
 
-def _rfftn_adj_numpy(a):
-    n = 2 * (a.shape[-1] - 1)
+def _rfftn_adj_numpy(a, n=None, workers=None):
+    if n is None:  # Assume an even length of the last axis of the original array
+        n = 2 * (a.shape[-1] - 1)
     out_shape = a.shape[:-1] + (n,)
     out_arr = zeros(out_shape, dtype=a.dtype)
     out_arr[:, :a.shape[1]] = a
     return _ifftn_numpy(out_arr).real * np.prod(out_shape)
 
 
-def _irfftn_adj_numpy(a):
+def _irfftn_adj_numpy(a, workers=None):
     n = a.shape[-1] // 2 + 1
     out_arr = _fftn_numpy(a, axes=(-1,)) / a.shape[-1]
     if a.shape[-1] % 2 == 0:  # even
@@ -161,58 +260,142 @@ def _irfftn_adj_numpy(a):
     return _fftn_numpy(out_arr[:, :n], axes=axes) / np.prod(out_arr.shape[:-1])
 
 
-# FFTW functions:
+# Scipy functions (keep single precision and run with several threads):
 
-def _fftn_fftw(a, s=None, axes=None):
-    fftw = plans.lookup_fftw('fftn', a, s, axes, NTHREADS)
-    if fftw is None:
-        fftw = pyfftw.builders.fftn(a, s, axes, threads=NTHREADS)
-        plans.add_fftw('fftn', fftw, s, axes, NTHREADS)
-    return fftw(a).copy()
+def _fftn_scipy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(scipy_fft.fftn(a, s, axes, workers=workers or NTHREADS), out)
 
 
-def _ifftn_fftw(a, s=None, axes=None):
-    fftw = plans.lookup_fftw('ifftn', a, s, axes, NTHREADS)
-    if fftw is None:
-        fftw = pyfftw.builders.ifftn(a, s, axes, threads=NTHREADS)
-        plans.add_fftw('ifftn', fftw, s, axes, NTHREADS)
-    return fftw(a).copy()
+def _ifftn_scipy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(scipy_fft.ifftn(a, s, axes, workers=workers or NTHREADS), out)
 
 
-def _rfftn_fftw(a, s=None, axes=None):
-    fftw = plans.lookup_fftw('rfftn', a, s, axes, NTHREADS)
-    if fftw is None:
-        fftw = pyfftw.builders.rfftn(a, s, axes, threads=NTHREADS)
-        plans.add_fftw('rfftn', fftw, s, axes, NTHREADS)
-    return fftw(a).copy()
+def _rfftn_scipy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(scipy_fft.rfftn(a, s, axes, workers=workers or NTHREADS), out)
+
+
+def _irfftn_scipy(a, s=None, axes=None, workers=None, out=None):
+    return _to_out(scipy_fft.irfftn(a, s, axes, workers=workers or NTHREADS), out)
+
+
+def _rfftn_adj_scipy(a, n=None, workers=None):
+    if n is None:  # Careful: just works for even n (which is guaranteed by the kernel!)
+        n = 2 * (a.shape[-1] - 1)
+    out_shape = a.shape[:-1] + (n,)
+    out_arr = zeros(out_shape, dtype=a.dtype)
+    out_arr[:, :a.shape[-1]] = a
+    return _ifftn_scipy(out_arr, workers=workers).real * np.prod(out_shape)
+
+
+def _irfftn_adj_scipy(a, workers=None):
+    out_arr = _fftn_scipy(a, axes=(-1,), workers=workers) / a.shape[-1]  # FFT of last axis
+    n = a.shape[-1] // 2 + 1
+    if a.shape[-1] % 2 == 0:  # even
+        out_arr[:, 1:n - 1] += np.conj(out_arr[:, :n - 1:-1])
+    else:  # odd
+        out_arr[:, 1:n] += np.conj(out_arr[:, :n - 1:-1])
+    axes = tuple(range(len(out_arr.shape[:-1])))
+    return _fftn_scipy(out_arr[:, :n], axes=axes, workers=workers) / np.prod(out_arr.shape[:-1])
 
 
-def _irfftn_fftw(a, s=None, axes=None):
-    fftw = plans.lookup_fftw('irfftn', a, s, axes, NTHREADS)
+# FFTW functions:
+
+def _fftw_inplace(fft_type, a, s, axes, nthreads, out):
+    # Run the FFT directly on the preallocated arrays (returns False if they do not fit):
+    fftw = plans.lookup_fftw(fft_type, a, s, axes, nthreads, out)
+    if fftw is None:
+        fft_axes = tuple(range(a.ndim)) if axes is None else tuple(axes)
+        shape = (out if fft_type == 'irfftn' else a).shape  # Shape of the real space array
+        if s is not None and tuple(s) != tuple(shape[axis] for axis in fft_axes):
+            return False  # Padding or cropping needs the internal arrays of the builders!
+        if np.finfo(a.dtype).dtype != np.finfo(out.dtype).dtype:
+            return False  # FFTW plans do not change the precision!
+        direction = 'FFTW_BACKWARD' if fft_type in ('ifftn', 'irfftn') else 'FFTW_FORWARD'
+        flags = ('FFTW_MEASURE',)
+        if not all(pyfftw.is_byte_aligned(arr) for arr in (a, out)):
+            flags += ('FFTW_UNALIGNED',)
+        a_copy = a.copy()  # Planning overwrites the arrays!
+        try:
+            fftw = pyfftw.FFTW(a, out, fft_axes, direction, flags, threads=nthreads)
+        except ValueError:  # E.g. wrong shape of the output array
+            return False
+        finally:
+            a[...] = a_copy
+        plans.add_fftw(fft_type, fftw, s, axes, nthreads, inplace=True)
+    fftw()  # Executes on the arrays of the plan (and normalises the inverse FFTs)
+    return True
+
+
+def _fftn_fftw(a, s=None, axes=None, workers=None, out=None):
+    nthreads = workers or NTHREADS
+    if out is not None and _fftw_inplace('fftn', a, s, axes, nthreads, out):
+        return out
+    fftw = plans.lookup_fftw('fftn', a, s, axes, nthreads)
+    if fftw is None:
+        fftw = pyfftw.builders.fftn(a, s, axes, threads=nthreads)
+        plans.add_fftw('fftn', fftw, s, axes, nthreads)
+    if out is None:
+        return fftw(a).copy()
+    return _to_out(fftw(a), out)  # Copied from the internal output array of the plan
+
+
+def _ifftn_fftw(a, s=None, axes=None, workers=None, out=None):
+    nthreads = workers or NTHREADS
+    if out is not None and _fftw_inplace('ifftn', a, s, axes, nthreads, out):
+        return out
+    fftw = plans.lookup_fftw('ifftn', a, s, axes, nthreads)
+    if fftw is None:
+        fftw = pyfftw.builders.ifftn(a, s, axes, threads=nthreads)
+        plans.add_fftw('ifftn', fftw, s, axes, nthreads)
+    if out is None:
+        return fftw(a).copy()
+    return _to_out(fftw(a), out)  # Copied from the internal output array of the plan
+
+
+def _rfftn_fftw(a, s=None, axes=None, workers=None, out=None):
+    nthreads = workers or NTHREADS
+    if out is not None and _fftw_inplace('rfftn', a, s, axes, nthreads, out):
+        return out
+    fftw = plans.lookup_fftw('rfftn', a, s, axes, nthreads)
+    if fftw is None:
+        fftw = pyfftw.builders.rfftn(a, s, axes, threads=nthreads)
+        plans.add_fftw('rfftn', fftw, s, axes, nthreads)
+    if out is None:
+        return fftw(a).copy()
+    return _to_out(fftw(a), out)  # Copied from the internal output array of the plan
+
+
+def _irfftn_fftw(a, s=None, axes=None, workers=None, out=None):
+    nthreads = workers or NTHREADS
+    if out is not None and _fftw_inplace('irfftn', a, s, axes, nthreads, out):
+        return out
+    fftw = plans.lookup_fftw('irfftn', a, s, axes, nthreads)
     if fftw is None:
-        fftw = pyfftw.builders.irfftn(a, s, axes, threads=NTHREADS)
-        plans.add_fftw('irfftn', fftw, s, axes, NTHREADS)
-    return fftw(a).copy()
+        fftw = pyfftw.builders.irfftn(a, s, axes, threads=nthreads)
+        plans.add_fftw('irfftn', fftw, s, axes, nthreads)
+    if out is None:
+        return fftw(a).copy()
+    return _to_out(fftw(a), out)  # Copied from the internal output array of the plan
 
 
-def _rfftn_adj_fftw(a):
-    # Careful: just works for even a (which is guaranteed by the kernel!)
-    n = 2 * (a.shape[-1] - 1)
+def _rfftn_adj_fftw(a, n=None, workers=None):
+    if n is None:  # Careful: just works for even n (which is guaranteed by the kernel!)
+        n = 2 * (a.shape[-1] - 1)
     out_shape = a.shape[:-1] + (n,)
     out_arr = zeros(out_shape, dtype=a.dtype)
     out_arr[:, :a.shape[-1]] = a
-    return _ifftn_fftw(out_arr).real * np.prod(out_shape)
+    return _ifftn_fftw(out_arr, workers=workers).real * np.prod(out_shape)
 
 
-def _irfftn_adj_fftw(a):
-    out_arr = _fftn_fftw(a, axes=(-1,)) / a.shape[-1]  # FFT of last axis
+def _irfftn_adj_fftw(a, workers=None):
+    out_arr = _fftn_fftw(a, axes=(-1,), workers=workers) / a.shape[-1]  # FFT of last axis
     n = a.shape[-1] // 2 + 1
     if a.shape[-1] % 2 == 0:  # even
         out_arr[:, 1:n - 1] += np.conj(out_arr[:, :n - 1:-1])
     else:  # odd
         out_arr[:, 1:n] += np.conj(out_arr[:, :n - 1:-1])
     axes = tuple(range(len(out_arr.shape[:-1])))
-    return _fftn_fftw(out_arr[:, :n], axes=axes) / np.prod(out_arr.shape[:-1])
+    return _fftn_fftw(out_arr[:, :n], axes=axes, workers=workers) / np.prod(out_arr.shape[:-1])
 
 
 # These wisdom functions do nothing if pyFFTW is not available:
@@ -258,6 +441,34 @@ def load_wisdom(fname):
                 pyfftw.import_wisdom(pickle.load(fp))
 
 
+def configure_wisdom(fname):
+    """Load the FFTW wisdom from a file now and save it to the same file at interpreter shutdown.
+
+    The wisdom file is also used automatically, if the environment variable ``PYRAMID_WISDOM``
+    is set to its name when this module is imported. Does nothing if pyFFTW is not available.
+
+    Parameters
+    ----------
+    fname: string
+        Name of the file from which the wisdom is loaded and in which it is saved.
+
+    Returns
+    -------
+    None
+
+    """
+    _log.debug('Calling configure_wisdom')
+    global _wisdom_file
+    if pyfftw is not None:
+        load_wisdom(fname)
+        if _wisdom_file is None:  # Register only once, but always dump to the last file:
+            atexit.register(lambda: dump_wisdom(_wisdom_file))
+        _wisdom_file = fname
+
+
+_wisdom_file = None  # File in which the wisdom is saved at shutdown (see `configure_wisdom`)
+
+
 # Array setups:
 def empty(shape, dtype=FLOAT):
     """Return a new array of given shape and type without initializing entries.
@@ -328,14 +539,136 @@ def ones(shape, dtype=FLOAT):
     return result
 
 
+# Padding for convolutions:
+def _next_smooth(n, primes):
+    # Smallest number >= n whose prime factors are all in primes:
+    while True:
+        m = n
+        for p in primes:
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def next_fast_len(target, primes=(2, 3, 5)):
+    """Return the smallest even size >= `target` which is fast for FFTs.
+
+    Like :func:`scipy.fft.next_fast_len`, the returned size only has small prime factors (5-smooth
+    by default, 7-smooth with ``primes=(2, 3, 5, 7)``). It is also even, which the real FFT
+    adjoints of this package and of :mod:`jutil.fft` rely on.
+
+    Parameters
+    ----------
+    target: int
+        Minimal size.
+    primes: tuple of int, optional
+        Allowed prime factors. Default is (2, 3, 5).
+
+    Returns
+    -------
+    size: int
+        The fast size.
+
+    """
+    return 2 * _next_smooth(max(int(np.ceil(target / 2)), 1), primes)
+
+
+_autotuned = {}  # Remembers the fastest padded shapes found by the 'autotune' policy
+
+
+def _autotune(dim):
+    if dim not in _autotuned:
+        # Candidates are the fast sizes and the old sizes (2N for FFTW, powers of 2 for numpy):
+        candidates = []
+        for d in dim:
+            sizes = {next_fast_len(2 * d - 1), next_fast_len(2 * d - 1, (2, 3, 5, 7)), 2 * d,
+                     int(2 ** np.ceil(np.log2(2 * d)))}
+            candidates.append(sorted(sizes))
+        timings = {}
+        for shape in itertools.product(*candidates):
+            array = np.zeros(shape, dtype=FLOAT)
+            irfftn(rfftn(array), shape)  # Warm up (e.g. create FFTW plans)!
+            start = time.perf_counter()
+            for _ in range(3):
+                irfftn(rfftn(array), shape)
+            timings[shape] = time.perf_counter() - start
+        _autotuned[dim] = min(timings, key=timings.get)
+        _log.info('Autotuned padding for {}: {}'.format(dim, _autotuned[dim]))
+    return _autotuned[dim]
+
+
+def get_padded_shape(dim, padding=None):
+    """Return the padded shape for the convolution of a field with a kernel of twice its size.
+
+    The field with dimensions `dim` is convolved with a kernel of dimensions ``2*dim-1`` (e.g. in
+    :class:`~.Kernel`), which needs a padded FFT grid of at least ``2*dim-1`` along each axis to
+    avoid wrap-around in the cut out result.
+
+    Parameters
+    ----------
+    dim: tuple of int
+        Dimensions of the field.
+    padding: {'fast', 'autotune', 'double', 'pow2'}, optional
+        Padding policy. 'fast' uses the smallest fast sizes (see :func:`~.next_fast_len`),
+        'autotune' benchmarks the fast sizes against the old ones once per `dim` and remembers the
+        fastest, 'double' uses ``2*dim`` and 'pow2' the next power of 2. If None (default), the
+        policy set by :func:`~.configure_padding` is used.
+
+    Returns
+    -------
+    dim_pad: tuple of int
+        The padded dimensions.
+
+    """
+    dim = tuple(int(d) for d in dim)
+    if padding is None:
+        padding = PADDING
+    if padding == 'fast':
+        return tuple(next_fast_len(2 * d - 1) for d in dim)
+    elif padding == 'autotune':
+        return _autotune(dim)
+    elif padding == 'double':
+        return tuple(2 * d for d in dim)
+    elif padding == 'pow2':
+        return tuple(int(2 ** np.ceil(np.log2(2 * d))) for d in dim)
+    else:
+        raise ValueError('{} is not a valid padding policy!'.format(padding))
+
+
+def configure_padding(padding):
+    """Change the default padding policy (see :func:`~.get_padded_shape`).
+
+    Parameters
+    ----------
+    padding: {'fast', 'autotune', 'double', 'pow2'}
+        Padding policy which is used by :class:`~.Kernel`, :class:`~.KernelCharge` and
+        :func:`~.convert_M_to_A` from now on.
+
+    Returns
+    -------
+    None
+
+    """
+    _log.debug('Calling configure_padding')
+    global PADDING
+    assert padding in ('fast', 'autotune', 'double', 'pow2'), 'Invalid padding policy!'
+    PADDING = padding
+
+
 # Configure backend:
-def configure_backend(backend):
+def configure_backend(backend, workers=None):
     """Change FFT backend.
 
     Parameters
     ----------
     backend: string
-        Backend to use. Supported values are "numpy" and "fftw".
+        Backend to use. Supported values are "numpy", "scipy" and "fftw".
+    workers: int, optional
+        Number of threads used by the "scipy" and "fftw" backends (the "numpy" backend is always
+        single-threaded). If None (default), the current setting is kept, which initially is the
+        number of CPUs. Every FFT function also accepts a `workers` argument for single calls.
 
     Returns
     -------
@@ -350,6 +683,10 @@ def configure_backend(backend):
     global rfftn_adj
     global irfftn_adj
     global BACKEND
+    global NTHREADS
+    if workers is not None:
+        assert workers > 0, 'Number of workers has to be positive!'
+        NTHREADS = int(workers)
     if backend == 'numpy':
         fftn = _fftn_numpy
         ifftn = _ifftn_numpy
@@ -358,6 +695,17 @@ def configure_backend(backend):
         rfftn_adj = _rfftn_adj_numpy
         irfftn_adj = _irfftn_adj_numpy
         BACKEND = 'numpy'
+    elif backend == 'scipy':
+        if scipy_fft is not None:
+            fftn = _fftn_scipy
+            ifftn = _ifftn_scipy
+            rfftn = _rfftn_scipy
+            irfftn = _irfftn_scipy
+            rfftn_adj = _rfftn_adj_scipy
+            irfftn_adj = _irfftn_adj_scipy
+            BACKEND = 'scipy'
+        else:
+            print('Error: scipy.fft requested but not available')
     elif backend == 'fftw':
         if pyfftw is not None:
             fftn = _fftn_fftw
@@ -366,7 +714,7 @@ def configure_backend(backend):
             irfftn = _irfftn_fftw
             rfftn_adj = _rfftn_adj_fftw
             irfftn_adj = _irfftn_adj_fftw
-            BACKEND = 'pyfftw'
+            BACKEND = 'fftw'
         else:
             print('Error: FFTW requested but not available')
 
@@ -378,7 +726,6 @@ rfftn = None
 irfftn = None
 rfftn_adj = None
 irfftn_adj = None
-if pyfftw is not None:
-    configure_backend('fftw')
-else:
-    configure_backend('numpy')
+configure_backend(BACKEND)
+if os.environ.get('PYRAMID_WISDOM'):
+    configure_wisdom(os.environ['PYRAMID_WISDOM'])
@@ -11,8 +11,7 @@ import logging
 
 import numpy as np
 
-from jutil import fft
-
+from pyramid import fft
 from pyramid.fielddata import VectorData
 
 __all__ = ['convert_M_to_A', 'convert_A_to_B', 'convert_M_to_B']
@@ -40,10 +39,7 @@ def convert_M_to_A(magdata, b_0=1.0):
     assert isinstance(magdata, VectorData), 'Only VectorData objects can be mapped!'
     dim = magdata.dim
     dim_kern = tuple(2 * np.array(dim) - 1)  # Dimensions of the kernel
-    if fft.HAVE_FFTW:
-        dim_pad = tuple(2 * np.array(dim))  # is at least even (not neccessary a power of 2)
-    else:
-        dim_pad = tuple(2 ** np.ceil(np.log2(2 * np.array(dim))).astype(int))  # pow(2)
+    dim_pad = fft.get_padded_shape(dim)  # at least 2N-1 and fast (see pyramid.fft)
     slice_B = (slice(dim[0] - 1, dim_kern[0]),  # Shift because kernel center
                slice(dim[1] - 1, dim_kern[1]),  # is not at (0, 0, 0)!
                slice(dim[2] - 1, dim_kern[2]))
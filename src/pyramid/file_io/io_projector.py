@@ -34,10 +34,19 @@ def save_projector(projector, filename, overwrite=True):
                 f.attrs['axis'] = projector.axis
             else:
                 f.attrs['tilt'] = projector.tilt
-                if class_name == 'RotTiltProjector':
+                if class_name in ('RotTiltProjector', 'MatrixFreeRotTiltProjector'):
                     f.attrs['rotation'] = projector.rotation
+                    f.attrs['camera_rotation'] = projector.camera_rotation
+                    f.attrs['center'] = projector.center
             f.attrs['dim'] = projector.dim
             f.attrs['dim_uv'] = projector.dim_uv
+            if class_name == 'MatrixFreeRotTiltProjector':  # Only save the setup parameters:
+                f.attrs['subcount'] = projector.subcount
+                f.attrs['R'] = projector.R
+                f.attrs['chunk_size'] = projector.chunk_size
+                if projector.column_index is not None:
+                    f.create_dataset('column_index', data=projector.column_index)
+                return
             f.create_dataset('data', data=projector.weight.data)
             f.create_dataset('indptr', data=projector.weight.indptr)
             f.create_dataset('indices', data=projector.weight.indices)
@@ -67,6 +76,19 @@ def load_projector(filename):
         # Retrieve dimensions:
         dim = f.attrs.get('dim')
         dim_uv = f.attrs.get('dim_uv')
+        if f.attrs.get('class') == 'MatrixFreeRotTiltProjector':  # Set up again from parameters:
+            result = projector.MatrixFreeRotTiltProjector(
+                tuple(dim), f.attrs.get('rotation'), f.attrs.get('tilt'),
+                camera_rotation=f.attrs.get('camera_rotation'), dim_uv=tuple(dim_uv),
+                subcount=f.attrs.get('subcount'), R=f.attrs.get('R'),
+                center=tuple(f.attrs.get('center')), chunk_size=f.attrs.get('chunk_size'))
+            if 'column_index' in f:  # Restore compression:
+                mask = np.zeros(result.dim, dtype=bool)
+                mask.flat[np.copy(f.get('column_index'))] = True
+                result = result.compress(mask)
+            return result
+        if f.attrs.get('class') == 'SimpleProjector':  # Cheaper to set up again than to load:
+            return projector.SimpleProjector(tuple(dim), str(f.attrs.get('axis')), tuple(dim_uv))
         size_2d, size_3d = np.prod(dim_uv), np.prod(dim)
         # Retrieve weight matrix:
         data = f.get('data')
@@ -86,5 +108,8 @@ def load_projector(filename):
             result.tilt = f.attrs.get('tilt')
             if class_name == 'RotTiltProjector':
                 result.rotation = f.attrs.get('rotation')
+                result.camera_rotation = f.attrs.get('camera_rotation', 0)
+                center = f.attrs.get('center')
+                result.center = tuple(center) if center is not None else None
         # Return projector object:
         return result
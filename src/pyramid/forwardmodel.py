@@ -3,19 +3,29 @@
 # Author: J. Caron
 #
 """This module provides the :class:`~.ForwardModel` class and '~.ForwardModelCharge' class which represent a strategy to
-map a three dimensional magnetization and charge distribution onto a two-dimensional phase map."""
+map a three dimensional magnetization and charge distribution onto a two-dimensional phase map. The
+:class:`~.ForwardModelMagMIP` class maps magnetization and mean inner potential contributions together."""
 
+import copy
 import logging
 import multiprocessing as mp
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
 
 import numpy as np
+from scipy import sparse
 
+from pyramid import fft
 from pyramid.dataset import DataSet
 from pyramid.fielddata import VectorData, ScalarData
+from pyramid.kernel import lean_pickling
+from pyramid.phasemapper import PhaseMapperRDFC, PhaseMapperMIP
 from pyramid.ramp import Ramp
 
-__all__ = ['ForwardModel', 'ForwardModelCharge', 'DistributedForwardModel']
+__all__ = ['ForwardModel', 'ForwardModelMagMIP', 'ForwardModelCharge', 'DistributedForwardModel',
+           'ThreadedForwardModel', 'WorkerPool']
 
 
 # TODO: Ramp should be a forward model itself! Instead of hookpoints, each ForwardModel should
@@ -57,6 +67,28 @@ class ForwardModel(object):
         Polynomial order of the additional phase ramp which will be added to the phase maps.
         All ramp parameters have to be at the end of the input vector and are split automatically.
         Default is None (no ramps are added).
+    compressed : bool, optional
+        If True, the weight matrices of all projectors are sliced down to the voxels inside the
+        3D mask of the `data_set` once during construction, so that the products directly work
+        on the (compressed) input vector without scattering it into the full 3D volume. This pays
+        off for masks which only cover a small part of the volume. The mask of the `data_set`
+        must not change afterwards. Default is False.
+    stacked : bool, optional
+        If True, the weight matrices of all projectors are stacked into one
+        :class:`~.StackedProjector` during construction (see
+        :func:`~.DataSet.get_stacked_projector`), which projects all images with one sparse
+        product. Only the adjoint profits for long tilt series, the forward projection is not
+        faster (scipy's sparse products run single-threaded). Needs memory for the stacked
+        weight matrix. Default is False.
+    batched : bool, optional
+        If True, the images whose :class:`~.PhaseMapperRDFC` objects share the same
+        :class:`~.Kernel` are phase mapped in batches (see :func:`~.PhaseMapperRDFC.jac_dot_batch`)
+        with one FFT call per batch instead of one per image. The batches are limited to
+        `BATCH_PIXELS` padded pixels, so that the spectra of a batch stay in the cpu caches. This
+        pays off for small images and a threaded FFT library (e.g. FFTW with several `workers`),
+        but not for large images. Default is False.
+    batches : list of tuple
+        Pairs of a phasemapper and the list of image indices which it maps at once.
     y : :class:`~numpy.ndarray` (N=1)
         Vector which lists all pixel values of all phase maps one after another.
     m: int
@@ -71,12 +103,24 @@ class ForwardModel(object):
 
     _log = logging.getLogger(__name__ + '.ForwardModel')
 
-    def __init__(self, data_set, ramp_order=None):
+    BATCH_PIXELS = 2**18  # Maximum number of padded pixels of all images of one batch
+
+    def __init__(self, data_set, ramp_order=None, compressed=False, stacked=False,
+                 batched=False):
         self._log.debug('Calling __init__')
         self.data_set = data_set
         self.ramp_order = ramp_order
+        self.compressed = compressed
+        self.stacked = stacked
+        self.batched = batched
+        self.projectors = data_set.projectors
+        if stacked:  # Stack the weight matrices of the projectors once:
+            self.stacked_projector = data_set.get_stacked_projector(compressed)
+        elif compressed:  # Slice the weight matrices of the projectors once:
+            self.projectors = [p.compress(data_set.mask) for p in data_set.projectors]
         # Extract information from data_set:
         self.phasemappers = self.data_set.phasemappers
+        self.batches = self._get_batches(self.phasemappers, batched)
         self.y = self.data_set.phase_vec
         self.n = self.data_set.n
         self.m = self.data_set.m
@@ -90,6 +134,24 @@ class ForwardModel(object):
         self.magdata = VectorData(self.data_set.a, np.zeros((3,) + self.data_set.dim))
         self._log.debug('Creating ' + str(self))
 
+    @classmethod
+    def _get_batches(cls, phasemappers, batched):
+        # Group the images whose RDFC phasemappers share a kernel (all others are mapped alone):
+        if not batched:
+            return [(mapper, [i]) for i, mapper in enumerate(phasemappers)]
+        batches, open_batches = [], {}
+        for i, mapper in enumerate(phasemappers):
+            if not isinstance(mapper, PhaseMapperRDFC):
+                batches.append((mapper, [i]))
+                continue
+            size = max(cls.BATCH_PIXELS // int(np.prod(mapper.kernel.dim_pad)), 1)
+            images = open_batches.get(id(mapper.kernel))
+            if images is None or len(images) >= size:  # Start a new batch for this kernel:
+                images = open_batches[id(mapper.kernel)] = []
+                batches.append((mapper, images))
+            images.append(i)
+        return batches
+
     def __repr__(self):
         self._log.debug('Calling __repr__')
         return '%s(data_set=%r)' % (self.__class__, self.data_set)
@@ -101,6 +163,8 @@ class ForwardModel(object):
     def __call__(self, x):
         # TODO: Have an extra forward model without the projector part?
         # TODO: Which also corrects for the thickness? Would be nice!
+        if self.compressed or self.stacked:  # The model is linear, use the Jacobi matrix:
+            return self.jac_dot(x, x)
         # Extract ramp parameters if necessary (x will be shortened!):
         x = self.ramp.extract_ramp_params(x)
         # Reset magdata and fill with vector:
@@ -139,18 +203,30 @@ class ForwardModel(object):
         """
         # Extract ramp parameters if necessary (vector will be shortened!):
         vector = self.ramp.extract_ramp_params(vector)
-        # Reset magdata and fill with vector:
-        self.magdata.field[...] = 0
-        self.magdata.set_vector(vector, self.data_set.mask)
+        if self.compressed:  # Work directly on the compressed vector:
+            mag_vec = vector
+        else:  # Reset magdata and fill with vector:
+            self.magdata.field[...] = 0
+            self.magdata.set_vector(vector, self.data_set.mask)
+            mag_vec = self.magdata.field_vec
+        if self.stacked:  # Project all images at once:
+            proj_vec = self.stacked_projector.jac_dot(mag_vec)
+            php = self.stacked_projector.hook_points
         # Simulate all phase maps and create result vector:
         result = np.zeros(self.m)
         hp = self.hook_points
-        for i, projector in enumerate(self.data_set.projectors):
-            mag_vec = self.magdata.field_vec
-            mapper = self.phasemappers[i]
-            res = mapper.jac_dot(projector.jac_dot(mag_vec))
-            res += self.ramp.jac_dot(i)  # add ramp!
-            result[hp[i]:hp[i + 1]] = res
+        for mapper, images in self.batches:
+            if self.stacked:
+                mag_projs = [proj_vec[php[i]:php[i + 1]] for i in images]
+            else:
+                mag_projs = [self.projectors[i].jac_dot(mag_vec) for i in images]
+            if len(images) > 1:  # Phase map all images of the batch at once:
+                results = mapper.jac_dot_batch(mag_projs)
+            else:
+                results = [mapper.jac_dot(mag_projs[0])]
+            for i, res in zip(images, results):
+                result[hp[i]:hp[i + 1]] = res
+                result[hp[i]:hp[i + 1]] += self.ramp.jac_dot(i)  # add ramp!
         return result
 
     def jac_T_dot(self, x, vector):
@@ -172,14 +248,227 @@ class ForwardModel(object):
             the input `vector`. If necessary, transposed ramp parameters are concatenated.
 
         """
-        proj_T_result = np.zeros(3 * np.prod(self.data_set.dim))
         hp = self.hook_points
-        for i, projector in enumerate(self.data_set.projectors):
+        if self.stacked:  # Collect the transposed phase mappings and project all images at once:
+            php = self.stacked_projector.hook_points
+            proj_T_vec = np.empty(php[-1])
+        else:
+            size = self.data_set.n if self.compressed else 3 * np.prod(self.data_set.dim)
+            proj_T_result = np.zeros(size)
+            proj_T_buffer = np.empty_like(proj_T_result)  # reused by all projectors
+        for mapper, images in self.batches:
+            if len(images) > 1:  # Transposed phase mapping of all images of the batch at once:
+                mag_projs = mapper.jac_T_dot_batch([vector[hp[i]:hp[i + 1]] for i in images])
+            else:
+                mag_projs = [mapper.jac_T_dot(vector[hp[images[0]]:hp[images[0] + 1]])]
+            for i, mag_proj in zip(images, mag_projs):
+                if self.stacked:
+                    proj_T_vec[php[i]:php[i + 1]] = mag_proj
+                else:
+                    proj_T_result += self.projectors[i].jac_T_dot(mag_proj, out=proj_T_buffer)
+        if self.stacked:
+            proj_T_result = self.stacked_projector.jac_T_dot(proj_T_vec)
+        if self.compressed:  # Result is already compressed:
+            result = proj_T_result
+        else:
+            self.magdata.field_vec = proj_T_result
+            result = self.magdata.get_vector(self.data_set.mask)
+        ramp_params = self.ramp.jac_T_dot(vector)  # calculate ramp_params separately!
+        return np.concatenate((result, ramp_params))
+
+    def normal_dot(self, x, vector):
+        """Calculate the product of the normal matrix ``J^T Se_inv J`` with a given `vector`.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The Jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation).
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (and the ramp parameters).
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the normal matrix (which is not explicitely calculated) with the input
+            `vector`, as needed for the Hessian of the :class:`~.Costfunction`.
+
+        """
+        return self.jac_T_dot(x, self.Se_inv.dot(self.jac_dot(x, vector)))
+
+    def finalize(self):
+        """'Finalize the processes and let them join the master process (NOT USED HERE!).
+
+        Returns
+        -------
+        None
+
+        """
+        pass
+
+
+class ForwardModelMagMIP(object):
+    """Class for mapping 3D magnetic and electrostatic (MIP) distributions to 2D phase maps.
+
+    Represents a strategy for the mapping of a 3D magnetization distribution together with a 3D
+    scalar distribution (e.g. the occupation of the voxels with the specimen, scaled by the mean
+    inner potential `v_0`) to two-dimensional phase maps, which contain the sum of the magnetic
+    and the electrostatic phase. The phasemappers of the :class:`~.DataSet` (usually
+    :class:`~.PhaseMapperRDFC`) are used for the magnetic contribution, one linear
+    :class:`~.PhaseMapperMIP` per image for the electrostatic one. Both fields are projected with
+    one pass over the weight matrix of each projector (see :func:`~.Projector.jac_dot_combined`).
+
+    Attributes
+    ----------
+    data_set: :class:`~dataset.DataSet`
+        :class:`~dataset.DataSet` object, which stores all required information calculation.
+    ramp_order : int or None (default)
+        Polynomial order of the additional phase ramp which will be added to the phase maps.
+        All ramp parameters have to be at the end of the input vector and are split automatically.
+        Default is None (no ramps are added).
+    v_0 : float, optional
+        The mean inner potential of the specimen in V. The default is 1.
+    v_acc : float, optional
+        The acceleration voltage of the electron microscope in V. The default is 30000.
+    compressed : bool, optional
+        If True, the weight matrices of all projectors are sliced down to the voxels inside the
+        3D mask of the `data_set` once during construction (see :class:`~.ForwardModel`).
+        Default is False.
+    mip_phasemappers : list of :class:`~.PhaseMapperMIP`
+        The phasemappers for the electrostatic contribution of all images.
+    magdata : :class:`~.VectorData`
+        Starting magnetization distribution of reconstructions (zero by default, see
+        :func:`~pyramid.reconstruction.optimize_linear_mag_mip`).
+    elecdata : :class:`~.ScalarData`
+        Starting scalar field of reconstructions (zero by default).
+    y : :class:`~numpy.ndarray` (N=1)
+        Vector which lists all pixel values of all phase maps one after another.
+    m: int
+        Size of the image space. Number of pixels of the 2-dimensional projected grid.
+    n: int
+        Size of the input space. First the `x`-, `y`- and `z`-components of the magnetization,
+        then the scalar field of all voxels inside the mask (and the ramp parameters).
+    Se_inv : :class:`~numpy.ndarray` (N=2), optional
+        Inverted covariance matrix of the measurement errors. The matrix has size `m x m` with m
+        being the length of the targetvector y (vectorized phase map information).
+
+    """
+
+    _log = logging.getLogger(__name__ + '.ForwardModelMagMIP')
+
+    def __init__(self, data_set, ramp_order=None, v_0=1, v_acc=30000, compressed=False):
+        self._log.debug('Calling __init__')
+        self.data_set = data_set
+        self.ramp_order = ramp_order
+        self.v_0 = v_0
+        self.v_acc = v_acc
+        self.compressed = compressed
+        self.projectors = data_set.projectors
+        if compressed:  # Slice the weight matrices of the projectors once:
+            self.projectors = [p.compress(data_set.mask) for p in data_set.projectors]
+        # Extract information from data_set:
+        self.phasemappers = self.data_set.phasemappers
+        self.mip_phasemappers = [PhaseMapperMIP(data_set.a, phasemap.dim_uv, v_0, v_acc)
+                                 for phasemap in data_set.phasemaps]
+        self.y = self.data_set.phase_vec
+        self.n = 4 * self.data_set.n // 3  # Three magnetization components plus one scalar field
+        self.m = self.data_set.m
+        self.shape = (self.m, self.n)
+        self.hook_points = self.data_set.hook_points
+        self.Se_inv = self.data_set.Se_inv
+        self._mask_index = np.flatnonzero(self.data_set.mask)
+        # Create ramp and change n accordingly:
+        self.ramp = Ramp(self.data_set, self.ramp_order)
+        self.n += self.ramp.n  # ramp.n is 0 if ramp_order is None
+        # Create empty starting distributions:
+        self.magdata = VectorData(self.data_set.a, np.zeros((3,) + self.data_set.dim))
+        self.elecdata = ScalarData(self.data_set.a, np.zeros(self.data_set.dim))
+        self._log.debug('Creating ' + str(self))
+
+    def __repr__(self):
+        self._log.debug('Calling __repr__')
+        return '%s(data_set=%r, v_0=%r, v_acc=%r)' % (self.__class__, self.data_set, self.v_0,
+                                                       self.v_acc)
+
+    def __str__(self):
+        self._log.debug('Calling __str__')
+        return 'ForwardModelMagMIP(data_set=%s, v_0=%s, v_acc=%s)' % (self.data_set, self.v_0,
+                                                                      self.v_acc)
+
+    def __call__(self, x):
+        return self.jac_dot(x, x)  # The model is linear, use the Jacobi matrix!
+
+    def jac_dot(self, x, vector):
+        """Calculate the product of the Jacobi matrix with a given `vector`.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The Jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation).
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (first the `x`, then the `y` and
+            lastly the `z` components), followed by the 3D scalar field. Ramp parameters are also
+            added at the end if necessary.
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the Jacobi matrix (which is not explicitely calculated) with the input
+            `vector`.
+
+        """
+        # Extract ramp parameters if necessary (vector will be shortened!):
+        vector = self.ramp.extract_ramp_params(vector)
+        # Interleave the four fields once for all projectors (see Projector.jac_dot_combined):
+        if self.compressed:  # Work directly on the compressed vector:
+            fields = np.ascontiguousarray(vector.reshape(4, -1).T)
+        else:  # Scatter the four fields into the full 3D volume:
+            fields = np.zeros((np.prod(self.data_set.dim), 4), dtype=vector.dtype)
+            fields[self._mask_index] = vector.reshape(4, -1).T
+        # Simulate all phase maps and create result vector:
+        result = np.zeros(self.m)
+        hp = self.hook_points
+        for i, projector in enumerate(self.projectors):
+            proj_vec = projector.jac_dot_combined(fields)
+            split = 2 * projector.size_2d  # (u, v) followed by the projected scalar field
+            res = self.phasemappers[i].jac_dot(proj_vec[:split])
+            res += self.mip_phasemappers[i].jac_dot(proj_vec[split:])
+            res += self.ramp.jac_dot(i)  # add ramp!
+            result[hp[i]:hp[i + 1]] = res
+        return result
+
+    def jac_T_dot(self, x, vector):
+        """'Calculate the product of the transposed Jacobi matrix with a given `vector`.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation).
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of all 2D phase maps one after another in one vector.
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the transposed Jacobi matrix (which is not explicitely calculated) with
+            the input `vector`. If necessary, transposed ramp parameters are concatenated.
+
+        """
+        hp = self.hook_points
+        size = self.data_set.n // 3 if self.compressed else np.prod(self.data_set.dim)
+        proj_T_result = np.zeros((size, 4))  # Interleaved fields (see Projector.jac_dot_combined)
+        proj_T_buffer = np.empty_like(proj_T_result)  # reused by all projectors
+        for i, projector in enumerate(self.projectors):
             sub_vec = vector[hp[i]:hp[i + 1]]
-            mapper = self.phasemappers[i]
-            proj_T_result += projector.jac_T_dot(mapper.jac_T_dot(sub_vec))
-        self.magdata.field_vec = proj_T_result
-        result = self.magdata.get_vector(self.data_set.mask)
+            proj_vec = np.concatenate((self.phasemappers[i].jac_T_dot(sub_vec),
+                                       self.mip_phasemappers[i].jac_T_dot(sub_vec)))
+            proj_T_result += projector.jac_T_dot_combined(proj_vec, out=proj_T_buffer)
+        if self.compressed:  # Result is already compressed:
+            result = proj_T_result.T.ravel()
+        else:  # Gather the four fields from the voxels inside the mask:
+            result = proj_T_result[self._mask_index].T.ravel()
         ramp_params = self.ramp.jac_T_dot(vector)  # calculate ramp_params separately!
         return np.concatenate((result, ramp_params))
 
@@ -326,11 +615,12 @@ class ForwardModelCharge(object):
 
         """
         proj_T_result = np.zeros(np.prod(self.data_set.dim))
+        proj_T_buffer = np.empty_like(proj_T_result)  # reused by all projectors
         hp = self.hook_points
         for i, projector in enumerate(self.data_set.projectors):
             sub_vec = vector[hp[i]:hp[i + 1]]
             mapper = self.phasemappers[i]
-            proj_T_result += projector.jac_T_dot(mapper.jac_T_dot(sub_vec))
+            proj_T_result += projector.jac_T_dot(mapper.jac_T_dot(sub_vec), out=proj_T_buffer)
         self.elecdata.field_vec = proj_T_result
         result = self.elecdata.get_vector(self.data_set.mask)
         ramp_params = self.ramp.jac_T_dot(vector)  # calculate ramp_params separately!
@@ -347,107 +637,662 @@ class ForwardModelCharge(object):
         pass
 
 
-class DistributedForwardModel(ForwardModel):
-    """Multiprocessing class for mapping 3D magnetic distributions to 2D phase maps.
+def _estimate_costs(data_set):
+    """Estimate the relative cost of mapping each image of a `data_set` (for load balancing).
 
-    Subclass of the :class:`~.ForwardModel` class which implements multiprocessing strategies
-    to speed up the calculations. The interface is the same, internally, the processes and one
-    ForwardModel operating on a subset of the DataSet per process are created during construction.
-    Ramps are calculated in the main thread. The :func:`~.finalize` method can be used to force
-    the processes to join if the class is no longer used.
+    The projection costs about one multiply-add per nonzero weight and component, the phase
+    mapping about ``N * log2(N)`` per FFT of the padded size ``N`` (three FFTs per product).
+
+    """
+    costs = []
+    for projector, mapper in zip(data_set.projectors, data_set.phasemappers):
+        weight = getattr(projector, '_weight', None)  # Simple and matrix-free: not assembled!
+        nnz = weight.nnz if weight is not None else projector.size_3d
+        size_pad = np.prod(getattr(getattr(mapper, 'kernel', None), 'dim_pad', projector.dim_uv))
+        costs.append(3 * nnz + 3 * size_pad * np.log2(max(size_pad, 2)))
+    return costs
+
+
+def _split_images(costs, nparts):
+    """Split the images into `nparts` contiguous ranges with the smallest maximum cost.
+
+    The smallest feasible maximum cost is found by bisection, the ranges are then filled greedily
+    up to it. Every range gets at least one image (`nparts` must not exceed the number of images).
+
+    """
+    costs = np.asarray(costs, dtype=float)
+    count = len(costs)
+    assert 0 < nparts <= count, 'Every part needs at least one image!'
+
+    def fill(limit):
+        ranges, start, total = [], 0, 0.
+        for i in range(count):
+            # Close the range if the image does not fit or each remaining range needs one image:
+            if i > start and (total + costs[i] > limit or count - i == nparts - len(ranges) - 1):
+                ranges.append((start, i))
+                start, total = i, 0.
+            total += costs[i]
+        ranges.append((start, count))
+        return ranges
+
+    low, high = costs.max(), costs.sum()
+    if len(fill(low)) > nparts:
+        for _ in range(64):
+            middle = (low + high) / 2
+            if len(fill(middle)) > nparts:
+                low = middle
+            else:
+                high = middle
+        low = high
+    return fill(low)
+
+
+def _get_Se_inv_blocks(Se_inv, ranges):
+    """Return the diagonal blocks of `Se_inv` for the given `ranges` of the output vector.
+
+    Returns None if `Se_inv` has entries outside of these blocks (and thus couples images of
+    different ranges), so that the normal matrix can not be applied per range.
+
+    """
+    Se_inv = sparse.csr_matrix(Se_inv)
+    blocks = [Se_inv[start:stop, start:stop] for start, stop in ranges]
+    if sum(block.count_nonzero() for block in blocks) != Se_inv.count_nonzero():
+        return None
+    return blocks
+
+
+def _normal_dot_part(fwd_model, Se_inv_block, vector, ramp_order, ramp_params):
+    """Apply ``J^T Se_inv J`` for the images of a (ramp-free) SubForwardModel.
+
+    The ramps of the images (given by the `ramp_params` of the images of the SubForwardModel,
+    with shape (deg_of_freedom, count)) are added before `Se_inv_block` is applied, so that the
+    product is the same as for the whole ForwardModel. Returns the partial result for the
+    magnetization and the transposed ramp parameters of the images (same shape as `ramp_params`).
+
+    """
+    result = fwd_model.jac_dot(None, vector)
+    ramp = Ramp(fwd_model.data_set, ramp_order)
+    ramp.param_cache = ramp_params
+    if ramp_order is not None:  # Add ramps of the images:
+        hp = fwd_model.hook_points
+        for i in range(fwd_model.data_set.count):
+            result[hp[i]:hp[i + 1]] += ramp.jac_dot(i)
+    weighted = Se_inv_block.dot(result)
+    ramp_T = np.reshape(ramp.jac_T_dot(weighted), ramp_params.shape)
+    return fwd_model.jac_T_dot(None, weighted), ramp_T
+
+
+def _thread_local_copy(obj, copies):
+    """Copy a projector or phasemapper, so that a thread can use it alongside the original.
+
+    The copy is shallow, so that read-only parts (kernels, spectra, weight matrices) are shared,
+    but gets its own scratch arrays (the `SCRATCH_ARRAYS` of phasemappers) and buffers. `copies`
+    maps the ids of already copied objects to their copies, so that objects which are shared by
+    several images stay shared within one thread.
+
+    """
+    if id(obj) not in copies:
+        result = copy.copy(obj)
+        for name in getattr(result, 'SCRATCH_ARRAYS', ()):
+            value = vars(result).get(name)
+            if isinstance(value, np.ndarray):  # Aligned copy (scratch arrays are FFT buffers):
+                scratch = fft.empty(value.shape, dtype=value.dtype)
+                scratch[...] = value
+                setattr(result, name, scratch)
+        if hasattr(result, '_buffers'):
+            result._buffers = {}
+        copies[id(obj)] = result
+    return copies[id(obj)]
+
+
+class _SharedArrays(object):
+    """Named float arrays in shared memory, which the worker processes attach to by name.
+
+    Only the names of the shared memory blocks are pickled if the arrays are sent to the worker
+    processes (when they are started or through a pipe), so the arrays themselves are never
+    copied. The creating process is responsible for :func:`~.unlink`, all processes should
+    :func:`~.close` their views when they are done.
+
+    """
+
+    def __init__(self, shapes):
+        self._shapes = dict(shapes)
+        self._blocks = {name: shared_memory.SharedMemory(create=True,
+                                                         size=max(8 * int(np.prod(shape)), 1))
+                        for name, shape in self._shapes.items()}
+        self._arrays = self._get_arrays()
+
+    def _get_arrays(self):
+        return {name: np.ndarray(shape, dtype=np.float64, buffer=self._blocks[name].buf)
+                for name, shape in self._shapes.items()}
+
+    def __getstate__(self):
+        return {'shapes': self._shapes,
+                'names': {name: block.name for name, block in self._blocks.items()}}
+
+    def __setstate__(self, state):
+        self._shapes = state['shapes']
+        self._blocks = {name: shared_memory.SharedMemory(name=block_name)
+                        for name, block_name in state['names'].items()}
+        self._arrays = self._get_arrays()
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def close(self):
+        """Release the views of this process onto the shared memory."""
+        self._arrays = {}  # Views have to be released before the blocks can be closed!
+        for block in self._blocks.values():
+            block.close()
+
+    def unlink(self):
+        """Free the shared memory (only called by the creating process)."""
+        for block in self._blocks.values():
+            block.unlink()
+
+
+class _Worker(object):
+    """State and main loop of one process of a :class:`~.WorkerPool`.
+
+    Only holds picklable state (the tasks of the chunks the process can work on, the shared chunk
+    counter and arrays and the FFT configuration), so that it can be sent to processes which are
+    started with any start method. The diagonal blocks of `Se_inv` are loaded later.
+
+    """
+
+    def __init__(self, tasks, proc_id, n, dynamic, counter, shared, fft_backend, fft_workers):
+        self.tasks = tasks
+        self.proc_id = proc_id
+        self.n = n
+        self.dynamic = dynamic
+        self.counter = counter
+        self.shared = shared
+        self.fft_backend = fft_backend
+        self.fft_workers = fft_workers
+        self.Se_inv_blocks = None
+
+    def run(self, pipe):
+        """Answer the requests of the master until 'STOP' is received."""
+        fft.configure_backend(self.fft_backend, workers=self.fft_workers)  # Only in this process!
+        for method, arguments in iter(pipe.recv, 'STOP'):
+            # TODO: Properly rethrow Exceptions to master (set to self.exc_info)!
+            # TODO: see: https://nedbatchelder.com/blog/200711/rethrowing_exceptions_in_python.html
+            sys.stdout.flush()
+            if method == '_reduce':  # Add the partial result of another process to the own one:
+                partial = self.shared['partial']
+                partial[self.proc_id] += partial[arguments[0]]
+                result = None
+            elif method == '_set_Se_inv':  # Keep the diagonal blocks of the own chunks:
+                self.Se_inv_blocks = arguments[0]
+                result = None
+            else:
+                result = self._work(method, arguments)
+            pipe.send(result)
+        sys.stdout.flush()
+        if self.shared is not None:
+            self.shared.close()
+        pipe.close()  # Close worker end of the pipe too, to allow garbage collection!
+
+    def _iter_tasks(self):
+        if not self.dynamic:  # Static: work on the own chunk:
+            yield from enumerate(self.tasks)
+            return
+        while True:  # Dynamic: take the next chunk nobody is working on yet:
+            with self.counter.get_lock():
+                index = self.counter.value
+                self.counter.value += 1
+            if index >= len(self.tasks):
+                return
+            yield index, self.tasks[index]
+
+    def _work(self, method, arguments):
+        shared = self.shared
+        images, partial = [], np.zeros(self.n)
+        if method == 'normal_dot':
+            ramp_order, ramp_params = arguments[-2:]
+            ramp_partial = np.zeros_like(ramp_params)
+        for index, (fwd_model, start, stop, img_start) in self._iter_tasks():
+            if method == 'normal_dot':  # Fused product, only the partial results are returned:
+                x = shared['x'] if shared is not None else arguments[0]
+                img_stop = img_start + fwd_model.data_set.count
+                sub_partial, sub_ramp = _normal_dot_part(
+                    fwd_model, self.Se_inv_blocks[index], x, ramp_order,
+                    ramp_params[:, img_start:img_stop])
+                partial += sub_partial
+                ramp_partial[:, img_start:img_stop] = sub_ramp
+                continue
+            if method == 'jac_T_dot':  # Sum up the partial results of the own chunks:
+                if shared is not None:
+                    sub_vec = shared['y'][start:stop]
+                else:
+                    vector, offset = arguments
+                    sub_vec = vector[start - offset:stop - offset]
+                partial += fwd_model.jac_T_dot(None, sub_vec)
+                continue
+            x = shared['x'] if shared is not None else arguments[0]
+            sub_result = fwd_model(x) if method == '__call__' else fwd_model.jac_dot(None, x)
+            if shared is not None:  # Write own images directly into the output:
+                shared['y'][start:stop] = sub_result
+            else:
+                images.append((start, stop, sub_result))
+        if shared is not None:  # Only acknowledge, results are in shared memory!
+            if method in ('jac_T_dot', 'normal_dot'):
+                shared['partial'][self.proc_id] = partial
+            return ramp_partial if method == 'normal_dot' else None
+        if method == 'normal_dot':
+            return partial, ramp_partial
+        return partial if method == 'jac_T_dot' else images
+
+
+def _run_worker(worker, pipe):
+    # Module level function, so that the process target can be pickled by every start method:
+    worker.run(pipe)
+
+
+class WorkerPool(object):
+    """Long-lived pool of processes which keep the projectors and kernels of a DataSet resident.
+
+    The processes and one ForwardModel operating on a subset of the DataSet per process are
+    created once during construction. Any number of :class:`~.DistributedForwardModel` objects
+    (e.g. with different ramp orders) and thus costfunctions and reconstructions can then be
+    attached to the pool (see the `pool` argument of :class:`~.DistributedForwardModel`), without
+    forking and shipping all projectors and kernels again. This pays off for L-curves and other
+    series of reconstructions of the same data. The pool only maps the images (no ramps) and has
+    to be closed with :func:`~.close` (or be used as a context manager) when it is not needed
+    anymore. The processes are started with the default start method of the platform (or the
+    given `start_method`). Except for fork, the forward models of the processes are pickled when
+    they are started, with lean kernels (see :func:`~pyramid.kernel.lean_pickling`), and scripts
+    have to guard their main code with ``if __name__ == '__main__':``.
 
     Attributes
     ----------
     data_set: :class:`~dataset.DataSet`
         :class:`~dataset.DataSet` object, which stores all required information calculation.
-    ramp_order : int or None (default)
-        Polynomial order of the additional phase ramp which will be added to the phase maps.
-        All ramp parameters have to be at the end of the input vector and are split automatically.
-        Default is None (no ramps are added).
-    nprocs: int
-        Number of processes which should be created. Default is 1 (not recommended). # TODO: <<<!!!
+    nprocs: int or 'auto'
+        Number of processes which should be created. 'auto' (default) uses two cpus less than
+        available (to reserve them for the system), but at least one. Negative numbers are counted
+        from the number of cpus (-1 uses all cpus, -2 all but one and so on), like the `n_jobs` of
+        :func:`~pyramid.projector.make_projectors`. Never more processes than images are created.
+        The images are distributed according to their estimated costs (number of nonzero
+        projection weights and padded FFT size), so that the slowest process finishes as early as
+        possible.
+    compressed : bool, optional
+        If True, the forward models of the processes use projectors which are compressed to the
+        3D mask of the `data_set` (see :class:`~.ForwardModel`). Default is False.
+    stacked : bool, optional
+        If True, the forward models of the processes stack the weight matrices of their
+        projectors (see :class:`~.ForwardModel`). Default is False.
+    batched : bool, optional
+        If True, the forward models of the processes phase map their images which share a kernel
+        in batches (see :class:`~.ForwardModel`). Default is False.
+    shared : bool, optional
+        If True, the input and output vectors are exchanged through shared memory instead of
+        being pickled through the pipes, which then only carry small control messages. The
+        processes write their phase maps directly into their part of the output and the partial
+        results of the transposed products are summed up in place by the processes themselves
+        (tree reduction). This pays off for large vectors and many processes. Default is False.
+    dynamic : bool, optional
+        If True, the images are split into `CHUNKS_PER_PROC` (cost-balanced) chunks per process
+        and every process holds the forward models of all chunks. During each product, idle
+        processes take the next chunk which is not yet worked on, which compensates for
+        inaccurate cost estimates and busy cpus. With the fork start method, the forward models
+        are shared with the processes (copy on write) and thus need no extra memory, otherwise
+        every process gets a copy of all chunks. Default is False.
+    start_method : {None, 'fork', 'spawn', 'forkserver'}, optional
+        Start method of the processes (see :mod:`multiprocessing`). If None (default), the
+        default start method of the platform is used. Raises a ValueError if the start method is
+        not available on this platform (e.g. fork on Windows).
+    proc_hook_points : list of int
+        Hook points of the chunks in the output vector (one chunk per process if not `dynamic`).
+    fft_workers : int
+        Number of FFT threads of every process (the FFT threads of the master are divided among
+        the processes, see :func:`~pyramid.fft.configure_backend`), so that the processes do not
+        oversubscribe the cpus.
 
     """
 
-    def __init__(self, data_set, ramp_order=None, nprocs='auto'):
-        # Evoke super constructor to set up the normal ForwardModel:
-        super().__init__(data_set, ramp_order)
+    CHUNKS_PER_PROC = 4
+
+    def __init__(self, data_set, nprocs='auto', compressed=False, stacked=False, batched=False,
+                 shared=False, dynamic=False, start_method=None):
         # Initialize multiprocessing specific stuff:
         mp.log_to_stderr()
         self._log = mp.get_logger()
+        if start_method is not None and start_method not in mp.get_all_start_methods():
+            raise ValueError('Start method {!r} is not available on this platform (available: '
+                             '{})!'.format(start_method, ', '.join(mp.get_all_start_methods())))
+        ctx = mp.get_context(start_method)
+        self.start_method = ctx.get_start_method()
+        self.data_set = data_set
+        self.compressed = compressed
+        self.stacked = stacked
+        self.batched = batched
         if nprocs == 'auto':
             nprocs = mp.cpu_count() - 2  # Use two cores less to reserve cpu for the system.
-        self.nprocs = nprocs
+        elif nprocs == 0:
+            raise ValueError('nprocs has to be positive or negative (counted from the cpus)!')
+        elif nprocs < 0:  # Like `n_jobs` of make_projectors: -1 uses all cpus, -2 one less...
+            nprocs = mp.cpu_count() + 1 + nprocs
+        self.nprocs = max(1, min(nprocs, self.data_set.count))  # Don't create idle processes!
+        self.fft_workers = max(1, fft.NTHREADS // self.nprocs)
+        self.shared = shared
+        self.dynamic = dynamic
+        self._shared = None
+        if shared:  # Preallocate the input, output and partial adjoint slots of all processes:
+            self._shared = _SharedArrays({'x': (self.data_set.n,), 'y': (self.data_set.m,),
+                                          'partial': (self.nprocs, self.data_set.n)})
+        self._counter = ctx.Value('i', 0) if dynamic else None  # Index of the next free chunk
+        self._Se_inv = None  # Matrix whose diagonal blocks are loaded into the processes
+        self._Se_inv_blocks = None  # Diagonal blocks of the chunks (None if not block diagonal)
         self.pipes = []
         self.processes = []
-        self.proc_hook_points = [0]  # Hook points of the processes in the output vector
         hp = self.data_set.hook_points  # Hook points of the images in the output vector
-        # Calculate the best distribution of images to the processes:
-        proc_img_range = []
-        n = self.data_set.count // nprocs  # min items per process
-        r = self.data_set.count % nprocs  # remainder items
-        start, stop = 0, n + (r != 0)
-        for proc_id in range(self.nprocs):
-            proc_img_range.append((start, stop))
-            if r > 0:  # use up remainder:
-                r -= 1
-            start = stop
-            stop = stop + n + (r != 0)
+        # Calculate the best distribution of images to the chunks (one per process if static):
+        nchunks = self.nprocs
+        if dynamic:
+            nchunks = min(self.CHUNKS_PER_PROC * self.nprocs, self.data_set.count)
+        chunk_img_range = _split_images(_estimate_costs(self.data_set), nchunks)
+        self.proc_hook_points = [0] + [hp[stop] for start, stop in chunk_img_range]
+        # Create SubForwardModels, the hook points of their images in the output vector and the
+        # index of their first image (for the ramp parameters):
+        tasks = [(self._create_sub_fwd_model(start, stop), hp[start], hp[stop], start)
+                 for start, stop in chunk_img_range]
         # Set up the workers:
         self._log.info('Creating {} processes'.format(self.nprocs))
-        for proc_id, (start, stop) in enumerate(proc_img_range):
-            # Create SubDataSets:
-            sub_data = DataSet(self.data_set.a, self.data_set.dim, self.data_set.b_0,
-                               self.data_set.mask, Se_inv=None)  # Se_inv is set later!
-            # Distribute data to SubDataSets:
-            self.proc_hook_points.append(hp[stop])
-            phasemaps = self.data_set.phasemaps[start:stop]
-            projectors = self.data_set.projectors[start:stop]
-            sub_data.append(phasemaps, projectors)
-            # Create SubForwardModel:
-            sub_fwd_model = ForwardModel(sub_data, ramp_order=None)  # ramps handled in master!
+        for proc_id in range(self.nprocs):
             # Create communication pipe:
-            master_connection, worker_connection = mp.Pipe(duplex=True)  # duplex: both send/recv.!
+            master_connection, worker_connection = ctx.Pipe(duplex=True)  # duplex: both send/recv!
             self.pipes.append(master_connection)  # Master only needs one end!
-            # Create process:
-            p = mp.Process(name='Worker {:02d}'.format(proc_id), target=self._worker,
-                           args=(sub_fwd_model, worker_connection))
+            # Create process (with all chunks if dynamic, otherwise only with its own):
+            proc_tasks = tasks if dynamic else tasks[proc_id:proc_id + 1]
+            worker = _Worker(proc_tasks, proc_id, self.data_set.n, dynamic, self._counter,
+                             self._shared, fft.BACKEND, self.fft_workers)
+            p = ctx.Process(name='Worker {:02d}'.format(proc_id), target=_run_worker,
+                            args=(worker, worker_connection))
             self.processes.append(p)
             # Start process and close worker pipe end after passing it to worker (and starting it):
-            p.start()
+            with lean_pickling():  # Only the spectra of the kernels are sent (if not forked)!
+                p.start()
             worker_connection.close()  # Close pipe ends in processes that don't need them!
         self._log.debug('Creating ' + str(self))
 
+    def __repr__(self):
+        return '%s(data_set=%r, nprocs=%r)' % (self.__class__, self.data_set, self.nprocs)
+
+    def __str__(self):
+        return 'WorkerPool(data_set=%s, nprocs=%s)' % (self.data_set, self.nprocs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        """True if the processes of the pool have been stopped."""
+        return not self.pipes
+
+    def _create_sub_fwd_model(self, start, stop):
+        # Create SubDataSet:
+        sub_data = DataSet(self.data_set.a, self.data_set.dim, self.data_set.b_0,
+                           self.data_set.mask, Se_inv=None)  # Se_inv is set later!
+        # Distribute data to SubDataSet:
+        sub_data.append(self.data_set.phasemaps[start:stop], self.data_set.projectors[start:stop])
+        # Create SubForwardModel:
+        return ForwardModel(sub_data, ramp_order=None,  # ramps handled in master!
+                            compressed=self.compressed, stacked=self.stacked,
+                            batched=self.batched)
+
+    def _send_input(self, method, vector, *extra):
+        assert not self.closed, 'The worker pool is already closed!'
+        if self.dynamic:  # Reset the chunk counter before the processes start working:
+            self._counter.value = 0
+        if self.shared:  # Write input to shared memory, pipes only carry the method name:
+            self._shared['y' if method == 'jac_T_dot' else 'x'][...] = vector
+        php = self.proc_hook_points
+        for proc_id in range(self.nprocs):
+            if self.shared:
+                arguments = ()
+            elif method == 'jac_T_dot' and not self.dynamic:  # Only send the own part:
+                arguments = (vector[php[proc_id]:php[proc_id + 1]], php[proc_id])
+            else:
+                arguments = (vector, 0)
+            self.pipes[proc_id].send((method, arguments + extra))
+
+    def _recv_images(self, result):
+        for proc_id in range(self.nprocs):
+            images = self.pipes[proc_id].recv()  # Only an acknowledgement if shared!
+            if not self.shared:
+                for start, stop, sub_result in images:
+                    result[start:stop] += sub_result
+        if self.shared:  # All processes have written their images into the shared output:
+            result += self._shared['y']
+
+    def _reduce_partials(self):
+        # Sum the partial results of all processes pairwise in place (tree reduction):
+        step = 1
+        while step < self.nprocs:
+            targets = range(0, self.nprocs - step, 2 * step)
+            for proc_id in targets:
+                self.pipes[proc_id].send(('_reduce', (proc_id + step,)))
+            for proc_id in targets:
+                self.pipes[proc_id].recv()
+            step *= 2
+        return self._shared['partial'][0].copy()  # Copy, the slot is overwritten next time!
+
+    def map_images(self, method, vector, result):
+        """Let the processes map a (ramp-free) `vector` and add their images to `result`.
+
+        Parameters
+        ----------
+        method : {'__call__', 'jac_dot'}
+            Method of the forward models of the processes which is used for the mapping.
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (without ramp parameters).
+        result : :class:`~numpy.ndarray` (N=1)
+            Vector of all 2D phase maps, to which the images are added (in place).
+
+        Returns
+        -------
+        None
+
+        """
+        self._send_input(method, vector)
+        self._recv_images(result)
+
+    def jac_T_dot(self, vector):
+        """Calculate the product of the transposed Jacobi matrix (without ramps) with a `vector`.
+
+        Parameters
+        ----------
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of all 2D phase maps one after another in one vector.
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Sum of the transposed products of all processes (without ramp parameters).
+
+        """
+        self._send_input('jac_T_dot', vector)
+        if self.shared:  # Wait for all processes, then let them sum up their partial results:
+            for proc_id in range(self.nprocs):
+                self.pipes[proc_id].recv()
+            return self._reduce_partials()
+        # Initialize result vector:
+        result = np.zeros(self.data_set.n)
+        # Get process results from the pipes:
+        for proc_id in range(self.nprocs):
+            result += self.pipes[proc_id].recv()
+        return result
+
+    def set_Se_inv(self, Se_inv):
+        """Load the diagonal blocks of `Se_inv` into the processes (for :func:`~.normal_dot`).
+
+        The blocks are only sent if `Se_inv` is not already loaded (same object).
+
+        Parameters
+        ----------
+        Se_inv : :class:`~numpy.ndarray` (N=2) or :class:`~scipy.sparse.spmatrix`
+            Inverted covariance matrix of the measurement errors of all images.
+
+        Returns
+        -------
+        block_diagonal : bool
+            True if `Se_inv` only couples images of the same chunk and could be loaded. If False,
+            :func:`~.normal_dot` can not be used with this matrix.
+
+        """
+        assert not self.closed, 'The worker pool is already closed!'
+        if Se_inv is self._Se_inv:
+            return self._Se_inv_blocks is not None
+        php = self.proc_hook_points
+        blocks = _get_Se_inv_blocks(Se_inv, zip(php[:-1], php[1:]))
+        self._Se_inv, self._Se_inv_blocks = Se_inv, blocks
+        if blocks is not None:  # Every process gets the blocks of the chunks it can work on:
+            for proc_id in range(self.nprocs):
+                proc_blocks = blocks if self.dynamic else blocks[proc_id:proc_id + 1]
+                self.pipes[proc_id].send(('_set_Se_inv', (proc_blocks,)))
+            for proc_id in range(self.nprocs):
+                self.pipes[proc_id].recv()
+        return blocks is not None
+
+    def normal_dot(self, vector, ramp_order, ramp_params):
+        """Calculate the product of the normal matrix ``J^T Se_inv J`` with a `vector`.
+
+        Every process maps its images, adds their ramps, applies its diagonal block of the
+        `Se_inv` loaded with :func:`~.set_Se_inv` and projects back, so that only the partial
+        results have to be transferred.
+
+        Parameters
+        ----------
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (without ramp parameters).
+        ramp_order : int or None
+            Polynomial order of the ramps of the images.
+        ramp_params : :class:`~numpy.ndarray` (N=2)
+            Ramp parameters of all images with shape (deg_of_freedom, count).
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Sum of the partial results of all processes (without ramp parameters).
+        ramp_vector : :class:`~numpy.ndarray` (N=2)
+            Transposed product for the ramp parameters (same shape as `ramp_params`).
+
+        """
+        assert self._Se_inv_blocks is not None, 'No block diagonal Se_inv loaded!'
+        self._send_input('normal_dot', vector, ramp_order, ramp_params)
+        ramp_vector = np.zeros_like(ramp_params)
+        result = None if self.shared else np.zeros(self.data_set.n)
+        for proc_id in range(self.nprocs):
+            if self.shared:
+                ramp_vector += self.pipes[proc_id].recv()
+            else:
+                sub_result, sub_ramp = self.pipes[proc_id].recv()
+                result += sub_result
+                ramp_vector += sub_ramp
+        if self.shared:  # Let the processes sum up their partial results:
+            result = self._reduce_partials()
+        return result, ramp_vector
+
+    def close(self):
+        """'Stop the processes, let them join the master process and free the shared memory.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.closed:
+            return
+        # Finalize processes:
+        for proc_id in range(self.nprocs):
+            self.pipes[proc_id].send('STOP')
+            self.pipes[proc_id].close()
+        self.pipes = []
+        # Exit the completed processes:
+        for p in self.processes:
+            p.join()
+        if self._shared is not None:  # Free the shared memory:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+
+class DistributedForwardModel(ForwardModel):
+    """Multiprocessing class for mapping 3D magnetic distributions to 2D phase maps.
+
+    Subclass of the :class:`~.ForwardModel` class which implements multiprocessing strategies
+    to speed up the calculations. The interface is the same, internally, the images are mapped by
+    the processes of a :class:`~.WorkerPool`, which is either created during construction or
+    given as `pool` (to reuse the processes for several forward models and reconstructions).
+    Ramps are calculated in the main thread. The :func:`~.finalize` method can be used to force
+    the processes to join if the class is no longer used (this does not affect a given `pool`).
+
+    Attributes
+    ----------
+    data_set: :class:`~dataset.DataSet`
+        :class:`~dataset.DataSet` object, which stores all required information calculation.
+    ramp_order : int or None (default)
+        Polynomial order of the additional phase ramp which will be added to the phase maps.
+        All ramp parameters have to be at the end of the input vector and are split automatically.
+        Default is None (no ramps are added).
+    nprocs: int or 'auto'
+        Number of processes which should be created (see :class:`~.WorkerPool`). Default is
+        'auto'.
+    compressed, stacked, batched, shared, dynamic : bool, optional
+        Options of the processes, see :class:`~.WorkerPool`. All default to False.
+    start_method : str or None, optional
+        Start method of the processes, see :class:`~.WorkerPool`. Default is None (the default
+        start method of the platform).
+    pool : :class:`~.WorkerPool`, optional
+        Running pool of processes for the `data_set`, to which the forward model is attached. If
+        None (default), a new pool is created (and closed by :func:`~.finalize`), and the above
+        options are used. Otherwise, the options of the `pool` apply.
+
+    """
+
+    def __init__(self, data_set, ramp_order=None, nprocs='auto', compressed=False, stacked=False,
+                 batched=False, shared=False, dynamic=False, pool=None, start_method=None):
+        # Evoke super constructor to set up the normal ForwardModel:
+        super().__init__(data_set, ramp_order)
+        self._owns_pool = pool is None
+        if pool is None:
+            pool = WorkerPool(data_set, nprocs, compressed, stacked, batched, shared, dynamic,
+                              start_method)
+        else:
+            assert not pool.closed, 'The worker pool is already closed!'
+            assert pool.data_set.hook_points == data_set.hook_points \
+                and pool.data_set.n == data_set.n, 'The pool must map the same images!'
+        self.pool = pool
+        self._log = pool._log
+        # Only used by the processes, master does not project:
+        self.compressed = pool.compressed
+        self.stacked = pool.stacked
+        self.batched = pool.batched
+        self.shared = pool.shared
+        self.dynamic = pool.dynamic
+        self.start_method = pool.start_method
+        self.nprocs = pool.nprocs
+        self.proc_hook_points = pool.proc_hook_points
+
     def __call__(self, x):
         # Extract ramp parameters if necessary (x will be shortened!):
         x = self.ramp.extract_ramp_params(x)
-        # Distribute input to processes and start working:
-        for proc_id in range(self.nprocs):
-            self.pipes[proc_id].send(('__call__', (x,)))
         # Initialize result vector and shorten hook point names:
         result = np.zeros(self.m)
         hp = self.hook_points
-        php = self.proc_hook_points
         # Calculate ramps (if necessary):
         if self.ramp_order is not None:
             for i in range(self.data_set.count):
                 result[hp[i]:hp[i + 1]] += self.ramp(i).phase.ravel()
-        # Get process results from the pipes:
-        for proc_id in range(self.nprocs):
-            result[php[proc_id]:php[proc_id + 1]] += self.pipes[proc_id].recv()
+        # Let the processes add their images:
+        self.pool.map_images('__call__', x, result)
         # Return result:
         return result
 
-    def _worker(self, fwd_model, pipe):
-        for method, arguments in iter(pipe.recv, 'STOP'):
-            # TODO: Properly rethrow Exceptions to master (set to self.exc_info)!
-            # TODO: see: https://nedbatchelder.com/blog/200711/rethrowing_exceptions_in_python.html
-            sys.stdout.flush()
-            result = getattr(fwd_model, method)(*arguments)
-            pipe.send(result)
-        sys.stdout.flush()
-        pipe.close()  # Close worker end of the pipe too, to allow garbage collection!
-
     def jac_dot(self, x, vector):
         """Calculate the product of the Jacobi matrix with a given `vector`.
 
@@ -471,20 +1316,15 @@ class DistributedForwardModel(ForwardModel):
         """
         # Extract ramp parameters if necessary (x will be shortened!):
         vector = self.ramp.extract_ramp_params(vector)
-        # Distribute input to processes and start working:
-        for proc_id in range(self.nprocs):
-            self.pipes[proc_id].send(('jac_dot', (None, vector)))
         # Initialize result vector and shorten hook point names:
         result = np.zeros(self.m)
         hp = self.hook_points
-        php = self.proc_hook_points
         # Calculate ramps (if necessary):
         if self.ramp_order is not None:
             for i in range(self.data_set.count):
                 result[hp[i]:hp[i + 1]] += self.ramp.jac_dot(i)
-        # Get process results from the pipes:
-        for proc_id in range(self.nprocs):
-            result[php[proc_id]:php[proc_id + 1]] += self.pipes[proc_id].recv()
+        # Let the processes add their images:
+        self.pool.map_images('jac_dot', vector, result)
         # Return result:
         return result
 
@@ -507,33 +1347,281 @@ class DistributedForwardModel(ForwardModel):
             the input `vector`. If necessary, transposed ramp parameters are concatenated.
 
         """
-        php = self.proc_hook_points
-        # Distribute input to processes and start working:
-        for proc_id in range(self.nprocs):
-            sub_vec = vector[php[proc_id]:php[proc_id + 1]]
-            self.pipes[proc_id].send(('jac_T_dot', (None, sub_vec)))
-        # Calculate ramps:
+        result = self.pool.jac_T_dot(vector)
         ramp_params = self.ramp.jac_T_dot(vector)  # calculate ramp_params separately!
-        # Initialize result vector:
-        result = np.zeros(3 * self.data_set.mask.sum())
-        # Get process results from the pipes:
-        for proc_id in range(self.nprocs):
-            result += self.pipes[proc_id].recv()
-        # Return result:
         return np.concatenate((result, ramp_params))
 
+    def normal_dot(self, x, vector):
+        """Calculate the product of the normal matrix ``J^T Se_inv J`` with a given `vector`.
+
+        The processes apply their diagonal blocks of `Se_inv` themselves (see
+        :func:`~.WorkerPool.normal_dot`), which saves one round trip and the transfer of the
+        phase maps. Falls back to separate products if `Se_inv` couples images of different
+        processes.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The Jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation).
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (and the ramp parameters).
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the normal matrix (which is not explicitely calculated) with the input
+            `vector`. If necessary, transposed ramp parameters are concatenated.
+
+        """
+        if not self.pool.set_Se_inv(self.Se_inv):  # Not block diagonal for the processes!
+            return super().normal_dot(x, vector)
+        # Extract ramp parameters if necessary (vector will be shortened!):
+        vector = self.ramp.extract_ramp_params(vector)
+        result, ramp_params = self.pool.normal_dot(vector, self.ramp_order, self.ramp.param_cache)
+        return np.concatenate((result, ramp_params.ravel()))
+
     def finalize(self):
         """'Finalize the processes and let them join the master process.
 
+        Processes of a `pool` which was given during construction keep running, close the pool
+        itself when it is not needed anymore.
+
         Returns
         -------
         None
 
         """
-        # Finalize processes:
-        for proc_id in range(self.nprocs):
-            self.pipes[proc_id].send('STOP')
-            self.pipes[proc_id].close()
-        # Exit the completed processes:
-        for p in self.processes:
-            p.join()
+        if self._owns_pool:
+            self.pool.close()
+
+
+class ThreadedForwardModel(ForwardModel):
+    """Multithreaded class for mapping 3D magnetic distributions to 2D phase maps.
+
+    Subclass of the :class:`~.ForwardModel` class which distributes the images over the threads of
+    a :class:`~concurrent.futures.ThreadPoolExecutor`. The sparse products of the projectors and
+    the FFTs of the phasemappers release the GIL, so the threads run in parallel without the
+    start-up and communication costs of the :class:`~.DistributedForwardModel` (nothing is
+    pickled or forked). Each thread owns a ForwardModel operating on a subset of the DataSet with
+    its own copies of the projectors and phasemappers (and thus their scratch buffers), the
+    kernels, spectra and weight matrices are shared. Results are written into disjoint parts of
+    the output. Ramps are calculated in the main thread. The :func:`~.finalize` method shuts the
+    threads down.
+
+    Attributes
+    ----------
+    data_set: :class:`~dataset.DataSet`
+        :class:`~dataset.DataSet` object, which stores all required information calculation.
+    ramp_order : int or None (default)
+        Polynomial order of the additional phase ramp which will be added to the phase maps.
+        All ramp parameters have to be at the end of the input vector and are split automatically.
+        Default is None (no ramps are added).
+    nthreads: int or 'auto'
+        Number of threads which should be used. 'auto' (default) uses one thread per cpu, negative
+        numbers are counted from the number of cpus (see :class:`~.WorkerPool`). Never more
+        threads than images are used. The images are distributed according to their
+        estimated costs (see :class:`~.DistributedForwardModel`).
+    compressed : bool, optional
+        If True, the forward models of the threads use projectors which are compressed to the
+        3D mask of the `data_set` (see :class:`~.ForwardModel`). Default is False.
+    stacked : bool, optional
+        If True, the forward models of the threads stack the weight matrices of their
+        projectors (see :class:`~.ForwardModel`). Default is False.
+    batched : bool, optional
+        If True, the forward models of the threads phase map their images which share a kernel
+        in batches (see :class:`~.ForwardModel`). Default is False.
+    fft_workers : int
+        Number of FFT threads of the phasemappers of every thread. The FFT threads of
+        :mod:`~pyramid.fft` (see :func:`~pyramid.fft.configure_backend`) are divided among the
+        threads, so that the cpus are not oversubscribed (and the FFTW plans of every thread are
+        planned for this number). Phasemappers whose `workers` were set explicitly keep them.
+
+    """
+
+    _log = logging.getLogger(__name__ + '.ThreadedForwardModel')
+
+    def __init__(self, data_set, ramp_order=None, nthreads='auto', compressed=False,
+                 stacked=False, batched=False):
+        # Evoke super constructor to set up the normal ForwardModel:
+        super().__init__(data_set, ramp_order)
+        # Only used by the threads, master does not project:
+        self.compressed = compressed
+        self.stacked = stacked
+        self.batched = batched
+        if nthreads == 'auto':
+            nthreads = os.cpu_count() or 1
+        elif nthreads == 0:
+            raise ValueError('nthreads has to be positive or negative (counted from the cpus)!')
+        elif nthreads < 0:  # -1 uses all cpus, -2 one less... (like the `nprocs` of WorkerPool)
+            nthreads = (os.cpu_count() or 1) + 1 + nthreads
+        self.nthreads = max(1, min(nthreads, self.data_set.count))
+        self.fft_workers = max(1, fft.NTHREADS // self.nthreads)
+        self.sub_fwd_models = []
+        self.thread_hook_points = [0]  # Hook points of the threads in the output vector
+        hp = self.data_set.hook_points  # Hook points of the images in the output vector
+        for start, stop in _split_images(_estimate_costs(self.data_set), self.nthreads):
+            # Create SubDataSet with own copies of the projectors and phasemappers:
+            copies = {}
+            sub_data = DataSet(self.data_set.a, self.data_set.dim, self.data_set.b_0,
+                               self.data_set.mask, Se_inv=None)
+            phasemappers = [_thread_local_copy(m, copies)
+                            for m in self.data_set.phasemappers[start:stop]]
+            for mapper in phasemappers:
+                if getattr(mapper, 'workers', None) is None:  # Divide the FFT threads:
+                    mapper.workers = self.fft_workers
+            sub_data.append(self.data_set.phasemaps[start:stop],
+                            [_thread_local_copy(p, copies)
+                             for p in self.data_set.projectors[start:stop]],
+                            phasemappers)
+            self.thread_hook_points.append(hp[stop])
+            # Create SubForwardModel:
+            self.sub_fwd_models.append(ForwardModel(sub_data, ramp_order=None,  # ramps in master!
+                                                    compressed=compressed, stacked=stacked,
+                                                    batched=batched))
+        self._Se_inv = None  # Matrix from which the diagonal blocks of the threads are taken
+        self._Se_inv_blocks = None
+        self._executor = ThreadPoolExecutor(max_workers=self.nthreads,
+                                            thread_name_prefix='ForwardModel')
+        self._log.debug('Creating ' + str(self))
+
+    def _map_images(self, method, arguments, result):
+        # Let every thread write the images of its SubForwardModel into its part of the result:
+        thp = self.thread_hook_points
+
+        def work(thread_id):
+            sub_result = getattr(self.sub_fwd_models[thread_id], method)(*arguments)
+            result[thp[thread_id]:thp[thread_id + 1]] += sub_result
+
+        list(self._executor.map(work, range(self.nthreads)))  # list() rethrows exceptions!
+
+    def __call__(self, x):
+        # Extract ramp parameters if necessary (x will be shortened!):
+        x = self.ramp.extract_ramp_params(x)
+        result = np.zeros(self.m)
+        # Calculate ramps (if necessary):
+        if self.ramp_order is not None:
+            hp = self.hook_points
+            for i in range(self.data_set.count):
+                result[hp[i]:hp[i + 1]] += self.ramp(i).phase.ravel()
+        self._map_images('__call__', (x,), result)
+        return result
+
+    def jac_dot(self, x, vector):
+        """Calculate the product of the Jacobi matrix with a given `vector`.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The Jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation). It is
+            implemented for the case that in the future nonlinear problems have to be solved.
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution. First the `x`, then the `y` and
+            lastly the `z` components are listed. Ramp parameters are also added at the end if
+            necessary.
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the Jacobi matrix (which is not explicitly calculated) with the input
+            `vector`.
+
+        """
+        # Extract ramp parameters if necessary (vector will be shortened!):
+        vector = self.ramp.extract_ramp_params(vector)
+        result = np.zeros(self.m)
+        # Calculate ramps (if necessary):
+        if self.ramp_order is not None:
+            hp = self.hook_points
+            for i in range(self.data_set.count):
+                result[hp[i]:hp[i + 1]] += self.ramp.jac_dot(i)
+        self._map_images('jac_dot', (None, vector), result)
+        return result
+
+    def jac_T_dot(self, x, vector):
+        """'Calculate the product of the transposed Jacobi matrix with a given `vector`.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation). Is used
+            for the case that in the future nonlinear problems have to be solved.
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of all 2D phase maps one after another in one vector.
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the transposed Jacobi matrix (which is not explicitely calculated) with
+            the input `vector`. If necessary, transposed ramp parameters are concatenated.
+
+        """
+        thp = self.thread_hook_points
+
+        def work(thread_id):
+            sub_vec = vector[thp[thread_id]:thp[thread_id + 1]]
+            return self.sub_fwd_models[thread_id].jac_T_dot(None, sub_vec)
+
+        # Sum up the partial results of all threads:
+        result = np.zeros(self.data_set.n)
+        for sub_result in self._executor.map(work, range(self.nthreads)):
+            result += sub_result
+        ramp_params = self.ramp.jac_T_dot(vector)  # calculate ramp_params separately!
+        return np.concatenate((result, ramp_params))
+
+    def normal_dot(self, x, vector):
+        """Calculate the product of the normal matrix ``J^T Se_inv J`` with a given `vector`.
+
+        Every thread applies its diagonal block of `Se_inv` to its images and projects back
+        itself. Falls back to separate products if `Se_inv` couples images of different threads.
+
+        Parameters
+        ----------
+        x : :class:`~numpy.ndarray` (N=1)
+            Evaluation point of the jacobi-matrix. The Jacobi matrix is constant for a linear
+            problem, thus `x` can be set to None (it is not used int the computation).
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vectorized form of the 3D magnetization distribution (and the ramp parameters).
+
+        Returns
+        -------
+        result_vector : :class:`~numpy.ndarray` (N=1)
+            Product of the normal matrix (which is not explicitely calculated) with the input
+            `vector`. If necessary, transposed ramp parameters are concatenated.
+
+        """
+        thp = self.thread_hook_points
+        if self.Se_inv is not self._Se_inv:  # Cut out the diagonal blocks of the threads:
+            self._Se_inv = self.Se_inv
+            self._Se_inv_blocks = _get_Se_inv_blocks(self.Se_inv, zip(thp[:-1], thp[1:]))
+        if self._Se_inv_blocks is None:  # Not block diagonal for the threads!
+            return super().normal_dot(x, vector)
+        # Extract ramp parameters if necessary (vector will be shortened!):
+        vector = self.ramp.extract_ramp_params(vector)
+        ramp_params = self.ramp.param_cache
+        img_starts = np.cumsum([0] + [m.data_set.count for m in self.sub_fwd_models])
+
+        def work(thread_id):
+            sub_params = ramp_params[:, img_starts[thread_id]:img_starts[thread_id + 1]]
+            return _normal_dot_part(self.sub_fwd_models[thread_id], self._Se_inv_blocks[thread_id],
+                                    vector, self.ramp_order, sub_params)
+
+        # Sum up the partial results of all threads:
+        result = np.zeros(self.data_set.n)
+        ramp_T = []
+        for sub_result, sub_ramp in self._executor.map(work, range(self.nthreads)):
+            result += sub_result
+            ramp_T.append(sub_ramp)
+        return np.concatenate((result, np.concatenate(ramp_T, axis=1).ravel()))
+
+    def finalize(self):
+        """'Shut the threads down.
+
+        Returns
+        -------
+        None
+
+        """
+        self._executor.shutdown()
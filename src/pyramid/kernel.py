@@ -5,13 +5,25 @@
 """This module provides the :class:`~.Kernel` class, representing the phase contribution of one
 single magnetized pixel."""
 
+import contextlib
+import hashlib
 import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from multiprocessing import shared_memory
 
 import numpy as np
 
-from jutil import fft
+import h5py
 
-__all__ = ['Kernel', 'PHI_0', 'KernelCharge']
+from pyramid import fft
+from pyramid.fft import get_padded_shape
+
+__all__ = ['Kernel', 'PHI_0', 'KernelCharge', 'KernelCache', 'get_kernel', 'set_kernel_cache',
+           'lean_pickling']
+_log = logging.getLogger(__name__)
 
 PHI_0 = 2067.83  # magnetic flux in T*nm²
 H_BAR = 6.626E-34  # Planck constant in J*s
@@ -21,6 +33,26 @@ C = 2.998E8  # speed of light in m/s
 EPS_0 = 8.8542E-12  # electrical field constant
 
 
+_lean_pickling = threading.local()  # Flag of the `lean_pickling` context (per thread)
+
+
+@contextlib.contextmanager
+def lean_pickling():
+    """Context manager in which kernels are pickled lean (only their spectra).
+
+    Kernels pickled inside of this context (in the same thread, e.g. when they are sent to worker
+    processes) skip their real space kernels `u` and `v` and are `lean` when unpickled. Outside,
+    all arrays are pickled (e.g. when a :class:`~.DataSet` is saved to disk).
+
+    """
+    previous = getattr(_lean_pickling, 'active', False)
+    _lean_pickling.active = True
+    try:
+        yield
+    finally:
+        _lean_pickling.active = previous
+
+
 class Kernel(object):
     """Class for calculating kernel matrices for the phase calculation.
 
@@ -42,8 +74,8 @@ class Kernel(object):
     dim_kern : tuple of int (N=2)
         Dimensions of the kernel, which is ``2N-1`` for both axes compared to `dim_uv`.
     dim_pad : tuple of int (N=2)
-        Dimensions of the padded FOV, which is ``2N`` (if FFTW is used) or the next highest power
-        of 2 (for numpy-FFT).
+        Dimensions of the padded FOV, which are at least ``2N-1`` and chosen by the padding policy
+        of :func:`~pyramid.fft.get_padded_shape` (fast FFT sizes by default).
     dim_fft : tuple of int (N=2)
         Dimensions of the grid, which is used for the FFT, taking into account that a RFFT should
         be used (one axis is halved in comparison to `dim_pad`).
@@ -52,13 +84,17 @@ class Kernel(object):
     geometry : {'disc', 'slab'}, optional
         The elementary geometry of the single magnetized pixel.
     u : :class:`~numpy.ndarray` (N=3)
-        The phase contribution of one pixel magnetized in u-direction.
+        The phase contribution of one pixel magnetized in u-direction (regenerated on demand for
+        `lean` kernels).
     v : :class:`~numpy.ndarray` (N=3)
-        The phase contribution of one pixel magnetized in v-direction.
+        The phase contribution of one pixel magnetized in v-direction (regenerated on demand for
+        `lean` kernels).
     u_fft : :class:`~numpy.ndarray` (N=3)
-        The real FFT of the phase contribution of one pixel magnetized in u-direction.
+        The real FFT of the phase contribution of one pixel magnetized in u-direction (with the
+        complex data type of the same precision as `dtype`, e.g. complex64 for float32).
     v_fft : :class:`~numpy.ndarray` (N=3)
-        The real FFT of the phase contribution of one pixel magnetized in v-direction.
+        The real FFT of the phase contribution of one pixel magnetized in v-direction (same
+        data type as `u_fft`).
     slice_phase : tuple (N=2) of :class:`slice`
         A tuple of :class:`slice` objects to extract the original FOV from the increased one with
         size `dim_pad` for the elementary kernel phase. The kernel is shifted, thus the center is
@@ -71,13 +107,90 @@ class Kernel(object):
         perturbation of this reference by the object itself (via fringing fields), (y, x).
     dtype: numpy dtype, optional
         Data type of the kernel. Default is np.float32.
+    lean: bool, optional
+        If True, only the spectra `u_fft` and `v_fft` are kept. The real space kernels are
+        calculated in blocks of rows directly into the padded FFT input and are regenerated when
+        `u` or `v` are accessed, which costs about as much as the construction of the kernel. The
+        regenerated (read-only) arrays are only weakly cached, i.e. they are shared by all
+        accesses as long as one of them is still referenced. Default is False.
+
+    Notes
+    -----
+    Pickled kernels keep all their arrays (e.g. when a :class:`~.DataSet` is saved). Inside of
+    :func:`~.lean_pickling` (e.g. to send the kernel to worker processes), only the spectra are
+    transferred and the unpickled kernel is `lean`.
 
     """
 
     _log = logging.getLogger(__name__ + '.Kernel')
 
-    def __init__(self, a, dim_uv, b_0=1., prw_vec=None, geometry='disc', dtype=np.float32):
+    SHARED_ARRAYS = ('u', 'v', 'u_fft', 'v_fft')
+
+    CHUNK_SIZE = 2 ** 18  # Number of kernel elements which are calculated at once
+
+    def __init__(self, a, dim_uv, b_0=1., prw_vec=None, geometry='disc', dtype=np.float32,
+                 lean=False):
         self._log.debug('Calling __init__')
+        self._set_parameters(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+        dtype_fft = np.result_type(dtype, np.complex64)  # Keep the precision of the kernel!
+        if lean:  # Calculate the kernels one after another into the same padded buffer:
+            buffer = np.zeros(self.dim_pad, dtype=dtype)
+            kernel = buffer[:self.dim_kern[0], :self.dim_kern[1]]  # Padded on the far end
+            self._get_kernel('u', out=kernel)
+            self.u_fft = fft.rfftn(buffer).astype(dtype_fft, copy=False)
+            self._get_kernel('v', out=kernel)
+            self.v_fft = fft.rfftn(buffer).astype(dtype_fft, copy=False)
+        else:
+            # TODO: u, v are coordinates, rename self.u/v to self.kern_u/v!
+            self.u = self._get_kernel('u')
+            self.v = self._get_kernel('v')
+            # Calculate Fourier trafo of kernel components:
+            self.u_fft = fft.rfftn(self.u, self.dim_pad).astype(dtype_fft, copy=False)
+            self.v_fft = fft.rfftn(self.v, self.dim_pad).astype(dtype_fft, copy=False)
+        self._log.debug('Created ' + str(self))
+
+    def _get_kernel(self, component, out=None):
+        # Calculate kernel (single pixel phase) of the `component` ('u' or 'v') in blocks of rows:
+        # [M_0] = A/m  --> This is the magnetization, not the magnetic moment (A/m * m³ = Am²)!
+        # [PHI_0 / µ_0] = Tm² / Tm/A = Am
+        # [b_0] = [M_0] * [µ_0] = A/m * N/A² = N/Am = T
+        # [coeff] = [b_0 * a² / (2*PHI_0)] = T * m² / Tm² = 1  --> without unit (phase)!
+        coeff = self.b_0 * self.a ** 2 / (2 * PHI_0)  # Minus is gone because of neg. z-direction
+        if component == 'v':  # TODO: The minus sign belongs into the phasemapper (debatable)!
+            coeff = -coeff
+        v_dim, u_dim = self.dim_uv
+        u = np.linspace(-(u_dim - 1), u_dim - 1, num=2 * u_dim - 1)
+        v = np.linspace(-(v_dim - 1), v_dim - 1, num=2 * v_dim - 1)
+        if out is None:
+            out = np.empty(self.dim_kern, dtype=self.dtype)
+        rows = max(self.CHUNK_SIZE // len(u), 1)
+        for start in range(0, len(v), rows):
+            uu, vv = u[None, :], v[start:start + rows, None]
+            out[start:start + rows] = coeff * self._get_component_phase(component, uu, vv)
+            # Include perturbed reference wave:
+            if self.prw_vec is not None:
+                uu, vv = uu + self.prw_vec[1], vv + self.prw_vec[0]
+                out[start:start + rows] -= coeff * self._get_component_phase(component, uu, vv)
+        return out
+
+    def _get_component_phase(self, component, uu, vv):
+        if component == 'u':
+            return self._get_elementary_phase(self.geometry, uu, vv, self.a)
+        return self._get_elementary_phase(self.geometry, vv, uu, self.a)
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, regenerates the real space kernels of lean kernels:
+        if name in ('u', 'v') and 'dim_kern' in self.__dict__:
+            kernel = self._regenerated.get(name)  # Still referenced from an earlier access?
+            if kernel is None:
+                kernel = self._get_kernel(name)
+                kernel.flags.writeable = False  # Shared by all accesses!
+                self._regenerated[name] = kernel
+            return kernel
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            self.__class__.__name__, name))
+
+    def _set_parameters(self, a, dim_uv, b_0, prw_vec, geometry, dtype=np.float32, lean=False):
         # Set basic properties:
         self.b_0 = b_0
         self.prw_vec = prw_vec
@@ -85,53 +198,102 @@ class Kernel(object):
         self.dim_kern = tuple(2 * np.array(dim_uv) - 1)  # Dimensions of the kernel
         self.a = a
         self.geometry = geometry
+        self.dtype = np.dtype(dtype)
+        self.lean = lean
+        self._shared = {}
+        self._regenerated = weakref.WeakValueDictionary()  # Real space kernels of lean kernels
         # Set up FFT:
-        if fft.HAVE_FFTW:
-            self.dim_pad = tuple(2 * np.array(dim_uv))  # is at least even (not nec. power of 2)
-        else:
-            self.dim_pad = tuple(2 ** np.ceil(np.log2(2 * np.array(dim_uv))).astype(int))  # pow(2)
+        self.dim_pad = get_padded_shape(dim_uv)  # at least 2N-1 and fast (see pyramid.fft)
         self.dim_fft = (self.dim_pad[0], self.dim_pad[1] // 2 + 1)  # last axis is real
         self.slice_phase = (slice(dim_uv[0] - 1, self.dim_kern[0]),  # Shift because kernel center
                             slice(dim_uv[1] - 1, self.dim_kern[1]))  # is not at (0, 0)!
         self.slice_mag = (slice(0, dim_uv[0]),  # Magnetization is padded on the far end!
                           slice(0, dim_uv[1]))  # (Phase cutout is shifted as listed above)
-        # Calculate kernel (single pixel phase):
-        # [M_0] = A/m  --> This is the magnetization, not the magnetic moment (A/m * m³ = Am²)!
-        # [PHI_0 / µ_0] = Tm² / Tm/A = Am
-        # [b_0] = [M_0] * [µ_0] = A/m * N/A² = N/Am = T
-        # [coeff] = [b_0 * a² / (2*PHI_0)] = T * m² / Tm² = 1  --> without unit (phase)!
-        coeff = b_0 * a ** 2 / (2 * PHI_0)  # Minus is gone because of negative z-direction
-        v_dim, u_dim = dim_uv
-        u = np.linspace(-(u_dim - 1), u_dim - 1, num=2 * u_dim - 1)
-        v = np.linspace(-(v_dim - 1), v_dim - 1, num=2 * v_dim - 1)
-        uu, vv = np.meshgrid(u, v)
-        # TODO: u, v are coordinates, rename self.u/v to self.kern_u/v!
-        self.u = np.empty(self.dim_kern, dtype=dtype)  # TODO: Is this necessary?
-        self.v = np.empty(self.dim_kern, dtype=dtype)  # TODO: Move to _get_elementary_phase?
-        self.u[...] = coeff * self._get_elementary_phase(geometry, uu, vv, a)
-        # TODO: The minus sign belongs into the phasemapper (debatable)!
-        self.v[...] = coeff * -self._get_elementary_phase(geometry, vv, uu, a)
-        # Include perturbed reference wave:
-        if prw_vec is not None:
-            uu += prw_vec[1]
-            vv += prw_vec[0]
-            self.u[...] -= coeff * self._get_elementary_phase(geometry, uu, vv, a)
-            # TODO: The minus sign belongs into the phasemapper (debatable)!
-            self.v[...] -= coeff * -self._get_elementary_phase(geometry, vv, uu, a)
-        # Calculate Fourier trafo of kernel components:
-        self.u_fft = fft.rfftn(self.u, self.dim_pad)
-        self.v_fft = fft.rfftn(self.v, self.dim_pad)
-        self._log.debug('Created ' + str(self))
 
     def __repr__(self):
         self._log.debug('Calling __repr__')
-        return '%s(a=%r, dim_uv=%r, b_0=%r, prw_vec=%r, geometry=%r)' % \
-               (self.__class__, self.a, self.dim_uv, self.b_0, self.prw_vec, self.geometry)
+        return '%s(a=%r, dim_uv=%r, b_0=%r, prw_vec=%r, geometry=%r, lean=%r)' % \
+               (self.__class__, self.a, self.dim_uv, self.b_0, self.prw_vec, self.geometry,
+                self.lean)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_regenerated', None)
+        if getattr(_lean_pickling, 'active', False):  # Only the spectra are sent (to workers):
+            state.pop('u', None)
+            state.pop('v', None)
+            state['lean'] = True
+        # Arrays in shared memory are only referenced by name, the receiving process attaches:
+        shared = state.pop('_shared', {})
+        state['_shared_arrays'] = {name: (shm.name, state.pop(name).shape, self.dtypes[name])
+                                   for name, shm in shared.items() if name in state}
+        return state
+
+    def __setstate__(self, state):
+        shared_arrays = state.pop('_shared_arrays', {})
+        # Kernels pickled by older versions have no `lean` and `dtype` attributes:
+        state.setdefault('lean', 'u' not in state)
+        if 'dtype' not in state:
+            state['dtype'] = state['u'].dtype if 'u' in state else \
+                np.finfo(state['u_fft'].dtype).dtype  # Real counterpart of the spectra
+        self.__dict__.update(state)
+        self._shared = {}
+        self._regenerated = weakref.WeakValueDictionary()
+        for name, (shm_name, shape, dtype) in shared_arrays.items():
+            shm = shared_memory.SharedMemory(name=shm_name)
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            array.flags.writeable = False
+            setattr(self, name, array)
+            self._shared[name] = shm
+
+    @property
+    def arrays(self):
+        """Names of the stored kernel arrays (`u`, `v`, `u_fft` and `v_fft`, only the spectra for
+        lean kernels)."""
+        return tuple(name for name in self.SHARED_ARRAYS if name in self.__dict__)
+
+    @property
+    def dtypes(self):
+        """Data types of the stored kernel arrays (see :attr:`~.arrays`)."""
+        return {name: getattr(self, name).dtype.str for name in self.arrays}
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the stored kernel arrays (see :attr:`~.arrays`)."""
+        return sum(getattr(self, name).nbytes for name in self.arrays)
+
+    def share(self):
+        """Move the kernel arrays into (read-only) shared memory.
+
+        Afterwards, pickling the kernel (e.g. to send it to a worker process) only transfers the
+        names of the shared memory blocks, the receiving process attaches to them instead of
+        copying the arrays. The blocks are released when this kernel is garbage collected (or
+        when the interpreter exits), processes which are attached at that time keep their
+        mapping. Only use this for worker processes started from this process, which share its
+        resource tracker.
+
+        Returns
+        -------
+        None
+
+        """
+        self._log.debug('Calling share')
+        if self._shared:  # Already shared!
+            return
+        for name in self.arrays:
+            array = getattr(self, name)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+            shared[...] = array
+            shared.flags.writeable = False
+            setattr(self, name, shared)
+            self._shared[name] = shm
+        weakref.finalize(self, _release_shared_memory, list(self._shared.values()))
 
     def __str__(self):
         self._log.debug('Calling __str__')
-        return 'Kernel(a=%s, dim_uv=%s, b_0=%s, prw_vec=%s, geometry=%s)' % \
-               (self.a, self.dim_uv, self.b_0, self.prw_vec, self.geometry)
+        return 'Kernel(a=%s, dim_uv=%s, b_0=%s, prw_vec=%s, geometry=%s, lean=%s)' % \
+               (self.a, self.dim_uv, self.b_0, self.prw_vec, self.geometry, self.lean)
 
     def _get_elementary_phase(self, geometry, n, m, a):
         self._log.debug('Calling _get_elementary_phase')
@@ -169,6 +331,252 @@ class Kernel(object):
         print('PRW vector          : {} T'.format(self.prw_vec))
 
 
+def _release_shared_memory(blocks):
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:  # Arrays which still use the block keep their mapping alive!
+            pass
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class KernelCache(object):
+    """Class for caching kernels, which are identified by their parameters.
+
+    Kernels are looked up by the parameters `a`, `dim_uv`, `b_0`, `prw_vec`, `geometry`, `dtype`
+    and `lean`, so that all :class:`~.DataSet` objects and phasemappers of a session share the same
+    kernel (and its Fourier transforms) instead of recalculating them. Recently used kernels are
+    kept in memory, the least recently used kernels are evicted first if the size limit is
+    exceeded. If a `path` is given, the kernels are additionally saved as HDF5 files in this
+    directory, so that later sessions can reuse them. The files are bounded by `max_disk`, the
+    least recently used files (by modification time) are deleted first. If `shared` is True, the
+    kernel arrays are moved into shared memory (see :func:`~.Kernel.share`), so that they are not
+    copied into worker processes. Kernels are shared and must not be modified!
+
+    Attributes
+    ----------
+    path : str or None, optional
+        Directory in which the kernels are saved. If None (default), kernels are only cached in
+        memory.
+    max_memory : int, optional
+        Maximal number of bytes of the kernels which are kept in memory. Default is 1 GiB.
+    max_disk : int, optional
+        Maximal number of bytes of the kernel files in `path`. Default is 8 GiB.
+    shared : bool, optional
+        If True, the kernel arrays are placed in shared memory. Default is False.
+    hits : int
+        Number of kernels which were found in the cache (memory or disk).
+    misses : int
+        Number of kernels which had to be calculated.
+
+    """
+
+    _log = logging.getLogger(__name__ + '.KernelCache')
+
+    def __init__(self, path=None, max_memory=2**30, max_disk=2**33, shared=False):
+        self._log.debug('Calling __init__')
+        self.path = path
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.shared = shared
+        self.cache = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._log.debug('Created ' + str(self))
+
+    def __repr__(self):
+        self._log.debug('Calling __repr__')
+        return '%s(path=%r, max_memory=%r, max_disk=%r, shared=%r)' % \
+               (self.__class__, self.path, self.max_memory, self.max_disk, self.shared)
+
+    def __str__(self):
+        self._log.debug('Calling __str__')
+        return 'KernelCache(path=%s, max_memory=%s, max_disk=%s, shared=%s)' % \
+               (self.path, self.max_memory, self.max_disk, self.shared)
+
+    def __len__(self):
+        return len(self.cache)
+
+    @staticmethod
+    def get_key(a, dim_uv, b_0=1., prw_vec=None, geometry='disc', dtype=np.float32, lean=False):
+        """Calculate the key which identifies a kernel (see :class:`~.Kernel` for parameters).
+
+        Returns
+        -------
+        key : tuple
+            Normalised kernel parameters (`a`, `dim_uv`, `b_0`, `prw_vec`, `geometry`, `dtype`,
+            `lean`) and the padded dimensions of the current padding policy.
+
+        """
+        prw_vec = None if prw_vec is None else tuple(float(p) for p in prw_vec)
+        dim_uv = tuple(int(d) for d in dim_uv)
+        return (float(a), dim_uv, float(b_0), prw_vec, str(geometry), np.dtype(dtype).str,
+                bool(lean), get_padded_shape(dim_uv))
+
+    def get(self, a, dim_uv, b_0=1., prw_vec=None, geometry='disc', dtype=np.float32,
+            lean=False):
+        """Return a cached kernel or calculate (and cache) it if it is not available.
+
+        Parameters are the same as for :class:`~.Kernel`.
+
+        Returns
+        -------
+        kernel : :class:`~.Kernel`
+            The requested kernel. Kernels are shared and must not be modified!
+
+        """
+        self._log.debug('Calling get')
+        key = self.get_key(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+        kernel = self._lookup(key)
+        if kernel is None:
+            self.misses += 1
+            kernel = Kernel(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+            self._save(key, kernel)
+            self._add(key, kernel)
+        return kernel
+
+    def clear(self, disk=False):
+        """Clear the cache.
+
+        Parameters
+        ----------
+        disk: bool, optional
+            If True, the kernel files in `path` are deleted, too. Default is False.
+
+        Returns
+        -------
+        None
+
+        """
+        self._log.debug('Calling clear')
+        self.cache = OrderedDict()
+        self.memory = 0
+        if disk:
+            for filename, _, _ in self._get_files():
+                os.remove(filename)
+
+    def _lookup(self, key):
+        # Look in memory:
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        # Look on disk:
+        kernel = self._load(key)
+        if kernel is not None:
+            self.hits += 1
+            self._add(key, kernel)
+        return kernel
+
+    def _add(self, key, kernel):
+        if self.shared:
+            kernel.share()
+        self.cache[key] = kernel
+        self.memory += kernel.nbytes
+        while self.memory > self.max_memory and self.cache:  # Evict least recently used:
+            _, evicted = self.cache.popitem(last=False)
+            self.memory -= evicted.nbytes
+
+    def _get_filename(self, key):
+        if self.path is None:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.path, 'kernel_{}.hdf5'.format(digest))
+
+    def _save(self, key, kernel):
+        filename = self._get_filename(key)
+        if filename is not None:
+            with h5py.File(filename, 'w') as f:
+                f.attrs['key'] = repr(key)
+                for name in kernel.arrays:
+                    f.create_dataset(name, data=getattr(kernel, name))
+            self._evict_disk()
+
+    def _get_files(self):
+        if self.path is None:
+            return []
+        files = []
+        for f in os.listdir(self.path):
+            if f.startswith('kernel_') and f.endswith('.hdf5'):
+                filename = os.path.join(self.path, f)
+                stat = os.stat(filename)
+                files.append((filename, stat.st_mtime, stat.st_size))
+        return sorted(files, key=lambda x: x[1])  # least recently used first!
+
+    def _evict_disk(self):
+        files = self._get_files()
+        total = sum(size for _, _, size in files)
+        for filename, _, size in files:  # Least recently used first!
+            if total <= self.max_disk:
+                break
+            os.remove(filename)
+            total -= size
+
+    def _load(self, key):
+        filename = self._get_filename(key)
+        if filename is None or not os.path.isfile(filename):
+            return None
+        a, dim_uv, b_0, prw_vec, geometry, dtype, lean, _ = key
+        kernel = Kernel.__new__(Kernel)
+        kernel._set_parameters(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+        with h5py.File(filename, 'r') as f:
+            if f.attrs.get('key') != repr(key) or f['u_fft'].shape != kernel.dim_fft:
+                return None  # Saved with a different padding (e.g. other FFT library)!
+            for name in Kernel.SHARED_ARRAYS:
+                if name in f:  # Lean kernels only have the spectra!
+                    setattr(kernel, name, np.copy(f[name]))
+        os.utime(filename)  # Mark as recently used!
+        return kernel
+
+
+_kernel_cache = KernelCache()
+
+
+def get_kernel(a, dim_uv, b_0=1., prw_vec=None, geometry='disc', dtype=np.float32, lean=False):
+    """Return a kernel from the global kernel cache (see :class:`~.KernelCache`).
+
+    Parameters are the same as for :class:`~.Kernel`. If the global cache is disabled (see
+    :func:`~.set_kernel_cache`), a new kernel is calculated.
+
+    Returns
+    -------
+    kernel : :class:`~.Kernel`
+        The requested kernel. Kernels are shared and must not be modified!
+
+    """
+    _log.debug('Calling get_kernel')
+    if _kernel_cache is None:
+        return Kernel(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+    return _kernel_cache.get(a, dim_uv, b_0, prw_vec, geometry, dtype, lean)
+
+
+def set_kernel_cache(kernel_cache):
+    """Replace the global kernel cache which is used by :func:`~.get_kernel`.
+
+    Parameters
+    ----------
+    kernel_cache: :class:`~.KernelCache` or None
+        The new global kernel cache, e.g. one with a `path` or with `shared` memory. None disables
+        the global caching.
+
+    Returns
+    -------
+    kernel_cache : :class:`~.KernelCache` or None
+        The previous global kernel cache.
+
+    """
+    _log.debug('Calling set_kernel_cache')
+    global _kernel_cache
+    previous, _kernel_cache = _kernel_cache, kernel_cache
+    return previous
+
+
 class KernelCharge(object):
     """Class for calculating kernel matrices for the phase calculation.
 
@@ -191,8 +599,8 @@ class KernelCharge(object):
     dim_kern : tuple of int (N=2)
         Dimensions of the kernel, which is ``2N-1`` for both axes compared to `dim_uv`.
     dim_pad : tuple of int (N=2)
-        Dimensions of the padded FOV, which is ``2N`` (if FFTW is used) or the next highest power
-        of 2 (for numpy-FFT).
+        Dimensions of the padded FOV, which are at least ``2N-1`` and chosen by the padding policy
+        of :func:`~pyramid.fft.get_padded_shape` (fast FFT sizes by default).
     dim_fft : tuple of int (N=2)
         Dimensions of the grid, which is used for the FFT, taking into account that a RFFT should
         be used (one axis is halved in comparison to `dim_pad`).
@@ -230,10 +638,7 @@ class KernelCharge(object):
         C_e = 2 * np.pi * Q_E / lam * (Q_E * v_acc + M_E * C ** 2) / (
             Q_E * v_acc * (Q_E * v_acc + 2 * M_E * C ** 2))
         # Set up FFT:
-        if fft.HAVE_FFTW:
-            self.dim_pad = tuple(2 * np.array(dim_uv))  # is at least even (not nec. power of 2)
-        else:
-            self.dim_pad = tuple(2 ** np.ceil(np.log2(2 * np.array(dim_uv))).astype(int))  # pow(2)
+        self.dim_pad = get_padded_shape(dim_uv)  # at least 2N-1 and fast (see pyramid.fft)
         self.dim_fft = (self.dim_pad[0], self.dim_pad[1] // 2 + 1)  # last axis is real
         self.slice_phase = (slice(dim_uv[0] - 1, self.dim_kern[0]),  # Shift because kernel center
                             slice(dim_uv[1] - 1, self.dim_kern[1]))  # is not at (0, 0)!
@@ -253,7 +658,7 @@ class KernelCharge(object):
             vv += prw_vec[0]
             self.kc[...] -= coeff * self._get_elementary_phase(electrode_vec, uu, vv, a)
         # Calculate Fourier transform of kernel:
-        self.kc_fft = fft.rfftn(self.kc, self.dim_pad)
+        self.kc_fft = np.fft.rfftn(self.kc, self.dim_pad)  # Double precision (as before)!
         self._log.debug('Created ' + str(self))
 
     def __repr__(self):
@@ -8,12 +8,12 @@ For the magnetic phase map, an approach using real space and one using Fourier s
 The electrostatic contribution is calculated by using the assumption of a mean inner potential."""
 
 import abc
+import functools
 import logging
 
 import numpy as np
 
-from jutil import fft
-
+from . import fft
 from .fielddata import VectorData, ScalarData
 from .phasemap import PhaseMap
 
@@ -42,6 +42,10 @@ class PhaseMapper(object, metaclass=abc.ABCMeta):
 
     _log = logging.getLogger(__name__ + '.PhaseMapper')
 
+    workers = None  # Number of FFT threads (None: global setting of pyramid.fft)
+
+    SCRATCH_ARRAYS = ()  # Arrays which are overwritten by every call (not shared by threads)
+
     @abc.abstractmethod
     def __call__(self, field_data):
         raise NotImplementedError()
@@ -94,6 +98,24 @@ class PhaseMapperRDFC(PhaseMapper):
     ----------
     kernel : :class:`~pyramid.Kernel`
         Convolution kernel, representing the phase contribution of one single magnetized pixel.
+    packed : bool, optional
+        If True, :func:`~.jac_T_dot` correlates the phase with the complex kernel
+        ``u_kern - i*v_kern`` (whose full spectrum is completed from the real spectra of the
+        kernel by Hermitian symmetry, as is the spectrum of the phase), so that the `u`- and
+        `v`-components are separated as the real and imaginary part of one complex inverse FFT
+        instead of two real ones. All spectra are written into preallocated arrays. The forward
+        direction is not packed: one complex FFT of ``u + i*v`` costs as much as the two real
+        FFTs of `u` and `v`, and separating the phase by Hermitian symmetry costs more than the
+        saved FFT call (use `buffered` for the forward direction). Default is False.
+    buffered : bool, optional
+        If True, all spectra and FFT outputs are written into arrays which are preallocated
+        (aligned via :func:`~pyramid.fft.empty`) and reused for every call, so that repeated
+        calls (e.g. in an iterative reconstruction) do not allocate memory. The adjoint is then
+        calculated as the correlation with the (cached) conjugated kernel spectra (or packed, if
+        `packed` is also set). Default is False.
+    workers : int or None, optional
+        Number of threads used by the FFTs of this phasemapper. If None (default), the global
+        setting of :func:`~pyramid.fft.configure_backend` is used.
     m: int
         Size of the image space.
     n: int
@@ -103,23 +125,54 @@ class PhaseMapperRDFC(PhaseMapper):
 
     _log = logging.getLogger(__name__ + '.PhaseMapperRDFC')
 
-    def __init__(self, kernel):
+    SCRATCH_ARRAYS = ('u_mag', 'v_mag', 'phase_adj', 'u_mag_fft', 'v_mag_fft', 'phase_fft',
+                      'phase', 'phase_adj_fft', 'mag_adj_fft', 'mag_adj', 'packed_fft',
+                      'mag_adj_packed')
+
+    def __init__(self, kernel, packed=False, buffered=False, workers=None):
         self._log.debug('Calling __init__')
+        self.workers = workers
         self.kernel = kernel
+        self.packed = packed
+        self.buffered = buffered
+        self._buffers = {}  # Buffers of the batched products (see `jac_dot_batch`)
         self.m = np.prod(kernel.dim_uv)
         self.n = 2 * self.m
-        self.u_mag = np.zeros(kernel.dim_pad, dtype=kernel.u.dtype)
-        self.v_mag = np.zeros(kernel.dim_pad, dtype=kernel.u.dtype)
-        self.phase_adj = np.zeros(kernel.dim_pad, dtype=kernel.u.dtype)
+        self.u_mag = fft.zeros(kernel.dim_pad, dtype=kernel.dtype)
+        self.v_mag = fft.zeros(kernel.dim_pad, dtype=kernel.dtype)
+        self.phase_adj = fft.zeros(kernel.dim_pad, dtype=kernel.dtype)
+        if packed:  # Conjugated full spectrum of the complex kernel u_kern - i*v_kern:
+            dtype_fft = kernel.u_fft.dtype
+            u_fft = _full_spectrum(kernel.u_fft, fft.empty(kernel.dim_pad, dtype=dtype_fft))
+            v_fft = _full_spectrum(kernel.v_fft, fft.empty(kernel.dim_pad, dtype=dtype_fft))
+            self.kernel_fft_conj = np.conj(u_fft - 1j * v_fft)
+            self.phase_adj_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.packed_fft = fft.empty(kernel.dim_pad, dtype=dtype_fft)
+            self.mag_adj_packed = fft.empty(kernel.dim_pad, dtype=dtype_fft)
+        if buffered:  # Reusable buffers for spectra and FFT outputs:
+            dtype_fft = kernel.u_fft.dtype
+            dtype_real = np.finfo(dtype_fft).dtype  # Real counterpart with the same precision
+            self.u_mag_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.v_mag_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.phase_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.phase = fft.empty(kernel.dim_pad, dtype=dtype_real)
+            self.phase_adj_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.mag_adj_fft = fft.empty(kernel.dim_fft, dtype=dtype_fft)
+            self.mag_adj = fft.empty(kernel.dim_pad, dtype=dtype_real)
+        if buffered and not packed:  # Spectra of the correlation with the kernel:
+            self.u_fft_conj = np.conj(kernel.u_fft)
+            self.v_fft_conj = np.conj(kernel.v_fft)
         self._log.debug('Created ' + str(self))
 
     def __repr__(self):
         self._log.debug('Calling __repr__')
-        return '%s(kernel=%r)' % (self.__class__, self.kernel)
+        return '%s(kernel=%r, packed=%r, buffered=%r)' % (self.__class__, self.kernel,
+                                                          self.packed, self.buffered)
 
     def __str__(self):
         self._log.debug('Calling __str__')
-        return 'PhaseMapperRDFC(kernel=%s)' % self.kernel
+        return 'PhaseMapperRDFC(kernel=%s, packed=%s, buffered=%s)' % (self.kernel, self.packed,
+                                                                        self.buffered)
 
     def __call__(self, magdata):
         assert isinstance(magdata, VectorData), 'Only VectorData objects can be mapped!'
@@ -132,15 +185,23 @@ class PhaseMapperRDFC(PhaseMapper):
         return PhaseMap(magdata.a, self._convolve())
 
     def _convolve(self):
+        if self.buffered:  # Same as below, but only in the preallocated buffers:
+            fft.rfftn(self.u_mag, out=self.u_mag_fft, workers=self.workers)
+            fft.rfftn(self.v_mag, out=self.v_mag_fft, workers=self.workers)
+            np.multiply(self.u_mag_fft, self.kernel.u_fft, out=self.phase_fft)
+            np.multiply(self.v_mag_fft, self.kernel.v_fft, out=self.v_mag_fft)  # In place!
+            np.add(self.phase_fft, self.v_mag_fft, out=self.phase_fft)
+            fft.irfftn(self.phase_fft, self.kernel.dim_pad, out=self.phase, workers=self.workers)
+            return self.phase[self.kernel.slice_phase]
         # Fourier transform the projected magnetisation:
-        self.u_mag_fft = fft.rfftn(self.u_mag)
-        self.v_mag_fft = fft.rfftn(self.v_mag)
+        self.u_mag_fft = fft.rfftn(self.u_mag, workers=self.workers)
+        self.v_mag_fft = fft.rfftn(self.v_mag, workers=self.workers)
         # Convolve the magnetization with the kernel in Fourier space:
         self.phase_fft = self.u_mag_fft * self.kernel.u_fft + self.v_mag_fft * self.kernel.v_fft
         # Return the result:
-        return fft.irfftn(self.phase_fft)[self.kernel.slice_phase]
+        return fft.irfftn(self.phase_fft, workers=self.workers)[self.kernel.slice_phase]
 
-    def jac_dot(self, vector):
+    def jac_dot(self, vector, out=None):
         """Calculate the product of the Jacobi matrix with a given `vector`.
 
         Parameters
@@ -149,6 +210,8 @@ class PhaseMapperRDFC(PhaseMapper):
             Vectorized form of the magnetization in `u`- and `v`-direction of every pixel
             (row-wise). The first ``N**2`` elements have to correspond to the `u`-, the next
             ``N**2`` elements to the `v`-component of the magnetization.
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Array with ``N**2`` entries into which the result is written.
 
         Returns
         -------
@@ -160,9 +223,12 @@ class PhaseMapperRDFC(PhaseMapper):
             'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.n)
         self.u_mag[self.kernel.slice_mag], self.v_mag[self.kernel.slice_mag] = \
             np.reshape(vector, (2,) + self.kernel.dim_uv)
-        return np.ravel(self._convolve())
+        if out is None:
+            return np.ravel(self._convolve())
+        out.reshape(self.kernel.dim_uv)[...] = self._convolve()
+        return out
 
-    def jac_T_dot(self, vector):
+    def jac_T_dot(self, vector, out=None):
         """Calculate the product of the transposed Jacobi matrix with a given `vector`.
 
         Parameters
@@ -170,6 +236,8 @@ class PhaseMapperRDFC(PhaseMapper):
         vector : :class:`~numpy.ndarray` (N=1)
             Vector with ``N**2`` entries which represents a matrix with dimensions like a scalar
             phasemap.
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Array with ``2*N**2`` entries into which the result is written.
 
         Returns
         -------
@@ -181,14 +249,151 @@ class PhaseMapperRDFC(PhaseMapper):
         assert len(vector) == self.m, \
             'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.m)
         self.phase_adj[self.kernel.slice_phase] = vector.reshape(self.kernel.dim_uv)
-        phase_adj_fft = fft.irfft2_adj(self.phase_adj)
+        if self.packed:  # Correlation with the complex kernel gives u_adj + i*v_adj:
+            fft.rfftn(self.phase_adj, out=self.phase_adj_fft, workers=self.workers)
+            _full_spectrum(self.phase_adj_fft, out=self.packed_fft)
+            np.multiply(self.packed_fft, self.kernel_fft_conj, out=self.packed_fft)
+            mag_adj = fft.ifftn(self.packed_fft, out=self.mag_adj_packed, workers=self.workers)
+            mag_adj = mag_adj[self.kernel.slice_mag]
+            if out is not None:
+                out.reshape((2,) + self.kernel.dim_uv)[...] = (mag_adj.real, mag_adj.imag)
+                return out
+            return np.concatenate((mag_adj.real.ravel(), mag_adj.imag.ravel()))
+        if self.buffered:  # Correlate with the kernel (only in the preallocated buffers):
+            if out is None:
+                out = np.empty(self.n, dtype=self.mag_adj.dtype)
+            fft.rfftn(self.phase_adj, out=self.phase_adj_fft, workers=self.workers)
+            for kernel_fft_conj, mag_adj in zip((self.u_fft_conj, self.v_fft_conj),
+                                                out.reshape((2,) + self.kernel.dim_uv)):
+                np.multiply(self.phase_adj_fft, kernel_fft_conj, out=self.mag_adj_fft)
+                fft.irfftn(self.mag_adj_fft, self.kernel.dim_pad, workers=self.workers,
+                           out=self.mag_adj)
+                mag_adj[...] = self.mag_adj[self.kernel.slice_mag]
+            return out
+        phase_adj_fft = fft.irfftn_adj(self.phase_adj, workers=self.workers)
         u_mag_adj_fft = phase_adj_fft * np.conj(self.kernel.u_fft)
         v_mag_adj_fft = phase_adj_fft * np.conj(self.kernel.v_fft)
-        u_mag_adj = fft.rfft2_adj(u_mag_adj_fft)[self.kernel.slice_mag]
-        v_mag_adj = fft.rfft2_adj(v_mag_adj_fft)[self.kernel.slice_mag]
+        u_mag_adj = fft.rfftn_adj(u_mag_adj_fft, workers=self.workers)[self.kernel.slice_mag]
+        v_mag_adj = fft.rfftn_adj(v_mag_adj_fft, workers=self.workers)[self.kernel.slice_mag]
+        if out is not None:
+            out.reshape((2,) + self.kernel.dim_uv)[...] = (u_mag_adj, v_mag_adj)
+            return out
         result = np.concatenate((u_mag_adj.ravel(), v_mag_adj.ravel()))
         return result
 
+    def _get_batch_buffers(self, count):
+        # Preallocated (zero padded) buffers for batches of `count` images, reused for every call:
+        buffers = vars(self).setdefault('_buffers', {})  # Not set in old pickles!
+        if count not in buffers:
+            kernel = self.kernel
+            dtype_fft = kernel.u_fft.dtype
+            dtype_real = np.finfo(dtype_fft).dtype  # Real counterpart with the same precision
+            if 'kernel_fft_conj' not in buffers:
+                buffers['kernel_fft_conj'] = np.conj(np.stack((kernel.u_fft, kernel.v_fft)))
+            buffers[count] = {
+                'mag': fft.zeros((count, 2) + kernel.dim_pad, dtype=kernel.dtype),
+                'mag_fft': fft.empty((count, 2) + kernel.dim_fft, dtype=dtype_fft),
+                'mag_adj': fft.empty((count, 2) + kernel.dim_pad, dtype=dtype_real),
+                'phase_adj': fft.zeros((count,) + kernel.dim_pad, dtype=kernel.dtype),
+                'phase_fft': fft.empty((count,) + kernel.dim_fft, dtype=dtype_fft),
+                'phase': fft.empty((count,) + kernel.dim_pad, dtype=dtype_real)}
+        return buffers[count]
+
+    def jac_dot_batch(self, vectors, out=None):
+        """Calculate the products of the Jacobi matrix with a batch of `vectors` at once.
+
+        All vectors share the :class:`~.Kernel`, so the projected magnetizations of the whole
+        batch are transformed with one multidimensional FFT call each way, which lets a threaded
+        FFT library (see `workers`) distribute the whole batch instead of single images among its
+        threads. All spectra are written into buffers which are preallocated per batch size.
+
+        Parameters
+        ----------
+        vectors : :class:`~numpy.ndarray` (N=2)
+            Vectorized forms of the magnetization (see :func:`~.jac_dot`), one per row.
+        out : :class:`~numpy.ndarray` (N=2), optional
+            Array with one row of ``N**2`` entries per vector into which the results are written.
+
+        Returns
+        -------
+        result : :class:`~numpy.ndarray` (N=2)
+            Products of the Jacobi matrix (which is not explicitely calculated) with the vectors,
+            one per row.
+
+        """
+        assert np.ndim(vectors) == 2 and np.shape(vectors)[1] == self.n, \
+            'vector size not compatible! vectors: {}, size: {}'.format(np.shape(vectors), self.n)
+        count = len(vectors)
+        kernel = self.kernel
+        buffers = self._get_batch_buffers(count)
+        mag, mag_fft, phase_fft = buffers['mag'], buffers['mag_fft'], buffers['phase_fft']
+        mag[(Ellipsis,) + kernel.slice_mag] = np.reshape(vectors, (count, 2) + kernel.dim_uv)
+        # Fourier transform all u- and v-components at once:
+        fft.rfftn(mag, axes=(-2, -1), out=mag_fft, workers=self.workers)
+        # Convolve the magnetization with the kernel in Fourier space:
+        np.multiply(mag_fft[:, 0], kernel.u_fft, out=phase_fft)
+        np.multiply(mag_fft[:, 1], kernel.v_fft, out=mag_fft[:, 1])  # In place!
+        np.add(phase_fft, mag_fft[:, 1], out=phase_fft)
+        phase = fft.irfftn(phase_fft, kernel.dim_pad, axes=(-2, -1), out=buffers['phase'],
+                           workers=self.workers)
+        if out is None:
+            out = np.empty((count, self.m), dtype=phase.dtype)
+        out.reshape((count,) + kernel.dim_uv)[...] = phase[(Ellipsis,) + kernel.slice_phase]
+        return out
+
+    def jac_T_dot_batch(self, vectors, out=None):
+        """Calculate the products of the transposed Jacobi matrix with a batch of `vectors`.
+
+        See :func:`~.jac_dot_batch`. The adjoint of the convolution is the correlation with the
+        kernel, which is calculated by multiplying with the conjugated kernel spectra.
+
+        Parameters
+        ----------
+        vectors : :class:`~numpy.ndarray` (N=2)
+            Vectors like scalar phasemaps (see :func:`~.jac_T_dot`), one per row.
+        out : :class:`~numpy.ndarray` (N=2), optional
+            Array with one row of ``2*N**2`` entries per vector into which the results are
+            written.
+
+        Returns
+        -------
+        result : :class:`~numpy.ndarray` (N=2)
+            Products of the transposed Jacobi matrix (which is not explicitely calculated) with
+            the vectors, one 2D magnetic projection per row.
+
+        """
+        assert np.ndim(vectors) == 2 and np.shape(vectors)[1] == self.m, \
+            'vector size not compatible! vectors: {}, size: {}'.format(np.shape(vectors), self.m)
+        count = len(vectors)
+        kernel = self.kernel
+        buffers = self._get_batch_buffers(count)
+        phase_adj, phase_fft = buffers['phase_adj'], buffers['phase_fft']
+        mag_fft = buffers['mag_fft']
+        phase_adj[(Ellipsis,) + kernel.slice_phase] = np.reshape(vectors, (count,) + kernel.dim_uv)
+        fft.rfftn(phase_adj, axes=(-2, -1), out=phase_fft, workers=self.workers)
+        # Correlate with the kernel in Fourier space (u- and v-component at once):
+        np.multiply(phase_fft[:, None], self._buffers['kernel_fft_conj'], out=mag_fft)
+        mag_adj = fft.irfftn(mag_fft, kernel.dim_pad, axes=(-2, -1), out=buffers['mag_adj'],
+                             workers=self.workers)
+        if out is None:
+            out = np.empty((count, self.n), dtype=mag_adj.dtype)
+        out.reshape((count, 2) + kernel.dim_uv)[...] = mag_adj[(Ellipsis,) + kernel.slice_mag]
+        return out
+
+
+def _full_spectrum(spectrum, out):
+    """Complete the real FFT `spectrum` (halved last axis) of a 2D array to its full FFT `out`.
+
+    The missing frequencies are the complex conjugates of the negated ones (Hermitian symmetry).
+
+    """
+    cols = spectrum.shape[-1]
+    stop = out.shape[-1] - cols  # Highest mirrored column (column 0 is its own negation)
+    out[:, :cols] = spectrum
+    np.conjugate(spectrum[0, stop:0:-1], out=out[0, cols:])  # Row 0 is its own negation
+    np.conjugate(spectrum[:0:-1, stop:0:-1], out=out[1:, cols:])
+    return out
+
 
 class PhaseMapperFDFC(PhaseMapper):
     """Class representing a phase mapping strategy using a discretization in Fourier space.
@@ -210,6 +415,16 @@ class PhaseMapperFDFC(PhaseMapper):
     padding : int, optional
         Factor for the zero padding. The default is 0 (no padding). For a factor of n the number
         of pixels is increase by ``(1+n)**2``. Padded zeros are cropped at the end.
+    dim_pad : tuple of int (N=2)
+        Dimensions of the zero padded grid.
+    slice_uv : tuple of slice (N=2)
+        Slice of the original field of view in the padded grid.
+    u_tf, v_tf : :class:`~numpy.ndarray` (N=2)
+        Transfer functions (real FFT of the phase per `u`- and `v`-component of the real FFT of
+        the magnetization), which are calculated only once for each set of parameters.
+    workers : int or None, optional
+        Number of threads used by the FFTs of this phasemapper. If None (default), the global
+        setting of :func:`~pyramid.fft.configure_backend` is used.
     m: int
         Size of the image space.
     n: int
@@ -219,14 +434,26 @@ class PhaseMapperFDFC(PhaseMapper):
 
     _log = logging.getLogger(__name__ + '.PhaseMapperFDFC')
 
-    def __init__(self, a, dim_uv, b_0=1, padding=0):
+    SCRATCH_ARRAYS = ('u_mag', 'v_mag', 'phase_adj')
+
+    def __init__(self, a, dim_uv, b_0=1, padding=0, workers=None):
         self._log.debug('Calling __init__')
+        self.workers = workers
         self.a = a
         self.dim_uv = dim_uv
         self.b_0 = b_0
         self.padding = padding
         self.m = np.prod(dim_uv)
         self.n = 2 * self.m
+        v_dim, u_dim = dim_uv
+        u_pad = int(u_dim / 2 * padding)
+        v_pad = int(v_dim / 2 * padding)
+        self.dim_pad = (v_dim + 2 * v_pad, u_dim + 2 * u_pad)
+        self.slice_uv = (slice(v_pad, v_pad + v_dim), slice(u_pad, u_pad + u_dim))
+        self.u_tf, self.v_tf = _get_transfer_functions(a, self.dim_pad, b_0)
+        self.u_mag = np.zeros(self.dim_pad, dtype=np.float32)
+        self.v_mag = np.zeros(self.dim_pad, dtype=np.float32)
+        self.phase_adj = np.zeros(self.dim_pad, dtype=np.float32)
         self._log.debug('Created ' + str(self))
 
     def __repr__(self):
@@ -245,26 +472,19 @@ class PhaseMapperFDFC(PhaseMapper):
         assert magdata.a == self.a, 'Grid spacing has to match!'
         assert magdata.dim[0] == 1, 'Magnetic distribution must be 2-dimensional!'
         assert magdata.dim[1:3] == self.dim_uv, 'Dimensions do not match!'
-        v_dim, u_dim = self.dim_uv
-        u_mag, v_mag = magdata.field[0:2, 0, ...]
-        # Create zero padded matrices:
-        u_pad = int(u_dim / 2 * self.padding)
-        v_pad = int(v_dim / 2 * self.padding)
-        u_mag_pad = np.pad(u_mag, ((v_pad, v_pad), (u_pad, u_pad)), 'constant')
-        v_mag_pad = np.pad(v_mag, ((v_pad, v_pad), (u_pad, u_pad)), 'constant')
+        # Process input parameters (zero padding):
+        self.u_mag[self.slice_uv] = magdata.field[0, 0, ...]  # u-component
+        self.v_mag[self.slice_uv] = magdata.field[1, 0, ...]  # v-component
+        return PhaseMap(magdata.a, self._convolve())
+
+    def _convolve(self):
         # Fourier transform of the two components:
-        u_mag_fft = np.fft.rfft2(u_mag_pad)
-        v_mag_fft = np.fft.rfft2(v_mag_pad)
+        u_mag_fft = fft.rfftn(self.u_mag, workers=self.workers)
+        v_mag_fft = fft.rfftn(self.v_mag, workers=self.workers)
         # Calculate the Fourier transform of the phase:
-        f_u = np.fft.rfftfreq(u_dim + 2 * u_pad, self.a)
-        f_v = np.fft.fftfreq(v_dim + 2 * v_pad, self.a)
-        f_uu, f_vv = np.meshgrid(f_u, f_v)
-        coeff = - (1j * self.b_0 * self.a) / (2 * PHI_0)  # Minus because of negative z-direction
-        phase_fft = coeff * (u_mag_fft * f_vv - v_mag_fft * f_uu) / (f_uu ** 2 + f_vv ** 2 + 1e-30)
+        phase_fft = u_mag_fft * self.u_tf + v_mag_fft * self.v_tf
         # Transform to real space and revert padding:
-        phase_pad = np.fft.irfft2(phase_fft)
-        phase = phase_pad[v_pad:v_pad + v_dim, u_pad:u_pad + u_dim]
-        return PhaseMap(magdata.a, phase)
+        return fft.irfftn(phase_fft, self.dim_pad, workers=self.workers)[self.slice_uv]
 
     def jac_dot(self, vector):
         """Calculate the product of the Jacobi matrix with a given `vector`.
@@ -285,10 +505,9 @@ class PhaseMapperFDFC(PhaseMapper):
         self._log.debug('Calling jac_dot')
         assert len(vector) == self.n, \
             'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.n)
-        mag_proj = VectorData(self.a, np.zeros((3, 1) + self.dim_uv, dtype=np.float32))
-        magnitude_proj = np.reshape(vector, (2,) + self.dim_uv)
-        mag_proj.field[:2, 0, ...] = magnitude_proj
-        return self(mag_proj).phase_vec
+        self.u_mag[self.slice_uv], self.v_mag[self.slice_uv] = \
+            np.reshape(vector, (2,) + self.dim_uv)
+        return np.ravel(self._convolve())
 
     def jac_T_dot(self, vector):
         """Calculate the product of the transposed Jacobi matrix with a given `vector`.
@@ -306,7 +525,34 @@ class PhaseMapperFDFC(PhaseMapper):
             the vector, which has ``2*N**2`` entries like a 2D magnetic projection.
 
         """
-        raise NotImplementedError()
+        self._log.debug('Calling jac_T_dot')
+        assert len(vector) == self.m, \
+            'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.m)
+        self.phase_adj[self.slice_uv] = vector.reshape(self.dim_uv)
+        # Adjoints of the single steps of _convolve() in reverse order:
+        phase_adj_fft = fft.irfftn_adj(self.phase_adj, workers=self.workers)
+        u_mag_adj = fft.rfftn_adj(phase_adj_fft * np.conj(self.u_tf), self.dim_pad[-1],
+                                  workers=self.workers)
+        v_mag_adj = fft.rfftn_adj(phase_adj_fft * np.conj(self.v_tf), self.dim_pad[-1],
+                                  workers=self.workers)
+        result = np.concatenate((u_mag_adj[self.slice_uv].ravel(),
+                                 v_mag_adj[self.slice_uv].ravel()))
+        return result
+
+
+@functools.lru_cache(maxsize=16)
+def _get_transfer_functions(a, dim_pad, b_0):
+    # Transfer functions of PhaseMapperFDFC (read-only, because they are shared by all mappers):
+    f_u = np.fft.rfftfreq(dim_pad[1], a)
+    f_v = np.fft.fftfreq(dim_pad[0], a)
+    f_uu, f_vv = np.meshgrid(f_u, f_v)
+    coeff = - (1j * b_0 * a) / (2 * PHI_0)  # Minus because of negative z-direction
+    denom = f_uu ** 2 + f_vv ** 2 + 1e-30
+    u_tf = coeff * f_vv / denom
+    v_tf = - coeff * f_uu / denom
+    u_tf.setflags(write=False)
+    v_tf.setflags(write=False)
+    return u_tf, v_tf
 
 
 class PhaseMapperMIP(PhaseMapper):
@@ -387,8 +633,16 @@ class PhaseMapperMIP(PhaseMapper):
         result : :class:`~numpy.ndarray` (N=1)
             Product of the Jacobi matrix (which is not explicitely calculated) with the vector.
 
+        Notes
+        -----
+        In contrast to :func:`~.__call__`, which thresholds the projected electrostatic field to
+        the specimen location, the linear operator just scales the projected thickness (or the
+        projected MIP density) with `coeff`.
+
         """
-        raise NotImplementedError()  # TODO: Implement right!
+        assert len(vector) == self.n, \
+            'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.n)
+        return self.coeff * vector
 
     def jac_T_dot(self, vector):
         """Calculate the product of the transposed Jacobi matrix with a given `vector`.
@@ -406,7 +660,9 @@ class PhaseMapperMIP(PhaseMapper):
             the vector, which has ``N**2`` entries like an electrostatic projection.
 
         """
-        raise NotImplementedError()  # TODO: Implement right!
+        assert len(vector) == self.m, \
+            'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.m)
+        return self.coeff * vector  # The Jacobi matrix is diagonal and thus symmetric!
 
 
 class PhaseMapperCharge(PhaseMapper):
@@ -431,26 +687,46 @@ class PhaseMapperCharge(PhaseMapper):
         The real FFT of the charge distribution.
     phase_fft: :class:`~numpy.ndarray` (N=3)
         The real FFT of the phase from the given charge distribution c.
+    buffered : bool, optional
+        If True, all spectra and FFT outputs are written into preallocated arrays which are reused
+        for every call (see :class:`~.PhaseMapperRDFC`). Default is False.
+    workers : int or None, optional
+        Number of threads used by the FFTs of this phasemapper. If None (default), the global
+        setting of :func:`~pyramid.fft.configure_backend` is used.
 
     """
     _log = logging.getLogger(__name__ + '.PhaseMapperCharge')
 
-    def __init__(self, kernelcharge):
+    SCRATCH_ARRAYS = ('c', 'phase_adj', 'c_fft', 'phase_fft', 'phase', 'c_adj')
+
+    def __init__(self, kernelcharge, buffered=False, workers=None):
         self._log.debug('Calling __init__')
+        self.workers = workers
         self.kernelcharge = kernelcharge
+        self.buffered = buffered
         self.m = np.prod(kernelcharge.dim_uv)
         self.n = self.m
-        self.c = np.zeros(kernelcharge.dim_pad, dtype=kernelcharge.kc.dtype)
-        self.phase_adj = np.zeros(kernelcharge.dim_pad, dtype=kernelcharge.kc.dtype)
+        self.c = fft.zeros(kernelcharge.dim_pad, dtype=kernelcharge.kc.dtype)
+        self.phase_adj = fft.zeros(kernelcharge.dim_pad, dtype=kernelcharge.kc.dtype)
+        if buffered:  # Reusable buffers for spectra and FFT outputs:
+            dtype_fft = kernelcharge.kc_fft.dtype
+            dtype_real = np.finfo(dtype_fft).dtype  # Real counterpart with the same precision
+            self.c_fft = fft.empty(kernelcharge.dim_fft, dtype=dtype_fft)
+            self.phase_fft = fft.empty(kernelcharge.dim_fft, dtype=dtype_fft)
+            self.phase = fft.empty(kernelcharge.dim_pad, dtype=dtype_real)
+            self.c_adj = fft.empty(kernelcharge.dim_pad, dtype=dtype_real)
+            self.kc_fft_conj = np.conj(kernelcharge.kc_fft)
         self._log.debug('Created ' + str(self))
 
     def __repr__(self):
         self._log.debug('Calling __repr__')
-        return '%s(kernelcharge=%r)' % (self.__class__, self.kernelcharge)
+        return '%s(kernelcharge=%r, buffered=%r)' % (self.__class__, self.kernelcharge,
+                                                     self.buffered)
 
     def __str__(self):
         self._log.debug('Calling __str__')
-        return 'PhaseMapperCharge(kernelcharge=%s)' % self.kernelcharge
+        return 'PhaseMapperCharge(kernelcharge=%s, buffered=%s)' % (self.kernelcharge,
+                                                                     self.buffered)
 
     def __call__(self, elecdata):
         assert isinstance(elecdata, ScalarData), 'Only ScalarData objects can be mapped!'
@@ -462,20 +738,28 @@ class PhaseMapperCharge(PhaseMapper):
         return PhaseMap(elecdata.a, self._convolve())
 
     def _convolve(self):
+        if self.buffered:  # Same as below, but only in the preallocated buffers:
+            fft.rfftn(self.c, out=self.c_fft, workers=self.workers)
+            np.multiply(self.c_fft, self.kernelcharge.kc_fft, out=self.phase_fft)
+            fft.irfftn(self.phase_fft, self.kernelcharge.dim_pad, workers=self.workers,
+                       out=self.phase)
+            return self.phase[self.kernelcharge.slice_phase]
         # Fourier transform of the projected charge distribution:
-        self.c_fft = fft.rfftn(self.c)
+        self.c_fft = fft.rfftn(self.c, workers=self.workers)
         # Convolve the charge distribution with the kernel in Fourier space:
         self.phase_fft = self.c_fft * self.kernelcharge.kc_fft
         # Return the result:
-        return fft.irfftn(self.phase_fft)[self.kernelcharge.slice_phase]
+        return fft.irfftn(self.phase_fft, workers=self.workers)[self.kernelcharge.slice_phase]
 
-    def jac_dot(self, vector):
+    def jac_dot(self, vector, out=None):
         """Calculate the product of the Jacobi matrix with a given `vector`.
 
         Parameters
         ----------
         vector: :class:`~numpy.ndarray` (N=1)
             Vectorized form of the charge distribution of every pixel (row-wise).
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Array with ``N**2`` entries into which the result is written.
 
         Returns
         -------
@@ -486,9 +770,12 @@ class PhaseMapperCharge(PhaseMapper):
         assert len(vector) == self.n, \
             'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.n)
         self.c[self.kernelcharge.slice_c] = np.reshape(vector, self.kernelcharge.dim_uv)
-        return np.ravel(self._convolve())
+        if out is None:
+            return np.ravel(self._convolve())
+        out.reshape(self.kernelcharge.dim_uv)[...] = self._convolve()
+        return out
 
-    def jac_T_dot(self, vector):
+    def jac_T_dot(self, vector, out=None):
         """Calculate the product of the transposed Jacobi matrix with a given `vector`.
 
         Parameters
@@ -496,6 +783,8 @@ class PhaseMapperCharge(PhaseMapper):
         vector: :class:`~numpy.ndarray` (N=1)
             Vector with ``N**2`` entries which represents a matrix with dimensions like a vector
             phasemap.
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Array with ``N**2`` entries into which the result is written.
 
         Returns
         -------
@@ -507,8 +796,18 @@ class PhaseMapperCharge(PhaseMapper):
         assert len(vector) == self.m, \
             'vector size not compatible! vector: {}, size: {}'.format(len(vector), self.m)
         self.phase_adj[self.kernelcharge.slice_phase] = vector.reshape(self.kernelcharge.dim_uv)
-        phase_adj_fft = fft.irfft2_adj(self.phase_adj)
-        kc_adj_fft = phase_adj_fft * np.conj(self.kernelcharge.kc_fft)
-        kc_adj = fft.rfft2_adj(kc_adj_fft)[self.kernelcharge.slice_c]
+        if self.buffered:  # Correlate with the kernel (only in the preallocated buffers):
+            fft.rfftn(self.phase_adj, out=self.phase_fft, workers=self.workers)
+            np.multiply(self.phase_fft, self.kc_fft_conj, out=self.c_fft)
+            kc_adj = fft.irfftn(self.c_fft, self.kernelcharge.dim_pad, workers=self.workers,
+                                out=self.c_adj)
+        else:
+            phase_adj_fft = fft.irfftn_adj(self.phase_adj, workers=self.workers)
+            kc_adj_fft = phase_adj_fft * np.conj(self.kernelcharge.kc_fft)
+            kc_adj = fft.rfftn_adj(kc_adj_fft, workers=self.workers)
+        kc_adj = kc_adj[self.kernelcharge.slice_c]
+        if out is not None:
+            out.reshape(self.kernelcharge.dim_uv)[...] = kc_adj
+            return out
         result = kc_adj.ravel()
         return result
@@ -9,8 +9,15 @@
 """This module provides the abstract base class :class:`~.Projector` and concrete subclasses for
 projections of vector and scalar fields."""
 
+import copy
+import hashlib
+import inspect
 import itertools
 import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from numbers import Number
 
 try:
     if type(get_ipython()).__name__ == 'ZMQInteractiveShell':  # IPython Notebook!
@@ -23,12 +30,67 @@ except NameError:
 import numpy as np
 import numpy # needed for the syntax in singe-axis projectors
 from numpy import pi
-from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+try:  # Private low level sparse routines, which can write into preallocated output arrays:
+    from scipy.sparse._sparsetools import csr_matvec as _csr_matvec
+    from scipy.sparse._sparsetools import csr_matvecs as _csr_matvecs
+except ImportError:  # Not available in every version of scipy, `matrix.dot` is used instead
+    _csr_matvec = None
+    _csr_matvecs = None
 
 from pyramid.fielddata import VectorData, ScalarData
 from pyramid.quaternion import Quaternion
 
-__all__ = ['RotTiltProjector', 'XTiltProjector', 'YTiltProjector', 'SimpleProjector']
+__all__ = ['RotTiltProjector', 'MatrixFreeRotTiltProjector', 'XTiltProjector', 'YTiltProjector',
+           'SimpleProjector', 'StackedProjector', 'ProjectorCache', 'make_projectors']
+_log = logging.getLogger(__name__)
+
+
+def _csr_dot(matrix, vector, out):
+    """Add the product of a CSR `matrix` with a 1D `vector` to the `out` array (in place).
+
+    The private scipy routine is not faster than ``matrix.dot(vector)``, the speed-up of the
+    projectors comes from writing into `out` (and their reused buffers) instead of allocating
+    temporary results. If the routine is missing or its signature changed, ``matrix.dot`` is used.
+
+    """
+    n_row, n_col = matrix.shape
+    if _csr_matvec is not None and matrix.dtype.kind == 'f':
+        try:
+            if matrix.dtype == vector.dtype == out.dtype and out.flags.c_contiguous:
+                _csr_matvec(n_row, n_col, matrix.indptr, matrix.indices, matrix.data,
+                            np.ascontiguousarray(vector), out)
+                return
+            if np.can_cast(vector.dtype, matrix.dtype, 'same_kind'):
+                # Cast the vector instead of the (much larger) matrix, e.g. for compact projectors:
+                result = np.zeros(n_row, dtype=matrix.dtype)
+                _csr_matvec(n_row, n_col, matrix.indptr, matrix.indices, matrix.data,
+                            np.ascontiguousarray(vector, dtype=matrix.dtype), result)
+                out += result
+                return
+        except (TypeError, ValueError):  # Signature of the private routine changed
+            pass
+    out += matrix.dot(vector)  # (Allocating) scipy implementation, e.g. for mixed types
+
+
+def _csr_dot_multi(matrix, block, out):
+    """Add the product of a CSR `matrix` with the columns of a 2D `block` to `out` (in place).
+
+    All columns are weighted with one pass over the `matrix`, which is faster than one product
+    per column when the `matrix` does not fit into the cache. Falls back to ``matrix.dot`` like
+    :func:`~._csr_dot`.
+
+    """
+    n_row, n_col = matrix.shape
+    if _csr_matvecs is not None and matrix.dtype == block.dtype == out.dtype \
+            and block.flags.c_contiguous and out.flags.c_contiguous:
+        try:
+            _csr_matvecs(n_row, n_col, block.shape[1], matrix.indptr, matrix.indices,
+                         matrix.data, block.ravel(), out.ravel())
+            return
+        except (TypeError, ValueError):  # Signature of the private routine changed
+            pass
+    out += matrix.dot(block)  # (Allocating) scipy implementation, e.g. for mixed types
 
 
 class Projector(object):
@@ -74,13 +136,34 @@ class Projector(object):
         """The sparsity of the projector weight matrix."""
         return 1. - len(self.weight.data) / np.prod(self.weight.shape)
 
+    @property
+    def weight(self):
+        """The weight matrix containing the weighting coefficients for the 3D to 2D mapping."""
+        return self._weight
+
+    @weight.setter
+    def weight(self, weight):
+        self._weight = weight
+        self._weight_T = None
+        self._buffers = {}
+
+    @property
+    def weight_T(self):
+        """The transposed weight matrix in CSR format (cached, used for the adjoint)."""
+        if self._weight_T is None:
+            self._weight_T = self.weight.T.tocsr()
+        return self._weight_T
+
     def __init__(self, dim, dim_uv, weight, coeff):
         self._log.debug('Calling __init__')
         self.dim = tuple(dim)
         self.dim_uv = tuple(dim_uv)
-        self.weight = weight
+        self._weight_T = None
+        self._buffers = {}
+        if weight is not None:  # None for matrix-free projectors, which compute weights on the fly
+            self.weight = weight
         self.coeff = coeff
-        self.size_2d, self.size_3d = weight.shape
+        self.size_2d, self.size_3d = int(np.prod(dim_uv)), int(np.prod(dim))
         self.n = 3 * np.prod(dim)
         self.m = 2 * np.prod(dim_uv)
         self._log.debug('Created ' + str(self))
@@ -90,6 +173,22 @@ class Projector(object):
         return '%s(dim=%r, dim_uv=%r, weight=%r, coeff=%r)' % \
                (self.__class__, self.dim, self.dim_uv, self.weight, self.coeff)
 
+    def __getstate__(self):
+        # Don't pickle the cached transposed weight matrix and buffers, they are rebuilt on demand:
+        state = self.__dict__.copy()
+        state['_weight_T'] = None
+        state['_buffers'] = {}
+        return state
+
+    def __setstate__(self, state):
+        # Projectors pickled before `weight` became a property (e.g. in old `data.pickle` files)
+        # stored the weight matrix directly and had no cached transposed matrix and buffers:
+        if 'weight' in state:
+            state['_weight'] = state.pop('weight')
+        state.setdefault('_weight_T', None)
+        state.setdefault('_buffers', {})
+        self.__dict__.update(state)
+
     def __str__(self):
         self._log.debug('Calling __str__')
         return 'Projector(dim=%s, dim_uv=%s, coeff=%s)' % (self.dim, self.dim_uv, self.coeff)
@@ -109,61 +208,65 @@ class Projector(object):
             raise TypeError('Input is neither of type VectorData or ScalarData')
         return field_data_proj
 
-    def _vector_field_projection(self, vector):
-        result = np.zeros(2 * self.size_2d, dtype=vector.dtype)
-        # Go over all possible component projections (z, y, x) to (u, v):
-        vec_x, vec_y, vec_z = np.split(vector, 3)
-        vec_x_weighted = self.weight.dot(vec_x)
-        vec_y_weighted = self.weight.dot(vec_y)
-        vec_z_weighted = self.weight.dot(vec_z)
-        slice_u = slice(0, self.size_2d)
-        slice_v = slice(self.size_2d, 2 * self.size_2d)
-        if self.coeff[0][0] != 0:  # x to u
-            result[slice_u] += self.coeff[0][0] * vec_x_weighted
-        if self.coeff[0][1] != 0:  # y to u
-            result[slice_u] += self.coeff[0][1] * vec_y_weighted
-        if self.coeff[0][2] != 0:  # z to u
-            result[slice_u] += self.coeff[0][2] * vec_z_weighted
-        if self.coeff[1][0] != 0:  # x to v
-            result[slice_v] += self.coeff[1][0] * vec_x_weighted
-        if self.coeff[1][1] != 0:  # y to v
-            result[slice_v] += self.coeff[1][1] * vec_y_weighted
-        if self.coeff[1][2] != 0:  # z to v
-            result[slice_v] += self.coeff[1][2] * vec_z_weighted
+    def _vector_field_projection(self, vector, out=None):
+        coeff = np.asarray(self.coeff)
+        vec_xyz = vector.reshape(3, self.size_3d)
+        # Weight only the components (x, y, z) which contribute to (u, v) at all:
+        buffer = self._get_buffer('forward', (3, self.size_2d), vector.dtype)
+        components = [i for i in range(3) if np.any(coeff[:, i] != 0)]
+        for i in components:
+            buffer[i] = 0
+            _csr_dot(self.weight, vec_xyz[i], buffer[i])
+        # Combine weighted components to (u, v) on the (small) 2D grid:
+        result = self._get_out(out, 2 * self.size_2d, vector.dtype)
+        result_uv = result.reshape(2, self.size_2d)
+        for i in components:
+            for j in range(2):
+                if coeff[j, i] != 0:
+                    result_uv[j] += coeff[j, i] * buffer[i]
         return result
 
-    def _vector_field_projection_T(self, vector):
-        result = np.zeros(3 * self.size_3d)
-        # Go over all possible component projections (u, v) to (z, y, x):
-        vec_u, vec_v = np.split(vector, 2)
-        vec_u_weighted = self.weight.T.dot(vec_u)
-        vec_v_weighted = self.weight.T.dot(vec_v)
-        slice_x = slice(0, self.size_3d)
-        slice_y = slice(self.size_3d, 2 * self.size_3d)
-        slice_z = slice(2 * self.size_3d, 3 * self.size_3d)
-        if self.coeff[0][0] != 0:  # u to x
-            result[slice_x] += self.coeff[0][0] * vec_u_weighted
-        if self.coeff[0][1] != 0:  # u to y
-            result[slice_y] += self.coeff[0][1] * vec_u_weighted
-        if self.coeff[0][2] != 0:  # u to z
-            result[slice_z] += self.coeff[0][2] * vec_u_weighted
-        if self.coeff[1][0] != 0:  # v to x
-            result[slice_x] += self.coeff[1][0] * vec_v_weighted
-        if self.coeff[1][1] != 0:  # v to y
-            result[slice_y] += self.coeff[1][1] * vec_v_weighted
-        if self.coeff[1][2] != 0:  # v to z
-            result[slice_z] += self.coeff[1][2] * vec_v_weighted
+    def _vector_field_projection_T(self, vector, out=None):
+        coeff = np.asarray(self.coeff)
+        vec_uv = vector.reshape(2, self.size_2d)
+        result = self._get_out(out, 3 * self.size_3d, np.result_type(vector, self.weight.dtype))
+        result_xyz = result.reshape(3, self.size_3d)
+        # Combine (u, v) on the (small) 2D grid, then weight directly into (x, y, z) of the result:
+        buffer = self._get_buffer('adjoint', (self.size_2d,), result.dtype)
+        for i in range(3):
+            if np.any(coeff[:, i] != 0):
+                buffer[:] = coeff[0, i] * vec_uv[0] + coeff[1, i] * vec_uv[1]
+                _csr_dot(self.weight_T, buffer, result_xyz[i])
         return result
 
-    def _scalar_field_projection(self, vector):
+    @staticmethod
+    def _get_out(out, size, dtype):
+        if out is None:
+            return np.zeros(size, dtype=dtype)
+        assert out.shape == (size,), 'Output array has the wrong shape!'
+        out[...] = 0
+        return out
+
+    def _get_buffer(self, name, shape, dtype):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer
+
+    def _scalar_field_projection(self, vector, out=None):
         self._log.debug('Calling _scalar_field_projection')
-        return np.array(self.weight.dot(vector))
+        result = self._get_out(out, self.size_2d, np.result_type(vector, self.weight.dtype))
+        _csr_dot(self.weight, vector, result)
+        return result
 
-    def _scalar_field_projection_T(self, vector):
+    def _scalar_field_projection_T(self, vector, out=None):
         self._log.debug('Calling _scalar_field_projection_T')
-        return np.array(self.weight.T.dot(vector))
+        result = self._get_out(out, self.size_3d, np.result_type(vector, self.weight.dtype))
+        _csr_dot(self.weight_T, vector, result)
+        return result
 
-    def jac_dot(self, vector):
+    def jac_dot(self, vector, out=None):
         """Multiply a `vector` with the jacobi matrix of this :class:`~.Projector` object.
 
         Parameters
@@ -171,6 +274,9 @@ class Projector(object):
         vector : :class:`~numpy.ndarray` (N=1)
             Vector containing the field which should be projected. Must have the same or 3 times
             the size of `size_3d` of the projector for  scalar and vector projection, respectively.
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Preallocated array into which the result is written (overwriting its content). If
+            None (default), a new array is created.
 
         Returns
         -------
@@ -180,14 +286,14 @@ class Projector(object):
 
         """
         if len(vector) == 3 * self.size_3d:  # mode == 'vector'
-            return self._vector_field_projection(vector)
+            return self._vector_field_projection(vector, out)
         elif len(vector) == self.size_3d:  # mode == 'scalar'
-            return self._scalar_field_projection(vector)
+            return self._scalar_field_projection(vector, out)
         else:
             raise AssertionError('Vector size has to be suited either for '
                                  'vector- or scalar-field-projection!')
 
-    def jac_T_dot(self, vector):
+    def jac_T_dot(self, vector, out=None):
         """Multiply a `vector` with the transp. jacobi matrix of this :class:`~.Projector` object.
 
         Parameters
@@ -195,6 +301,9 @@ class Projector(object):
         vector : :class:`~numpy.ndarray` (N=1)
             Vector containing the field which should be projected. Must have the same or 2 times
             the size of `size_2d` of the projector for  scalar and vector projection, respectively.
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Preallocated array into which the result is written (overwriting its content). If
+            None (default), a new array is created.
 
         Returns
         -------
@@ -204,13 +313,159 @@ class Projector(object):
 
         """
         if len(vector) == 2 * self.size_2d:  # mode == 'vector'
-            return self._vector_field_projection_T(vector)
+            return self._vector_field_projection_T(vector, out)
         elif len(vector) == self.size_2d:  # mode == 'scalar'
-            return self._scalar_field_projection_T(vector)
+            return self._scalar_field_projection_T(vector, out)
         else:
             raise AssertionError('Vector size has to be suited either for '
                                  'vector- or scalar-field-projection!')
 
+    def _combined_projection(self, fields, out=None):
+        coeff = np.asarray(self.coeff)
+        dtype = np.result_type(fields, self.weight.dtype)
+        # Weight all four fields (x, y, z, scalar) with one pass over the weight matrix:
+        weighted = self._get_buffer('combined', (self.size_2d, 4), dtype)
+        weighted[...] = 0
+        _csr_dot_multi(self.weight, fields, weighted)
+        # Combine weighted components to (u, v) on the (small) 2D grid:
+        result = self._get_out(out, 3 * self.size_2d, dtype)
+        result_uvs = result.reshape(3, self.size_2d)
+        result_uvs[:2] = coeff.dot(weighted[:, :3].T)
+        result_uvs[2] = weighted[:, 3]
+        return result
+
+    def _combined_projection_T(self, vector, out=None):
+        coeff = np.asarray(self.coeff)
+        vec_uvs = vector.reshape(3, self.size_2d)
+        dtype = np.result_type(vector, self.weight.dtype)
+        # Combine (u, v) to (x, y, z) on the (small) 2D grid, then weight all four fields at once:
+        buffer = self._get_buffer('combined', (self.size_2d, 4), dtype)
+        buffer[:, :3] = coeff.T.dot(vec_uvs[:2]).T
+        buffer[:, 3] = vec_uvs[2]
+        result = self._get_combined_out(out, dtype)
+        _csr_dot_multi(self.weight_T, buffer, result)
+        return result
+
+    def _separate_projection(self, fields, out=None):
+        # For projectors without a stored weight matrix, which do not profit from a joint pass:
+        result = self._get_out(out, 3 * self.size_2d, np.result_type(fields, float))
+        self.jac_dot(np.ascontiguousarray(fields[:, :3].T).ravel(), out=result[:2 * self.size_2d])
+        self.jac_dot(np.ascontiguousarray(fields[:, 3]), out=result[2 * self.size_2d:])
+        return result
+
+    def _separate_projection_T(self, vector, out=None):
+        result = self._get_combined_out(out, np.result_type(vector, float))
+        result[:, :3] = self.jac_T_dot(vector[:2 * self.size_2d]).reshape(3, self.size_3d).T
+        result[:, 3] = self.jac_T_dot(vector[2 * self.size_2d:])
+        return result
+
+    def _get_combined_out(self, out, dtype):
+        if out is None:
+            return np.zeros((self.size_3d, 4), dtype=dtype)
+        assert out.shape == (self.size_3d, 4), 'Output array has the wrong shape!'
+        out[...] = 0
+        return out
+
+    def jac_dot_combined(self, fields, out=None):
+        """Project a vector field and a scalar field of the same volume at once.
+
+        This is used to map magnetization and electrostatic contributions (e.g. the thickness for
+        the mean inner potential) together, so that the weight matrix is only traversed once.
+
+        Parameters
+        ----------
+        fields : :class:`~numpy.ndarray` (N=2)
+            Array of shape (`size_3d`, 4), which lists the `x`-, `y`- and `z`-components of the
+            vector field and the scalar field for every voxel (interleaved, so that all four
+            fields can be weighted with one pass).
+        out : :class:`~numpy.ndarray` (N=1), optional
+            Preallocated array into which the result is written (overwriting its content). If
+            None (default), a new array is created.
+
+        Returns
+        -------
+        proj_vector : :class:`~numpy.ndarray` (N=1)
+            Vector containing the projected `u`- and `v`-components, followed by the projected
+            scalar field. The length is 3 times `size_2d`.
+
+        """
+        assert fields.shape == (self.size_3d, 4), \
+            'Fields must have the shape (size_3d, 4) for a combined projection!'
+        return self._combined_projection(fields, out)
+
+    def jac_T_dot_combined(self, vector, out=None):
+        """Multiply a `vector` with the transposed jacobi matrix of :func:`~.jac_dot_combined`.
+
+        Parameters
+        ----------
+        vector : :class:`~numpy.ndarray` (N=1)
+            Vector containing the projected `u`- and `v`-components, followed by the projected
+            scalar field. Must have 3 times the size of `size_2d`.
+        out : :class:`~numpy.ndarray` (N=2), optional
+            Preallocated array of shape (`size_3d`, 4) into which the result is written
+            (overwriting its content). If None (default), a new array is created.
+
+        Returns
+        -------
+        fields : :class:`~numpy.ndarray` (N=2)
+            Array of shape (`size_3d`, 4), which lists the transposed vector field projection
+            (`x`, `y`, `z`) and the transposed scalar field projection for every voxel.
+
+        """
+        assert len(vector) == 3 * self.size_2d, \
+            'Vector size has to be suited for a combined vector- and scalar-field-projection!'
+        return self._combined_projection_T(vector, out)
+
+    def compact(self, dtype=np.float32):
+        """Store the weight matrix compactly to save memory and bandwidth (in place).
+
+        The weights are converted to `dtype` and the index arrays to 32 bit integers (if the sizes
+        of the matrix allow it). Products are then calculated in the precision of `dtype`.
+
+        Parameters
+        ----------
+        dtype : :class:`~numpy.dtype`, optional
+            Data type of the weights. Default is `float32`.
+
+        Returns
+        -------
+        None
+
+        """
+        self._log.debug('Calling compact')
+        weight = self.weight
+        indices, indptr = weight.indices, weight.indptr
+        if max(weight.nnz, *weight.shape) <= np.iinfo(np.int32).max:
+            indices, indptr = indices.astype(np.int32), indptr.astype(np.int32)
+        self.weight = csr_matrix((weight.data.astype(dtype), indices, indptr), shape=weight.shape)
+
+    def compress(self, mask):
+        """Return a copy of the projector which only acts on the voxels inside a 3D `mask`.
+
+        The columns of the weight matrix which belong to voxels outside of the `mask` are sliced
+        away once, so that :func:`~.jac_dot` and :func:`~.jac_T_dot` directly work on the
+        compressed vectors created by :func:`~.VectorData.get_vector` (first all `x`-, then all
+        `y`-, then all `z`-components of the masked voxels).
+
+        Parameters
+        ----------
+        mask : :class:`~numpy.ndarray` (N=3, boolean)
+            Mask which defines the voxels that are kept. Must have the dimensions `dim`.
+
+        Returns
+        -------
+        projector : :class:`~.Projector`
+            The compressed projector. It can not be called with a :class:`~.FieldData` object!
+
+        """
+        self._log.debug('Calling compress')
+        assert mask.shape == self.dim, 'Mask dimensions must match!'
+        result = copy.copy(self)
+        result.weight = self.weight[:, np.flatnonzero(mask)]
+        result.size_3d = result.weight.shape[1]
+        result.n = 3 * result.size_3d
+        return result
+
     def save(self, filename, overwrite=True):
         """Saves the projector as an HDF5 file.
 
@@ -271,12 +526,38 @@ class RotTiltProjector(Projector):
         Equivalence radius. Voxel centres falling withing distance R of a projection pixel are considered when calculating the pixel value.
     center : tuple (N=3), optional
         Defines where the centre of the phasemap is in 3D reconstruction space. Default is in middle. Dimensions (z,y,x)
+    vectorized : bool (optional)
+        If True (default), the weight matrix is set up with array operations on chunks of voxels.
+        If False, the (much slower) loop over single voxels is used. Both give identical matrices.
+    chunk_size : int (optional)
+        Number of voxels which are processed at once by the vectorized setup. Bounds the memory
+        needed for the temporary arrays. Default is 2**16.
     """
 
     _log = logging.getLogger(__name__ + '.RotTiltProjector')
 
-    def __init__(self, dim, rotation, tilt, camera_rotation=0, dim_uv=None, subcount=11, verbose=False, R=0.5, center = None):
+    def __init__(self, dim, rotation, tilt, camera_rotation=0, dim_uv=None, subcount=11, verbose=False, R=0.5, center = None,
+                 vectorized=True, chunk_size=2**16):
         self._log.debug('Calling __init__')
+        quat, dim_uv = self._set_geometry(dim, rotation, tilt, camera_rotation, center, dim_uv)
+        center = self.center
+        # Create 4D lookup table (1&2: which neighbour weight?, 3&4: which subpixel is hit?)
+        weight_lookup = self._create_weight_lookup(subcount, R)
+        if vectorized:
+            rows, columns, data = self._get_weight_entries(dim, dim_uv, quat, center, subcount,
+                                                           weight_lookup, chunk_size, verbose)
+        else:
+            rows, columns, data = self._get_weight_entries_loop(dim, dim_uv, quat, center, subcount,
+                                                                weight_lookup, verbose)
+        # Calculate weight matrix and coefficients for jacobi matrix:
+        shape = (np.prod(dim_uv), np.prod(dim))
+        weights = csr_matrix(coo_matrix((data, (rows, columns)), shape=shape))
+        # Calculate coefficients by rotating unity matrix (unit vectors, (x,y,z)):
+        coeff = quat.matrix[:2, :].dot(np.eye(3))
+        super().__init__(dim, dim_uv, weights, coeff)
+        self._log.debug('Created ' + str(self))
+
+    def _set_geometry(self, dim, rotation, tilt, camera_rotation, center, dim_uv):
         self.rotation = rotation
         self.tilt = tilt
         self.camera_rotation = camera_rotation
@@ -296,9 +577,11 @@ class RotTiltProjector(Projector):
             dim_v = max(dim_x, dim_y)  # first rotate around z-axis (take x and y into account)
             dim_u = max(dim_v, dim_z)  # then tilt around x-axis (now z matters, too)
             dim_uv = (dim_v, dim_u)
+        return quat, dim_uv
+
+    @staticmethod
+    def _get_impacts(voxels, quat, center, dim_uv):
         dim_v, dim_u = dim_uv
-        # Creating coordinate list of all voxels:
-        voxels = list(itertools.product(range(dim_z), range(dim_y), range(dim_x)))
         # Calculate vectors to voxels relative to rotation center (each column contains (z, y, x)):
         voxel_vecs = (np.asarray(voxels) + 0.5 - np.asarray(center)).T  # .T: row to column!
         # Change to coordinate order of quaternions (x, y, z) instead of (z, y, x) per column:
@@ -310,25 +593,87 @@ class RotTiltProjector(Projector):
         # First index (column): 0 -> v, 1 -> u, second index (row): voxel!
         impacts[0, :] += dim_v / 2.  # Shift back to normal indices
         impacts[1, :] += dim_u / 2.  # Shift back to normal indices
-        # Calculate equivalence radius:
-        R = R
+        return impacts
+
+    def _get_weight_entries(self, dim, dim_uv, quat, center, subcount, weight_lookup, chunk_size,
+                            verbose):
+        rows = []  # 2D projection
+        columns = []  # 3D distribution
+        data = []  # weights
+        for start, stop, chunk_rows, chunk_columns, chunk_data in self._iter_weight_entries(
+                dim, dim_uv, quat, center, subcount, weight_lookup, chunk_size, verbose=verbose):
+            rows.append(chunk_rows)
+            columns.append(start + chunk_columns)
+            data.append(chunk_data)
+        return np.concatenate(rows), np.concatenate(columns), np.concatenate(data)
+
+    @classmethod
+    def _iter_weight_entries(cls, dim, dim_uv, quat, center, subcount, weight_lookup, chunk_size,
+                             column_index=None, verbose=False):
+        """Yield the nonzero weight entries chunk by chunk, as `(start, stop, rows, columns, data)`.
+
+        The `columns` are relative to `start`. If a `column_index` is given, only the voxels with
+        these (flat) indices are used and `start` and `stop` refer to positions in `column_index`.
+
+        """
+        dim_z, dim_y, dim_x = dim
+        dim_v, dim_u = dim_uv
+        size_3d = dim_z * dim_y * dim_x if column_index is None else len(column_index)
+        # Offsets of the impact pixel and its neighbours (same order as in the loop, 9 pixels):
+        px_inds = np.asarray(list(itertools.product(range(3), range(3))))
+        # Chunk boundaries, a single voxel in the last chunk would be multiplied with the rotation
+        # matrix by a different BLAS routine (not bit-identical), so it is merged with the former:
+        bounds = list(range(0, size_3d, chunk_size)) + [size_3d]
+        if len(bounds) > 2 and bounds[-1] - bounds[-2] == 1:
+            del bounds[-2]
+        disable = not verbose
+        for start, stop in tqdm(list(zip(bounds[:-1], bounds[1:])), disable=disable, leave=False,
+                                desc='Set up projector'):
+            # Voxel coordinates (z, y, x) of the chunk, the column index is the running index:
+            if column_index is None:
+                voxel_index = np.arange(start, stop)
+            else:
+                voxel_index = column_index[start:stop]
+            voxels_z, remainder = np.divmod(voxel_index, dim_y * dim_x)
+            voxels_y, voxels_x = np.divmod(remainder, dim_x)
+            voxels = np.stack((voxels_z, voxels_y, voxels_x), axis=1)
+            impacts = cls._get_impacts(voxels, quat, center, dim_uv)
+            remainder, impact = np.modf(impacts)  # split index of impact and remainder!
+            sub_pixel = (remainder * subcount).astype(dtype=int)  # sub_pixel inside impact px.
+            # Pixel indices influenced by the impacts, shape (2, voxels, 9):
+            pixel = (impact[:, :, None] + px_inds.T[:, None, :] - 1).astype(dtype=int)
+            # Lookup weights in 4-dimensional lookup table, shape (voxels, 9):
+            weight = weight_lookup[px_inds[None, :, 0], px_inds[None, :, 1],
+                                   sub_pixel[0, :, None], sub_pixel[1, :, None]]
+            # Only keep pixels which are in bound and have a weight that is not zero:
+            valid = ((0 <= pixel[0]) & (pixel[0] < dim_v) & (0 <= pixel[1]) & (pixel[1] < dim_u)
+                     & (weight != 0.))
+            rows = (pixel[0] * dim_u + pixel[1])[valid]
+            columns = np.broadcast_to(np.arange(stop - start)[:, None], valid.shape)[valid]
+            yield start, stop, rows, columns, weight[valid]
+
+    def _get_weight_entries_loop(self, dim, dim_uv, quat, center, subcount, weight_lookup,
+                                 verbose):
+        dim_z, dim_y, dim_x = dim
+        dim_v, dim_u = dim_uv
+        # Creating coordinate list of all voxels:
+        voxels = list(itertools.product(range(dim_z), range(dim_y), range(dim_x)))
+        impacts = self._get_impacts(voxels, quat, center, dim_uv)
         # Prepare weight matrix calculation:
         rows = []  # 2D projection
         columns = []  # 3D distribution
         data = []  # weights
-        # Create 4D lookup table (1&2: which neighbour weight?, 3&4: which subpixel is hit?)
-        weight_lookup = self._create_weight_lookup(subcount, R)
         # Go over all voxels:
         disable = not verbose
         for i, voxel in enumerate(tqdm(voxels, disable=disable, leave=False,
                                        desc='Set up projector')):
             column_index = voxel[0] * dim_y * dim_x + voxel[1] * dim_x + voxel[2]
             remainder, impact = np.modf(impacts[:, i])  # split index of impact and remainder!
-            sub_pixel = (remainder * subcount).astype(dtype=np.int)  # sub_pixel inside impact px.
+            sub_pixel = (remainder * subcount).astype(dtype=int)  # sub_pixel inside impact px.
             # Go over all influenced pixels (impact and neighbours, indices are [0, 1, 2]!):
             for px_ind in list(itertools.product(range(3), range(3))):
                 # Pixel indices influenced by the impact (px_ind-1 to center them around impact):
-                pixel = (impact + np.array(px_ind) - 1).astype(dtype=np.int)
+                pixel = (impact + np.array(px_ind) - 1).astype(dtype=int)
                 # Check if pixel is out of bound:
                 if 0 <= pixel[0] < dim_uv[0] and 0 <= pixel[1] < dim_uv[1]:
                     # Lookup weight in 4-dimensional lookup table!
@@ -339,13 +684,7 @@ class RotTiltProjector(Projector):
                         columns.append(column_index)
                         rows.append(row_index)
                         data.append(weight)
-        # Calculate weight matrix and coefficients for jacobi matrix:
-        shape = (np.prod(dim_uv), np.prod(dim))
-        weights = csr_matrix(coo_matrix((data, (rows, columns)), shape=shape))
-        # Calculate coefficients by rotating unity matrix (unit vectors, (x,y,z)):
-        coeff = quat.matrix[:2, :].dot(np.eye(3))
-        super().__init__(dim, dim_uv, weights, coeff)
-        self._log.debug('Created ' + str(self))
+        return rows, columns, data
 
     @staticmethod
     def _create_weight_lookup(subcount, R):
@@ -402,6 +741,216 @@ class RotTiltProjector(Projector):
             return R'z-rot={:.1f}°, x-tilt={:.1f}°'.format(theta_ang, phi_ang)
 
 
+class MatrixFreeRotTiltProjector(RotTiltProjector):
+    """Matrix-free version of the :class:`~.RotTiltProjector`.
+
+    The :class:`~.MatrixFreeRotTiltProjector` class describes the same projection as the
+    :class:`~.RotTiltProjector`, but never stores the weight matrix. Instead, the impact points
+    of the voxels and the corresponding weights are calculated on the fly in chunks during every
+    call of :func:`~.jac_dot` and :func:`~.jac_T_dot`. The needed memory thus only scales with the
+    size of the volume and not with the number of nonzero weights, at the cost of a slower product.
+    Use this for large volumes and many projection angles, if the weight matrices do not fit into
+    memory.
+
+    Attributes
+    ----------
+    dim : tuple (N=3)
+        Dimensions (z, y, x) of the magnetization distribution.
+    rotation : float
+        Angle in `rad` describing the rotation around the z-axis before the tilt is happening.
+    tilt : float
+        Angle in `rad` describing the tilt of the beam direction relative to the x-axis.
+    camera_rotation : float (optional)
+        Angle in `rad` describing the rotation around the z-axis before after the tilt.
+    dim_uv : tuple (N=2), optional
+        Dimensions (v, u) of the projection. If not set defaults to the (y, x)-dimensions.
+    subcount : int (optional)
+        Number of subpixels along one axis, see :class:`~.RotTiltProjector`. Default is 11.
+    R : float (optional)
+        Equivalence radius, see :class:`~.RotTiltProjector`. Default is 0.5.
+    center : tuple (N=3), optional
+        Defines where the centre of the phasemap is in 3D reconstruction space. Default is in middle. Dimensions (z,y,x)
+    chunk_size : int (optional)
+        Number of voxels which are processed at once. Bounds the memory needed for the temporary
+        arrays. Default is 2**16.
+    column_index : :class:`~numpy.ndarray` (N=1) or None
+        Flat indices of the voxels the projector acts on (see :func:`~.compress`). None (default)
+        means all voxels.
+
+    """
+
+    _log = logging.getLogger(__name__ + '.MatrixFreeRotTiltProjector')
+
+    @property
+    def weight(self):
+        """The weight matrix, assembled on demand (expensive, only use for small volumes)."""
+        rows, columns, data = [], [], []
+        for start, stop, chunk_rows, chunk_columns, chunk_data in self._iter_chunks():
+            rows.append(chunk_rows)
+            columns.append(start + chunk_columns)
+            data.append(chunk_data)
+        shape = (self.size_2d, self.size_3d)
+        return csr_matrix(coo_matrix((np.concatenate(data),
+                                      (np.concatenate(rows), np.concatenate(columns))), shape=shape))
+
+    @property
+    def weight_T(self):
+        """The transposed weight matrix, assembled on demand (not cached)."""
+        return self.weight.T.tocsr()
+
+    def __init__(self, dim, rotation, tilt, camera_rotation=0, dim_uv=None, subcount=11, R=0.5,
+                 center=None, chunk_size=2**16):
+        self._log.debug('Calling __init__')
+        self.quat, dim_uv = self._set_geometry(dim, rotation, tilt, camera_rotation, center, dim_uv)
+        self.subcount = subcount
+        self.R = R
+        self.chunk_size = chunk_size
+        self.column_index = None
+        self.weight_lookup = self._create_weight_lookup(subcount, R)
+        # Calculate coefficients by rotating unity matrix (unit vectors, (x,y,z)):
+        coeff = self.quat.matrix[:2, :].dot(np.eye(3))
+        Projector.__init__(self, dim, dim_uv, None, coeff)
+        self._log.debug('Created ' + str(self))
+
+    def _iter_chunks(self):
+        return self._iter_weight_entries(self.dim, self.dim_uv, self.quat, self.center,
+                                         self.subcount, self.weight_lookup, self.chunk_size,
+                                         column_index=self.column_index)
+
+    @staticmethod
+    def _add_rows(result, rows, weights):
+        # Only bin over the range of pixels which is actually hit by the chunk:
+        if len(rows) > 0:
+            row_min = rows.min()
+            binned = np.bincount(rows - row_min, weights=weights)
+            result[row_min:row_min + len(binned)] += binned
+
+    def _vector_field_projection(self, vector, out=None):
+        coeff = np.asarray(self.coeff)
+        vec_xyz = vector.reshape(3, self.size_3d)
+        result = self._get_out(out, 2 * self.size_2d, vector.dtype)
+        result_uv = result.reshape(2, self.size_2d)
+        for start, stop, rows, columns, data in self._iter_chunks():
+            # Combine (x, y, z) to (u, v) for the voxels of the chunk before weighting:
+            vec_uv = coeff.dot(vec_xyz[:, start:stop])
+            for j in range(2):
+                self._add_rows(result_uv[j], rows, data * vec_uv[j, columns])
+        return result
+
+    def _vector_field_projection_T(self, vector, out=None):
+        coeff = np.asarray(self.coeff)
+        vec_uv = vector.reshape(2, self.size_2d)
+        result = self._get_out(out, 3 * self.size_3d, np.result_type(vector, float))
+        result_xyz = result.reshape(3, self.size_3d)
+        for start, stop, rows, columns, data in self._iter_chunks():
+            # Weight (u, v) into the voxels of the chunk, then combine to (x, y, z):
+            weighted = [np.bincount(columns, weights=data * vec_uv[j, rows], minlength=stop - start)
+                        for j in range(2)]
+            for i in range(3):
+                result_xyz[i, start:stop] = coeff[0, i] * weighted[0] + coeff[1, i] * weighted[1]
+        return result
+
+    def _scalar_field_projection(self, vector, out=None):
+        self._log.debug('Calling _scalar_field_projection')
+        result = self._get_out(out, self.size_2d, np.result_type(vector, float))
+        for start, stop, rows, columns, data in self._iter_chunks():
+            self._add_rows(result, rows, data * vector[start:stop][columns])
+        return result
+
+    def _scalar_field_projection_T(self, vector, out=None):
+        self._log.debug('Calling _scalar_field_projection_T')
+        result = self._get_out(out, self.size_3d, np.result_type(vector, float))
+        for start, stop, rows, columns, data in self._iter_chunks():
+            result[start:stop] = np.bincount(columns, weights=data * vector[rows],
+                                             minlength=stop - start)
+        return result
+
+    _combined_projection = Projector._separate_projection
+    _combined_projection_T = Projector._separate_projection_T
+
+    def compact(self, dtype=np.float32):
+        """Does nothing, matrix-free projectors store no weight matrix which could be compacted."""
+        self._log.debug('Calling compact')
+
+    def compress(self, mask):
+        """Return a copy of the projector which only acts on the voxels inside a 3D `mask`.
+
+        See :func:`~.Projector.compress`. Only the voxels inside the `mask` are swept.
+
+        Parameters
+        ----------
+        mask : :class:`~numpy.ndarray` (N=3, boolean)
+            Mask which defines the voxels that are kept. Must have the dimensions `dim`.
+
+        Returns
+        -------
+        projector : :class:`~.MatrixFreeRotTiltProjector`
+            The compressed projector. It can not be called with a :class:`~.FieldData` object!
+
+        """
+        self._log.debug('Calling compress')
+        assert mask.shape == self.dim, 'Mask dimensions must match!'
+        assert self.column_index is None, 'Projector is already compressed!'
+        result = copy.copy(self)
+        result._buffers = {}
+        result.column_index = np.flatnonzero(mask)
+        result.size_3d = len(result.column_index)
+        result.n = 3 * result.size_3d
+        return result
+
+
+def _get_tilt_entries(positions, r, size):
+    """Calculate the weight entries of one slice of a single-axis tilt projector.
+
+    Parameters
+    ----------
+    positions : :class:`~numpy.ndarray` (N=1)
+        Positions of the voxel centers along the projected axis (in pixel coordinates).
+    r : float
+        Radius of the voxel circle.
+    size : int
+        Number of pixels along the projected axis.
+
+    Returns
+    -------
+    voxel_ids : :class:`~numpy.ndarray` (N=1)
+        Index into `positions` of the voxel belonging to each entry.
+    impacts : :class:`~numpy.ndarray` (N=1)
+        Pixel along the projected axis that is hit by each entry.
+    weights : :class:`~numpy.ndarray` (N=1)
+        Fraction of the voxel circle that falls into the respective pixel.
+
+    Notes
+    -----
+    Entries are ordered by voxel first and by impact second, just like a loop over all voxels and
+    their impacts would produce them.
+
+    """
+    positions = np.asarray(positions, dtype=float).ravel()
+    # All pixels between the lower and the upper edge of each voxel circle:
+    first = np.floor(positions - r).astype(int)
+    count = np.floor(positions + r).astype(int) - first + 1
+    offsets = np.arange(count.max() if len(count) else 0)
+    impacts = first[:, None] + offsets
+    valid = (offsets < count[:, None]) & (impacts >= 0) & (impacts < size)
+    voxel_ids = np.nonzero(valid)[0]
+    impacts = impacts[valid]
+    # Use circles to represent the voxels:
+    rho = 0.5 / r
+    delta = np.abs(impacts + 0.5 - positions[voxel_ids]) / r
+    weights = _get_circle_fraction(delta + rho) - _get_circle_fraction(delta - rho)
+    return voxel_ids, impacts, weights
+
+
+def _get_circle_fraction(bound):
+    # Signed fraction of the unit circle between its center line and the chord at `bound`:
+    inside = np.abs(bound) < 1
+    bound_in = np.where(inside, bound, 0)
+    root = np.sqrt(1 - bound_in ** 2)
+    fraction = (bound_in * root + np.arctan(bound_in / root)) / pi
+    return np.where(inside, fraction, 0.5 * np.sign(bound))
+
+
 class XTiltProjector(Projector):
     """Class representing a projection function with a tilt around the x-axis.
 
@@ -417,6 +966,8 @@ class XTiltProjector(Projector):
         Angle in `rad` describing the tilt of the beam direction relative to the x-axis.
     dim_uv : tuple (N=2), optional
         Dimensions (v, u) of the projection. If not set defaults to the (y, x)-dimensions.
+    verbose : bool, optional
+        Ignored (the weights are calculated without a progress bar), accepted for compatibility.
     r : float, optional
         radius of the voxel circle
     """
@@ -434,28 +985,15 @@ class XTiltProjector(Projector):
         dim_v, dim_u = dim_uv  # y, x
         assert dim_v >= dim_perp and dim_u >= dim_rot, 'Projected dimensions are too small!'
         # Creating coordinate list of all voxels (for one slice):
-        voxels = list(itertools.product(range(dim_proj), range(dim_perp)))  # z-y-plane
+        voxels = np.indices((dim_proj, dim_perp)).reshape(2, -1).T  # z-y-plane
         # Calculate positions along the projected pixel coordinate system:
         center = (dim_proj / 2., dim_perp / 2.)
         positions = self._get_position(voxels, center, tilt, dim_v)
-        # Calculate weight-matrix:
-        rho = 0.5 / r
-        row = []
-        col = []
-        data = []
-        # One slice:
-        disable = not verbose
-        for i, voxel in enumerate(tqdm(voxels, disable=disable, leave=False,
-                                       desc='Set up projector')):
-            impacts = self._get_impact(positions[i], r, dim_v)  # impact along projected y-axis
-            voxel_index = voxel[0] * dim_rot * dim_perp + voxel[1] * dim_rot  # 0: z, 1: y
-            for impact in impacts:
-                impact_index = impact * dim_u + (dim_u - dim_rot) // 2
-                distance = np.abs(impact + 0.5 - positions[i])
-                delta = distance / r
-                col.append(voxel_index)
-                row.append(impact_index)
-                data.append(self._get_weight(delta, rho))
+        # Calculate weight-matrix for one slice (all voxels and impacts at once):
+        voxel_ids, impacts, data = _get_tilt_entries(positions, r, dim_v)  # along projected y-axis
+        voxels = voxels[voxel_ids]
+        col = voxels[:, 0] * dim_rot * dim_perp + voxels[:, 1] * dim_rot  # 0: z, 1: y
+        row = impacts * dim_u + (dim_u - dim_rot) // 2
         # All other slices (along x):
         data = np.tile(data, dim_rot)
         columns = np.tile(col, dim_rot)
@@ -478,26 +1016,6 @@ class XTiltProjector(Projector):
         distances += size / 2.  # Shift to the center of the projection
         return distances
 
-    @staticmethod
-    def _get_impact(pos, r, size):
-        return [x for x in np.arange(int(np.floor(pos - r)), int(np.floor(pos + r) + 1), dtype=int)
-                if 0 <= x < size]
-
-    @staticmethod
-    def _get_weight(delta, rho):  # use circles to represent the voxels
-        lo, up = delta - rho, delta + rho
-        # Upper boundary:
-        if up >= 1:
-            w_up = 0.5
-        else:
-            w_up = (up * np.sqrt(1 - up ** 2) + np.arctan(up / np.sqrt(1 - up ** 2))) / pi
-        # Lower boundary:
-        if lo <= -1:
-            w_lo = -0.5
-        else:
-            w_lo = (lo * np.sqrt(1 - lo ** 2) + np.arctan(lo / np.sqrt(1 - lo ** 2))) / pi
-        return w_up - w_lo
-
     def get_info(self, verbose=False):
         """Get specific information about the projector as a string.
 
@@ -534,6 +1052,8 @@ class YTiltProjector(Projector):
         Angle in `rad` describing the tilt of the beam direction relative to the y-axis.
     dim_uv : tuple (N=2), optional
         Dimensions (v, u) of the projection. If not set defaults to the (y, x)-dimensions.
+    verbose : bool, optional
+        Ignored (the weights are calculated without a progress bar), accepted for compatibility.
     r : float, optional
         radius of the voxel circle
     """
@@ -551,28 +1071,15 @@ class YTiltProjector(Projector):
         dim_v, dim_u = dim_uv  # y, x
         assert dim_v >= dim_rot and dim_u >= dim_perp, 'Projected dimensions are too small!'
         # Creating coordinate list of all voxels (for one slice):
-        voxels = list(itertools.product(range(dim_proj), range(dim_perp)))  # z-x-plane
+        voxels = np.indices((dim_proj, dim_perp)).reshape(2, -1).T  # z-x-plane
         # Calculate positions along the projected pixel coordinate system:
         center = (dim_proj / 2., dim_perp / 2.)
         positions = self._get_position(voxels, center, tilt, dim_u)
-        # Calculate weight-matrix:
-        rho = 0.5 / r
-        row = []
-        col = []
-        data = []
-        # One slice:
-        disable = not verbose
-        for i, voxel in enumerate(tqdm(voxels, disable=disable, leave=False,
-                                       desc='Set up projector')):
-            impacts = self._get_impact(positions[i], r, dim_u)  # impact along projected x-axis
-            voxel_index = voxel[0] * dim_perp * dim_rot + voxel[1]  # 0: z, 1: x
-            for impact in impacts:
-                impact_index = impact + (dim_v - dim_rot) // 2 * dim_u
-                distance = np.abs(impact + 0.5 - positions[i])
-                delta = distance / r
-                col.append(voxel_index)
-                row.append(impact_index)
-                data.append(self._get_weight(delta, rho))
+        # Calculate weight-matrix for one slice (all voxels and impacts at once):
+        voxel_ids, impacts, data = _get_tilt_entries(positions, r, dim_u)  # along projected x-axis
+        voxels = voxels[voxel_ids]
+        col = voxels[:, 0] * dim_perp * dim_rot + voxels[:, 1]  # 0: z, 1: x
+        row = impacts + (dim_v - dim_rot) // 2 * dim_u
         # All other slices (along y):
         data = np.tile(data, dim_rot)
         columns = np.tile(col, dim_rot)
@@ -595,26 +1102,6 @@ class YTiltProjector(Projector):
         distances += size / 2.  # Shift to the center of the projection
         return distances
 
-    @staticmethod
-    def _get_impact(pos, r, size):
-        return [x for x in np.arange(np.floor(pos - r), np.floor(pos + r) + 1, dtype=int)
-                if 0 <= x < size]
-
-    @staticmethod
-    def _get_weight(delta, rho):  # use circles to represent the voxels
-        lo, up = delta - rho, delta + rho
-        # Upper boundary:
-        if up >= 1:
-            w_up = 0.5
-        else:
-            w_up = (up * np.sqrt(1 - up ** 2) + np.arctan(up / np.sqrt(1 - up ** 2))) / pi
-        # Lower boundary:
-        if lo <= -1:
-            w_lo = -0.5
-        else:
-            w_lo = (lo * np.sqrt(1 - lo ** 2) + np.arctan(lo / np.sqrt(1 - lo ** 2))) / pi
-        return w_up - w_lo
-
     def get_info(self, verbose=False):
         """Get specific information about the projector as a string.
 
@@ -652,6 +1139,12 @@ class SimpleProjector(Projector):
         to the z-axis.
     dim_uv : tuple (N=2), optional
         Dimensions (v, u) of the projection. If not set it uses the 3D default dimensions.
+    window : tuple of slice (N=2)
+        Part of the (v, u) grid onto which the field is projected (the rest is padding).
+    compressed : bool
+        True if the projector was compressed (see :func:`~.compress`). Uncompressed projectors
+        directly sum along the `axis` and broadcast back for the adjoint, the weight matrix is
+        only assembled on demand. Compressed projectors use the (sliced) weight matrix.
 
     """
 
@@ -660,59 +1153,176 @@ class SimpleProjector(Projector):
 
     # coordinate switch for 'x': u, v --> z, y (not y, z!)!
 
+    @property
+    def weight(self):
+        """The weight matrix, only assembled on first access (projections do not need it)."""
+        if self._weight is None:
+            self._weight = self._create_weight()
+        return self._weight
+
+    @weight.setter
+    def weight(self, weight):
+        Projector.weight.fset(self, weight)
+
     def __init__(self, dim, axis='z', dim_uv=None, verbose=False):
         self._log.debug('Calling __init__')
         assert axis in {'z', 'y', 'x'}, 'Projection axis has to be x, y or z (given as a string)!'
         self.axis = axis
         proj, v, u = self.AXIS_DICT[axis]
-        dim_proj, dim_v, dim_u = dim[proj], dim[v], dim[u]
-        dim_z, dim_y, dim_x = dim
-        size_2d = dim_u * dim_v
-        size_3d = np.prod(dim)
-        data = np.repeat(1, size_3d)  # size_3d ones in the matrix (each voxel is projected)
-        indptr = np.arange(0, size_3d + 1, dim_proj)  # each row has dim_proj 1-entries
+        dim_v, dim_u = dim[v], dim[u]
         if axis == 'z':
             self._log.debug('Projecting along the z-axis')
             coeff = [[1, 0, 0], [0, 1, 0]]
-            indices = np.array([np.arange(row, size_3d, size_2d)
-                                for row in range(size_2d)]).reshape(-1)
         elif axis == 'y':
             self._log.debug('Projection along the y-axis')
             coeff = [[1, 0, 0], [0, 0, 1]]
-            indices = np.array(
-                [np.arange(row % dim_x, dim_x * dim_y, dim_x) + row // dim_x * dim_x * dim_y
-                 for row in range(size_2d)]).reshape(-1)
         elif axis == 'x':
             self._log.debug('Projection along the x-axis')
             # TODO: is coordinate switch really necessary? Better other way???
             coeff = [[0, 0, 1], [0, 1, 0]]  # Caution, coordinate switch: u, v --> z, y (not y, z!)
-            indices = np.array(
-                [np.arange(dim_x) + (row % dim_z) * dim_x * dim_y + row // dim_z * dim_x
-                 for row in range(size_2d)]).reshape(-1)
         else:
             raise ValueError('{} is not a valid axis parameter (use x, y or z)!'.format(axis))
-        if dim_uv is not None:
-            indptr = list(indptr)  # convert to use insert() and append()
-            # Calculate padding:
-            d_v = (np.floor((dim_uv[0] - dim_v) / 2).astype(int),
-                   np.ceil((dim_uv[0] - dim_v) / 2).astype(int))
-            d_u = (np.floor((dim_uv[1] - dim_u) / 2).astype(int),
-                   np.ceil((dim_uv[1] - dim_u) / 2).astype(int))
-            indptr.extend([indptr[-1]] * d_v[1] * dim_uv[1])  # add empty lines at the end
-            for i in np.arange(dim_v, 0, -1):  # all slices in between
-                up, lo = i * dim_u, (i - 1) * dim_u  # upper / lower slice end
-                indptr[up:up] = [indptr[up]] * d_u[1]  # end of the slice
-                indptr[lo:lo] = [indptr[lo]] * d_u[0]  # start of the slice
-            indptr = [0] * d_v[0] * dim_uv[1] + indptr  # insert empty rows at the beginning
-        else:  # Make sure dim_uv is defined (used for the assertion)
+        if dim_uv is None:
             dim_uv = dim_v, dim_u
         assert dim_uv[0] >= dim_v and dim_uv[1] >= dim_u, 'Projected dimensions are too small!'
-        # Create weight-matrix:
-        shape = (np.prod(dim_uv), np.prod(dim))
-        weight = csr_matrix((data, indices, indptr), shape=shape)
-        super().__init__(dim, dim_uv, weight, coeff)
+        # Calculate padding (where the projected field is placed inside of the 2D grid):
+        pad_v, pad_u = (dim_uv[0] - dim_v) // 2, (dim_uv[1] - dim_u) // 2
+        self.window = (slice(pad_v, pad_v + dim_v), slice(pad_u, pad_u + dim_u))
+        self.compressed = False
+        self._weight = None  # Assembled on demand!
+        super().__init__(dim, dim_uv, None, coeff)
         self._log.debug('Created ' + str(self))
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        if not self.compressed:  # Cheaper to recreate than to send:
+            state['_weight'] = None
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if 'window' not in state:  # Pickled before the projection window was stored:
+            proj, v, u = self.AXIS_DICT[self.axis]
+            dim_v, dim_u = self.dim[v], self.dim[u]
+            pad_v, pad_u = (self.dim_uv[0] - dim_v) // 2, (self.dim_uv[1] - dim_u) // 2
+            self.window = (slice(pad_v, pad_v + dim_v), slice(pad_u, pad_u + dim_u))
+            self.compressed = False  # Old projectors could not be compressed
+
+    def _create_weight(self):
+        proj, v, u = self.AXIS_DICT[self.axis]
+        # Each row (pixel) sums up all voxels along the projection axis (which varies fastest):
+        indices = np.arange(self.size_3d).reshape(self.dim).transpose(v, u, proj).ravel()
+        counts = np.zeros(self.dim_uv, dtype=int)
+        counts[self.window] = self.dim[proj]
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        shape = (self.size_2d, self.size_3d)
+        return csr_matrix((np.ones(self.size_3d), indices, indptr), shape=shape)
+
+    def _project(self, field, out):
+        # Sum `field` (3D) along the projection axis directly into the window of `out` (2D):
+        proj, v, u = self.AXIS_DICT[self.axis]
+        window = out.reshape(self.dim_uv)[self.window]
+        np.sum(field.reshape(self.dim), axis=proj, out=window.T if v > u else window)
+
+    def _project_T(self, field_2d, out):
+        # Broadcast the window of `field_2d` along the projection axis into `out` (3D):
+        proj, v, u = self.AXIS_DICT[self.axis]
+        window = field_2d.reshape(self.dim_uv)[self.window]
+        out.reshape(self.dim)[...] = np.expand_dims(window.T if v > u else window, proj)
+
+    def _vector_field_projection(self, vector, out=None):
+        if self.compressed:
+            return super()._vector_field_projection(vector, out)
+        coeff = np.asarray(self.coeff)
+        vec_xyz = vector.reshape(3, self.size_3d)
+        buffer = self._get_buffer('forward', (self.size_2d,), vector.dtype)
+        result = self._get_out(out, 2 * self.size_2d, vector.dtype)
+        result_uv = result.reshape(2, self.size_2d)
+        for i in range(3):
+            if np.any(coeff[:, i] != 0):
+                self._project(vec_xyz[i], buffer)
+                for j in range(2):
+                    if coeff[j, i] != 0:
+                        result_uv[j] += coeff[j, i] * buffer
+        return result
+
+    def _vector_field_projection_T(self, vector, out=None):
+        if self.compressed:
+            return super()._vector_field_projection_T(vector, out)
+        coeff = np.asarray(self.coeff)
+        vec_uv = vector.reshape(2, self.size_2d)
+        dtype = np.result_type(vector, float)
+        if out is None:  # Every entry is overwritten, no need to initialise:
+            out = np.empty(3 * self.size_3d, dtype=dtype)
+        assert out.shape == (3 * self.size_3d,), 'Output array has the wrong shape!'
+        result_xyz = out.reshape(3, self.size_3d)
+        buffer = self._get_buffer('adjoint', (self.size_2d,), dtype)
+        for i in range(3):
+            if np.any(coeff[:, i] != 0):
+                buffer[:] = coeff[0, i] * vec_uv[0] + coeff[1, i] * vec_uv[1]
+                self._project_T(buffer, result_xyz[i])
+            else:
+                result_xyz[i] = 0
+        return out
+
+    def _scalar_field_projection(self, vector, out=None):
+        if self.compressed:
+            return super()._scalar_field_projection(vector, out)
+        self._log.debug('Calling _scalar_field_projection')
+        result = self._get_out(out, self.size_2d, np.result_type(vector, float))
+        self._project(vector, result)
+        return result
+
+    def _scalar_field_projection_T(self, vector, out=None):
+        if self.compressed:
+            return super()._scalar_field_projection_T(vector, out)
+        self._log.debug('Calling _scalar_field_projection_T')
+        if out is None:  # Every entry is overwritten, no need to initialise:
+            out = np.empty(self.size_3d, dtype=np.result_type(vector, float))
+        assert out.shape == (self.size_3d,), 'Output array has the wrong shape!'
+        self._project_T(vector, out)
+        return out
+
+    def _combined_projection(self, fields, out=None):
+        if self.compressed:
+            return super()._combined_projection(fields, out)
+        return self._separate_projection(fields, out)
+
+    def _combined_projection_T(self, vector, out=None):
+        if self.compressed:
+            return super()._combined_projection_T(vector, out)
+        return self._separate_projection_T(vector, out)
+
+    def compact(self, dtype=np.float32):
+        """Store the weight matrix compactly (see :func:`~.Projector.compact`).
+
+        Does nothing for uncompressed projectors, which sum along the axis without a weight matrix.
+
+        """
+        self._log.debug('Calling compact')
+        if self.compressed:
+            super().compact(dtype)
+
+    def compress(self, mask):
+        """Return a copy of the projector which only acts on the voxels inside a 3D `mask`.
+
+        See :func:`~.Projector.compress`. The compressed projector uses the weight matrix.
+
+        Parameters
+        ----------
+        mask : :class:`~numpy.ndarray` (N=3, boolean)
+            Mask which defines the voxels that are kept. Must have the dimensions `dim`.
+
+        Returns
+        -------
+        projector : :class:`~.SimpleProjector`
+            The compressed projector. It can not be called with a :class:`~.FieldData` object!
+
+        """
+        result = super().compress(mask)
+        result.compressed = True
+        return result
+
     def get_info(self, verbose=False):
         """Get specific information about the projector as a string.
 
@@ -732,3 +1342,458 @@ class SimpleProjector(Projector):
             return 'projected along {}-axis'.format(self.axis)
         else:
             return '{}axis'.format(self.axis)
+
+
+class StackedProjector(Projector):
+    """Class representing a stack of projections of the same 3D distribution.
+
+    The :class:`~.StackedProjector` class vertically concatenates the weight matrices of several
+    :class:`~.Projector` objects (e.g. of a whole tilt series) into one sparse matrix, so that
+    all images are projected with one sparse product instead of one product per image. The
+    2-dimensional results of all images are listed one after another, the `u`- and `v`-components
+    of every image are kept together (like in the result of :func:`~.Projector.jac_dot` of each
+    single projector). The `hook_points` mark where the results of the images start. The combined
+    projections (see :func:`~.Projector.jac_dot_combined`) keep the `u`-, `v`- and scalar
+    components of every image together (starting at `hook_points_combined`), calling the
+    projector with a :class:`~.FieldData` object returns a list of the projections of all images.
+
+    Only the adjoint profits from the stacking (one product with the transposed stack instead of
+    one per image). The forward product traverses the same nonzero weights as the products of
+    the single projectors and scipy's sparse products are single-threaded, so it is not faster.
+
+    Attributes
+    ----------
+    dim : tuple (N=3)
+        Dimensions (z, y, x) of the magnetization distribution.
+    dim_uvs : list of tuple (N=2)
+        Dimensions (v, u) of the projected grids of all images.
+    count : int
+        Number of stacked projectors (images).
+    size_3d : int
+        Number of voxels of the 3-dimensional grid.
+    size_2d : int
+        Number of pixels of all 2-dimensional projected grids combined.
+    weight : :class:`~scipy.sparse.csr_matrix` (N=2)
+        The stacked weight matrices of all projectors.
+    coeff : :class:`~numpy.ndarray` (N=3)
+        The coefficients of all projectors, with shape (count, 2, 3).
+    hook_points : list of int
+        Hook points which determine the start of the results of the images in the vectorized
+        (vector field) projection.
+    hook_points_combined : list of int
+        Hook points which determine the start of the results of the images in the combined
+        (vector and scalar field) projection.
+    m: int
+        Size of the image space.
+    n: int
+        Size of the input space.
+
+    """
+
+    _log = logging.getLogger(__name__ + '.StackedProjector')
+
+    def __init__(self, projectors):
+        self._log.debug('Calling __init__')
+        assert len(projectors) > 0, 'At least one projector is needed!'
+        size_3d = projectors[0].size_3d
+        assert all(p.size_3d == size_3d for p in projectors), '3D dimensions must match!'
+        self.dim_uvs = [p.dim_uv for p in projectors]
+        self.count = len(projectors)
+        weight = vstack([p.weight for p in projectors], format='csr')
+        coeff = np.array([p.coeff for p in projectors], dtype=float)
+        super().__init__(projectors[0].dim, (weight.shape[0],), weight, coeff)
+        self.dim_uv = None  # dim_uv of the images are stored in dim_uvs
+        self.size_3d = size_3d  # For compressed projectors, not equal to the size of dim!
+        self.n = 3 * size_3d
+        self._row_points = np.cumsum([0] + [p.size_2d for p in projectors]).tolist()
+        self.hook_points = [2 * row for row in self._row_points]
+        self.hook_points_combined = [3 * row for row in self._row_points]
+        self._log.debug('Created ' + str(self))
+
+    def __repr__(self):
+        self._log.debug('Calling __repr__')
+        return '%s(dim=%r, dim_uvs=%r, weight=%r, coeff=%r)' % \
+               (self.__class__, self.dim, self.dim_uvs, self.weight, self.coeff)
+
+    def __str__(self):
+        self._log.debug('Calling __str__')
+        return 'StackedProjector(dim=%s, count=%s)' % (self.dim, self.count)
+
+    def __call__(self, field_data):
+        if not isinstance(field_data, (VectorData, ScalarData)):
+            raise TypeError('Input is neither of type VectorData or ScalarData')
+        proj_vec = self.jac_dot(field_data.field_vec)
+        rp, hp = self._row_points, self.hook_points
+        result = []
+        for k, dim_uv in enumerate(self.dim_uvs):  # One projected FieldData per image:
+            if isinstance(field_data, VectorData):
+                field_proj = np.zeros((3, 1) + dim_uv, dtype=field_data.field.dtype)
+                field_proj[0:2, 0, ...] = proj_vec[hp[k]:hp[k + 1]].reshape((2,) + dim_uv)
+            else:
+                field_proj = np.zeros((1,) + dim_uv, dtype=field_data.field.dtype)
+                field_proj[0, ...] = proj_vec[rp[k]:rp[k + 1]].reshape(dim_uv)
+            result.append(type(field_data)(field_data.a, field_proj))
+        return result
+
+    def _combined_projection(self, fields, out=None):
+        dtype = np.result_type(fields, self.weight.dtype)
+        # Weight all four fields (x, y, z, scalar) of all images with one pass over the stack:
+        weighted = self._get_buffer('combined', (self.size_2d, 4), dtype)
+        weighted[...] = 0
+        _csr_dot_multi(self.weight, fields, weighted)
+        # Combine weighted components to (u, v) for each image on the (small) 2D grids:
+        result = self._get_out(out, 3 * self.size_2d, dtype)
+        rp, hp = self._row_points, self.hook_points_combined
+        for k in range(self.count):
+            result_uvs = result[hp[k]:hp[k + 1]].reshape(3, -1)
+            result_uvs[:2] = self.coeff[k].dot(weighted[rp[k]:rp[k + 1], :3].T)
+            result_uvs[2] = weighted[rp[k]:rp[k + 1], 3]
+        return result
+
+    def _combined_projection_T(self, vector, out=None):
+        dtype = np.result_type(vector, self.weight.dtype)
+        # Combine (u, v) to (x, y, z) for each image on the (small) 2D grids:
+        buffer = self._get_buffer('combined', (self.size_2d, 4), dtype)
+        rp, hp = self._row_points, self.hook_points_combined
+        for k in range(self.count):
+            vec_uvs = vector[hp[k]:hp[k + 1]].reshape(3, -1)
+            buffer[rp[k]:rp[k + 1], :3] = self.coeff[k].T.dot(vec_uvs[:2]).T
+            buffer[rp[k]:rp[k + 1], 3] = vec_uvs[2]
+        # Weight all four fields at once with the transposed stack:
+        result = self._get_combined_out(out, dtype)
+        _csr_dot_multi(self.weight_T, buffer, result)
+        return result
+
+    def _vector_field_projection(self, vector, out=None):
+        vec_xyz = vector.reshape(3, self.size_3d)
+        # Weight only the components (x, y, z) which contribute to (u, v) in any image:
+        buffer = self._get_buffer('forward', (3, self.size_2d), vector.dtype)
+        buffer[...] = 0
+        for i in range(3):
+            if np.any(self.coeff[:, :, i] != 0):
+                _csr_dot(self.weight, vec_xyz[i], buffer[i])
+        # Combine weighted components to (u, v) for each image on the (small) 2D grids:
+        result = self._get_out(out, 2 * self.size_2d, vector.dtype)
+        rp, hp = self._row_points, self.hook_points
+        for k in range(self.count):
+            result_uv = result[hp[k]:hp[k + 1]].reshape(2, -1)
+            result_uv[...] = self.coeff[k].dot(buffer[:, rp[k]:rp[k + 1]])
+        return result
+
+    def _vector_field_projection_T(self, vector, out=None):
+        dtype = np.result_type(vector, self.weight.dtype)
+        # Combine (u, v) to (x, y, z) for each image on the (small) 2D grids:
+        buffer = self._get_buffer('adjoint', (3, self.size_2d), dtype)
+        rp, hp = self._row_points, self.hook_points
+        for k in range(self.count):
+            buffer[:, rp[k]:rp[k + 1]] = self.coeff[k].T.dot(vector[hp[k]:hp[k + 1]].reshape(2, -1))
+        # Weight directly into (x, y, z) of the result with one product per component:
+        result = self._get_out(out, 3 * self.size_3d, dtype)
+        result_xyz = result.reshape(3, self.size_3d)
+        for i in range(3):
+            if np.any(self.coeff[:, :, i] != 0):
+                _csr_dot(self.weight_T, buffer[i], result_xyz[i])
+        return result
+
+    def get_info(self, verbose=False):
+        """Get specific information about the projector as a string.
+
+        Parameters
+        ----------
+        verbose: boolean, optional
+            If this is true, the text looks prettier (maybe using latex). Default is False for the
+            use in file names and such.
+
+        Returns
+        -------
+        info : string
+            Information about the projector as a string, e.g. for the use in plot titles.
+
+        """
+        if verbose:
+            return 'stack of {} projections'.format(self.count)
+        else:
+            return 'stack{}'.format(self.count)
+
+
+class ProjectorCache(object):
+    """Class for caching projectors, which are identified by their geometry.
+
+    Projectors are looked up by a key which is calculated from the projector class and all
+    arguments that define the geometry (e.g. `dim`, `rotation`, `tilt`, `camera_rotation`,
+    `center`, `subcount`, `R` and `dim_uv` for a :class:`~.RotTiltProjector`). Arguments which do
+    not change the result (`verbose`, `vectorized`, `chunk_size`) are ignored. Recently used
+    projectors are kept in memory. If a `path` is given, all projectors are additionally saved as
+    HDF5 files (see :func:`~.save_projector`) in this directory, so that they can be reused by
+    later sessions. Both stores are limited in size, the least recently used projectors are
+    evicted first.
+
+    Attributes
+    ----------
+    path : str or None, optional
+        Directory in which the projectors are saved. If None (default), projectors are only
+        cached in memory.
+    max_memory : int, optional
+        Maximal number of bytes of the weight matrices which are kept in memory. Default is 1 GiB.
+    max_disk : int, optional
+        Maximal number of bytes of the projector files in `path`. Default is 8 GiB.
+    hits : int
+        Number of projectors which were found in the cache (memory or disk).
+    misses : int
+        Number of projectors which had to be constructed.
+
+    """
+
+    _log = logging.getLogger(__name__ + '.ProjectorCache')
+
+    IGNORED_ARGS = ('self', 'verbose', 'vectorized', 'chunk_size')
+
+    def __init__(self, path=None, max_memory=2**30, max_disk=2**33):
+        self._log.debug('Calling __init__')
+        self.path = path
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.cache = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._log.debug('Created ' + str(self))
+
+    def __repr__(self):
+        self._log.debug('Calling __repr__')
+        return '%s(path=%r, max_memory=%r, max_disk=%r)' % \
+               (self.__class__, self.path, self.max_memory, self.max_disk)
+
+    def __str__(self):
+        self._log.debug('Calling __str__')
+        return 'ProjectorCache(path=%s, max_memory=%s, max_disk=%s)' % \
+               (self.path, self.max_memory, self.max_disk)
+
+    def __len__(self):
+        return len(self.cache)
+
+    @staticmethod
+    def _normalise(value):
+        if isinstance(value, (tuple, list, np.ndarray)):
+            return tuple(ProjectorCache._normalise(v) for v in value)
+        elif isinstance(value, Number) and not isinstance(value, bool):
+            return float(value)  # 0, 0.0 and np.float64(0) describe the same geometry!
+        return value
+
+    def get_key(self, projector_class, *args, **kwargs):
+        """Calculate the key which identifies a projector.
+
+        Parameters
+        ----------
+        projector_class: type
+            Subclass of :class:`~.Projector` which should be constructed.
+        *args, **kwargs:
+            Arguments which are passed to the constructor of `projector_class`.
+
+        Returns
+        -------
+        key : str
+            Hex digest which identifies the projector geometry.
+
+        """
+        self._log.debug('Calling get_key')
+        arguments = inspect.signature(projector_class.__init__).bind(None, *args, **kwargs)
+        arguments.apply_defaults()
+        geometry = sorted((name, self._normalise(value))
+                          for name, value in arguments.arguments.items()
+                          if name not in self.IGNORED_ARGS)
+        return hashlib.sha1(repr((projector_class.__name__, geometry)).encode()).hexdigest()
+
+    def get(self, projector_class, *args, **kwargs):
+        """Return a cached projector or construct (and cache) it if it is not available.
+
+        Parameters
+        ----------
+        projector_class: type
+            Subclass of :class:`~.Projector` which should be constructed.
+        *args, **kwargs:
+            Arguments which are passed to the constructor of `projector_class`.
+
+        Returns
+        -------
+        projector : :class:`~.Projector`
+            The requested projector. Projectors are shared and should not be modified!
+
+        """
+        self._log.debug('Calling get')
+        key = self.get_key(projector_class, *args, **kwargs)
+        projector = self._lookup(key)
+        if projector is None:
+            projector = projector_class(*args, **kwargs)
+            self._store(key, projector)
+        return projector
+
+    def clear(self, disk=False):
+        """Clear the cache.
+
+        Parameters
+        ----------
+        disk: bool, optional
+            If True, the projector files in `path` are deleted, too. Default is False.
+
+        Returns
+        -------
+        None
+
+        """
+        self._log.debug('Calling clear')
+        self.cache = OrderedDict()
+        self.memory = 0
+        if disk:
+            for filename, _, _ in self._get_files():
+                os.remove(filename)
+
+    def _lookup(self, key):
+        from .file_io.io_projector import load_projector
+        # Look in memory:
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        # Look on disk:
+        filename = self._get_filename(key)
+        if filename is not None and os.path.isfile(filename):
+            projector = load_projector(filename)
+            os.utime(filename)  # Mark as recently used!
+            self.hits += 1
+            self._add(key, projector)
+            return projector
+        return None
+
+    def _store(self, key, projector):
+        # Save newly constructed projectors to disk and memory:
+        self.misses += 1
+        filename = self._get_filename(key)
+        if filename is not None:
+            projector.save(filename)
+            self._evict_disk()
+        self._add(key, projector)
+
+    def _get_filename(self, key):
+        if self.path is None:
+            return None
+        return os.path.join(self.path, 'projector_{}.hdf5'.format(key))
+
+    def _get_files(self):
+        if self.path is None:
+            return []
+        files = []
+        for f in os.listdir(self.path):
+            if f.startswith('projector_') and f.endswith('.hdf5'):
+                filename = os.path.join(self.path, f)
+                stat = os.stat(filename)
+                files.append((filename, stat.st_mtime, stat.st_size))
+        return sorted(files, key=lambda x: x[1])  # least recently used first!
+
+    @staticmethod
+    def _get_nbytes(projector):
+        weight = projector.__dict__.get('_weight')  # Don't assemble matrices of lazy projectors!
+        if weight is None:
+            return 0
+        return weight.data.nbytes + weight.indices.nbytes + weight.indptr.nbytes
+
+    def _add(self, key, projector):
+        self.cache[key] = projector
+        self.memory += self._get_nbytes(projector)
+        while self.memory > self.max_memory and self.cache:  # Evict least recently used:
+            _, evicted = self.cache.popitem(last=False)
+            self.memory -= self._get_nbytes(evicted)
+
+    def _evict_disk(self):
+        files = self._get_files()
+        total = sum(size for _, _, size in files)
+        for filename, _, size in files:  # Least recently used first!
+            if total <= self.max_disk:
+                break
+            os.remove(filename)
+            total -= size
+
+
+def _construct_projector(projector_class, args, kwargs):
+    # Module level function, so that it can be sent to worker processes. The constructed projector
+    # is pickled without cached data (see `Projector.__getstate__`), only the CSR arrays are sent.
+    return projector_class(*args, **kwargs)
+
+
+def make_projectors(projector_class, args_list, kwargs_list=None, n_jobs=1, executor=None,
+                    projector_cache=None, verbose=False):
+    """Construct a list of projectors (e.g. for a tilt series), optionally in parallel.
+
+    Parameters
+    ----------
+    projector_class: type
+        Subclass of :class:`~.Projector` which should be constructed.
+    args_list: list of tuple
+        Positional arguments for the constructor, one tuple per projector.
+    kwargs_list: list of dict, optional
+        Keyword arguments for the constructor, one dictionary per projector. Default is None (no
+        keyword arguments).
+    n_jobs: int, optional
+        Number of processes which construct the projectors. Default is 1 (no parallelisation).
+        Negative numbers are counted from the number of cores (-1 or None uses all cores, -2 all
+        but one and so on, but at least one process), 0 raises a :class:`ValueError`. Ignored if
+        an `executor` is given.
+    executor: :class:`~concurrent.futures.Executor`, optional
+        Executor to which the construction is submitted (it is not shut down afterwards). Default
+        is None, in which case a :class:`~concurrent.futures.ProcessPoolExecutor` with `n_jobs`
+        processes is used if `n_jobs` is not 1.
+    projector_cache: :class:`~.ProjectorCache`, optional
+        If given, projectors are looked up in the cache first and only the missing ones are
+        constructed (and then added to the cache).
+    verbose: bool, optional
+        If True, a progress bar is shown. Default is False.
+
+    Returns
+    -------
+    projectors : list of :class:`~.Projector`
+        The constructed projectors, in the same order as `args_list`.
+
+    """
+    _log.debug('Calling make_projectors')
+    if n_jobs is None:
+        n_jobs = -1
+    if n_jobs == 0:  # Checked up front, ProcessPoolExecutor would only fail for several projectors
+        raise ValueError('n_jobs has to be positive or negative (counted from the cores)!')
+    if n_jobs < 0:  # -1 uses all cores, -2 all but one... (like the `nprocs` of WorkerPool)
+        n_jobs = max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    if kwargs_list is None:
+        kwargs_list = [{}] * len(args_list)
+    assert len(args_list) == len(kwargs_list), 'Need one set of arguments per projector!'
+    projectors = [None] * len(args_list)
+    # Look up cached projectors first:
+    keys = [None] * len(args_list)
+    if projector_cache is not None:
+        for i, (args, kwargs) in enumerate(zip(args_list, kwargs_list)):
+            keys[i] = projector_cache.get_key(projector_class, *args, **kwargs)
+            projectors[i] = projector_cache._lookup(keys[i])
+    missing = [i for i, projector in enumerate(projectors) if projector is None]
+    # Construct missing projectors:
+    disable = not verbose
+    own_executor = executor is None and n_jobs != 1 and len(missing) > 1
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+    if executor is not None:
+        try:
+            futures = {executor.submit(_construct_projector, projector_class,
+                                       args_list[i], kwargs_list[i]): i for i in missing}
+            for future in tqdm(as_completed(futures), total=len(futures), disable=disable,
+                               desc='Set up projectors'):
+                projectors[futures[future]] = future.result()
+        finally:
+            if own_executor:
+                executor.shutdown()
+    else:
+        for i in tqdm(missing, disable=disable, desc='Set up projectors'):
+            projectors[i] = _construct_projector(projector_class, args_list[i], kwargs_list[i])
+    # Add newly constructed projectors to the cache:
+    if projector_cache is not None:
+        for i in missing:
+            projector_cache._store(keys[i], projectors[i])
+    return projectors
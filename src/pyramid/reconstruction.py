@@ -17,8 +17,10 @@ import logging
 import numpy as np
 
 from pyramid.fielddata import VectorData, ScalarData
+from pyramid.forwardmodel import ForwardModelMagMIP
 
-__all__ = ['optimize_linear', 'optimize_linear_charge', 'optimize_nonlin', 'optimize_splitbregman']
+__all__ = ['optimize_linear', 'optimize_linear_mag_mip', 'optimize_linear_charge',
+           'optimize_nonlin', 'optimize_splitbregman']
 _log = logging.getLogger(__name__)
 
 
@@ -53,6 +55,8 @@ def optimize_linear(costfunction, mag_0=None, ramp_0=None, max_iter=None, verbos
     import jutil.cg as jcg
     from jutil.taketime import TakeTime
     _log.debug('Calling optimize_linear')
+    if isinstance(costfunction.fwd_model, ForwardModelMagMIP):  # Also has a scalar field!
+        raise TypeError('Use optimize_linear_mag_mip() for a ForwardModelMagMIP!')
     data_set = costfunction.fwd_model.data_set
     # Get starting distribution vector x_0:
     x_0 = np.empty(costfunction.n)
@@ -77,6 +81,76 @@ def optimize_linear(costfunction, mag_0=None, ramp_0=None, max_iter=None, verbos
     return mag_opt
 
 
+def optimize_linear_mag_mip(costfunction, mag_0=None, elec_0=None, ramp_0=None, max_iter=None,
+                            verbose=False, abs_tol=1e-20, rel_tol=1e-20):
+    """Reconstruct a three-dimensional magnetic distribution together with a scalar field (e.g.
+    the mean inner potential contribution) from given phase maps via the conjugate gradient
+    optimization method, like :func:`~.optimize_linear`.
+
+    Parameters
+    ----------
+    costfunction : :class:`~.Costfunction`
+        A :class:`~.Costfunction` object which implements a :class:`~.ForwardModelMagMIP` and a
+        regularisator which is minimized in the optimization process.
+    mag_0: :class:`~.VectorData`
+        The starting magnetisation distribution used for the reconstruction. A zero vector will be
+        used if no VectorData object is specified.
+    elec_0: :class:`~.ScalarData`
+        The starting scalar field used for the reconstruction. A zero vector will be used if no
+        ScalarData object is specified.
+    ramp_0: :class:`~.Ramp`
+        The starting ramp for the reconstruction. A zero vector will be
+        used if no Ramp object is specified.
+    max_iter : int, optional
+        The maximum number of iterations for the optimization.
+    verbose: bool, optional
+        If set to True, information like a progressbar is displayed during reconstruction.
+        The default is False.
+
+    Returns
+    -------
+    magdata : :class:`~pyramid.fielddata.VectorData`
+        The reconstructed magnetic distribution as a :class:`~.VectorData` object.
+    elecdata : :class:`~pyramid.fielddata.ScalarData`
+        The reconstructed scalar field as a :class:`~.ScalarData` object.
+
+    """
+    import jutil.cg as jcg
+    from jutil.taketime import TakeTime
+    _log.debug('Calling optimize_linear_mag_mip')
+    fwd_model = costfunction.fwd_model
+    data_set = fwd_model.data_set
+    n_mag = data_set.n  # The scalar field (one value per voxel) follows the magnetization
+    n_field = n_mag + n_mag // 3
+    # Get starting distribution vector x_0:
+    x_0 = np.empty(costfunction.n)
+    if mag_0 is not None:
+        fwd_model.magdata = mag_0
+    if elec_0 is not None:
+        fwd_model.elecdata = elec_0
+    x_0[:n_mag] = fwd_model.magdata.get_vector(mask=data_set.mask)
+    x_0[n_mag:n_field] = fwd_model.elecdata.get_vector(mask=data_set.mask)
+    if ramp_0 is not None:
+        ramp_vec = ramp_0.param_cache.ravel()
+    else:
+        ramp_vec = np.zeros_like(fwd_model.ramp.n)
+    x_0[n_field:] = ramp_vec
+    _log.info('Cost before optimization: {:.3e}'.format(costfunction(x_0)))
+    # Minimize:
+    with TakeTime('reconstruction time'):
+        x_opt = jcg.conj_grad_minimize(costfunction, x_0=x_0, max_iter=max_iter, verbose=verbose,
+                                       abs_tol=abs_tol, rel_tol=rel_tol).x
+    _log.info('Cost after optimization: {:.3e}'.format(costfunction(x_opt)))
+    # Cut ramp parameters if necessary (this also saves the final parameters in the ramp class!):
+    x_opt = fwd_model.ramp.extract_ramp_params(x_opt)
+    # Create and return fitting VectorData and ScalarData objects:
+    mag_opt = VectorData(data_set.a, np.zeros((3,) + data_set.dim))
+    mag_opt.set_vector(x_opt[:n_mag], data_set.mask)
+    elec_opt = ScalarData(data_set.a, np.zeros(data_set.dim))
+    elec_opt.set_vector(x_opt[n_mag:], data_set.mask)
+    return mag_opt, elec_opt
+
+
 def optimize_linear_charge(costfunction, charge_0=None, ramp_0=None, max_iter=None, verbose=False):
     """Reconstruct a three-dimensional charge distribution from given phase maps via the
     conjugate gradient optimization method :func:`~.scipy.sparse.linalg.cg`.
@@ -16,7 +16,7 @@ from ..regularisator import FirstOrderRegularisator, NoneRegularisator, ZeroOrde
 from ..forwardmodel import ForwardModel, DistributedForwardModel, ForwardModelCharge
 from ..costfunction import Costfunction
 from ..phasemapper import PhaseMapperRDFC, PhaseMapperFDFC, PhaseMapperCharge
-from ..kernel import Kernel, KernelCharge
+from ..kernel import KernelCharge, get_kernel
 
 
 __all__ = ['pm', 'reconstruction_2d_from_phasemap', 'reconstruction_2d_charge_from_phasemap',
@@ -76,7 +76,7 @@ def pm(fielddata, mode='z', b_0=1, electrode_vec=(1E6, 1E6), prw_vec=None, mappe
     field_proj = projector(fielddata)
     # Set up phasemapper and map phase:
     if mapper == 'RDFC':
-        phasemapper = PhaseMapperRDFC(Kernel(fielddata.a, projector.dim_uv, b_0=b_0))
+        phasemapper = PhaseMapperRDFC(get_kernel(fielddata.a, projector.dim_uv, b_0=b_0))
     elif mapper == 'FDFC':
         phasemapper = PhaseMapperFDFC(fielddata.a, projector.dim_uv, b_0=b_0, padding=padding)
         # Set up phasemapper and map phase:
@@ -357,7 +357,7 @@ def reconstruction_3d_from_magdata(magdata, b_0=1, lam=1E-3, max_iter=100, ramp_
     # Add pairs of projectors and according phasemaps to the DataSet:
     for projector in projectors:
         mag_proj = projector(magdata)
-        phasemap = PhaseMapperRDFC(Kernel(magdata.a, projector.dim_uv, b_0))(mag_proj)
+        phasemap = PhaseMapperRDFC(get_kernel(magdata.a, projector.dim_uv, b_0))(mag_proj)
         phasemap.mask = mag_proj.get_mask()[0, ...]
         data.append(phasemap, projector)
     # Add offset and ramp if necessary:
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Testcase for the fft module."""
+
+import threading
+import unittest
+
+import numpy as np
+
+from pyramid.fft import FFTWCache
+
+
+class _Plan(object):
+    # Minimal stand-in for a pyfftw.FFTW object (only the array getters are used by the cache):
+    def __init__(self, shape):
+        self.input_array = np.zeros(shape, dtype=np.float32)
+        self.output_array = np.zeros(shape[:-1] + (shape[-1] // 2 + 1,), dtype=np.complex64)
+
+    def get_input_array(self):
+        return self.input_array
+
+    def get_output_array(self):
+        return self.output_array
+
+
+class TestCaseFFTWCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = FFTWCache(max_plans=2)
+
+    def tearDown(self):
+        self.cache = None
+
+    def test_lookup(self):
+        plan = _Plan((4, 4))
+        self.assertIsNone(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1))
+        self.cache.add_fftw('rfftn', plan, None, None, 1)
+        self.assertIs(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1), plan)
+        self.assertIsNone(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 2))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        self.assertEqual(self.cache.nbytes, 4 * 16 + 8 * 12)
+
+    def test_eviction(self):
+        plans = [_Plan((4, 4)), _Plan((8, 8)), _Plan((16, 16))]
+        self.cache.add_fftw('rfftn', plans[0], None, None, 1)
+        self.cache.add_fftw('rfftn', plans[1], None, None, 1)
+        self.cache.lookup_fftw('rfftn', plans[0].input_array, None, None, 1)  # 0 is used last
+        self.cache.add_fftw('rfftn', plans[2], None, None, 1)
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertIsNone(self.cache.lookup_fftw('rfftn', plans[1].input_array, None, None, 1))
+        self.assertIs(self.cache.lookup_fftw('rfftn', plans[0].input_array, None, None, 1),
+                      plans[0])
+        self.cache.max_memory = 0  # Only the newest plan is kept:
+        self.cache.add_fftw('rfftn', plans[1], None, None, 1)
+        self.assertEqual(len(self.cache.cache), 1)
+        self.assertEqual(self.cache.nbytes, 4 * 64 + 8 * 40)
+
+    def test_inplace(self):
+        plan = _Plan((4, 4))
+        self.cache.add_fftw('rfftn', plan, None, None, 1, inplace=True)
+        self.assertIsNone(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1),
+                          msg='Plans on preallocated arrays need the output array!')
+        self.assertIsNone(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1,
+                                                 plan.output_array.copy()),
+                          msg='Plans on preallocated arrays must not be used for other arrays!')
+        self.assertIs(self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1,
+                                             plan.output_array), plan)
+
+    def test_threads(self):
+        plan = _Plan((4, 4))
+        self.cache.add_fftw('rfftn', plan, None, None, 1)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(
+            self.cache.lookup_fftw('rfftn', plan.input_array, None, None, 1)))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [None], msg='Plans must not be shared between threads!')
@@ -1,14 +1,24 @@
 # -*- coding: utf-8 -*-
 """Testcase for the forwardmodel module"""
+import multiprocessing as mp
 import os
 import unittest
+from unittest import mock
 
 import numpy as np
 from numpy.testing import assert_allclose
+from scipy import sparse
 
+from pyramid import fft
+from pyramid.costfunction import Costfunction
 from pyramid.dataset import DataSet, DataSetCharge
-from pyramid.forwardmodel import ForwardModel, ForwardModelCharge
+from pyramid.forwardmodel import (ForwardModel, ForwardModelMagMIP, ForwardModelCharge,
+                                  DistributedForwardModel, ThreadedForwardModel, WorkerPool,
+                                  _split_images, _thread_local_copy)
+from pyramid.phasemap import PhaseMap
+from pyramid.phasemapper import PhaseMapperMIP, PhaseMapperRDFC
 from pyramid.projector import SimpleProjector
+from pyramid.reconstruction import optimize_linear, optimize_linear_mag_mip
 from pyramid import load_phasemap
 
 
@@ -67,6 +77,267 @@ class TestCaseForwardModel(unittest.TestCase):
         assert_allclose(jac_T, jac_T_ref, atol=1E-7,
                         err_msg='Unexpected behaviour in the transposed jacobi matrix!')
 
+    def test_compressed(self):
+        fwd_model = ForwardModel(self.data, ramp_order=1, compressed=True)
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        n, m = fwd_model.n, fwd_model.m
+        self.assertEqual(fwd_model.projectors[0].size_3d, self.mask.sum())
+        vector = np.random.rand(n)
+        assert_allclose(fwd_model(vector), fwd_model_ref(vector), atol=1E-7, rtol=1E-6,
+                        err_msg='Unexpected behaviour in compressed __call__()!')
+        assert_allclose(fwd_model.jac_dot(None, vector), fwd_model_ref.jac_dot(None, vector),
+                        atol=1E-7, rtol=1E-6,
+                        err_msg='Unexpected behaviour in compressed jac_dot()!')
+        vector = np.random.rand(m)
+        assert_allclose(fwd_model.jac_T_dot(None, vector), fwd_model_ref.jac_T_dot(None, vector),
+                        atol=1E-7, rtol=1E-6,
+                        err_msg='Unexpected behaviour in compressed jac_T_dot()!')
+
+    def test_stacked(self):
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        for compressed in (False, True):
+            fwd_model = ForwardModel(self.data, ramp_order=1, compressed=compressed, stacked=True)
+            n, m = fwd_model.n, fwd_model.m
+            vector = np.random.rand(n)
+            assert_allclose(fwd_model(vector), fwd_model_ref(vector), atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in stacked __call__()!')
+            assert_allclose(fwd_model.jac_dot(None, vector), fwd_model_ref.jac_dot(None, vector),
+                            atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in stacked jac_dot()!')
+            vector = np.random.rand(m)
+            assert_allclose(fwd_model.jac_T_dot(None, vector),
+                            fwd_model_ref.jac_T_dot(None, vector), atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in stacked jac_T_dot()!')
+
+    def test_batched(self):
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        for stacked in (False, True):
+            fwd_model = ForwardModel(self.data, ramp_order=1, stacked=stacked, batched=True)
+            self.assertEqual([images for _, images in fwd_model.batches], [[0, 1]],
+                             msg='Images sharing a kernel should be mapped in one batch!')
+            n, m = fwd_model.n, fwd_model.m
+            vector = np.random.rand(n)
+            assert_allclose(fwd_model.jac_dot(None, vector), fwd_model_ref.jac_dot(None, vector),
+                            atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in batched jac_dot()!')
+            vector = np.random.rand(m)
+            assert_allclose(fwd_model.jac_T_dot(None, vector),
+                            fwd_model_ref.jac_T_dot(None, vector), atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in batched jac_T_dot()!')
+
+    def test_batch_size(self):
+        for _ in range(3):
+            self.data.append(self.phasemap, self.projector)
+        pixels = int(np.prod(self.data.phasemappers[0].kernel.dim_pad))
+        with mock.patch.object(ForwardModel, 'BATCH_PIXELS', 2 * pixels):
+            fwd_model = ForwardModel(self.data, batched=True)
+        self.assertEqual([images for _, images in fwd_model.batches], [[0, 1], [2, 3], [4]],
+                         msg='Batches should be limited to BATCH_PIXELS padded pixels!')
+
+    def test_distributed(self):
+        self.data.append(self.phasemap, self.projector)  # Uneven number of images per process
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        n, m = fwd_model_ref.n, fwd_model_ref.m
+        vector, vector_T = np.random.rand(n), np.random.rand(m)
+        for shared, dynamic in ((False, False), (True, False), (False, True), (True, True)):
+            fwd_model = DistributedForwardModel(self.data, ramp_order=1, nprocs=2, shared=shared,
+                                                dynamic=dynamic)
+            try:
+                assert_allclose(fwd_model(vector), fwd_model_ref(vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in distributed __call__()!')
+                assert_allclose(fwd_model.jac_dot(None, vector),
+                                fwd_model_ref.jac_dot(None, vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in distributed jac_dot()!')
+                for _ in range(2):  # Shared memory slots are reused!
+                    assert_allclose(fwd_model.jac_T_dot(None, vector_T),
+                                    fwd_model_ref.jac_T_dot(None, vector_T), atol=1E-7,
+                                    rtol=1E-6,
+                                    err_msg='Unexpected behaviour in distributed jac_T_dot()!')
+            finally:
+                fwd_model.finalize()
+
+    def test_worker_pool(self):
+        with WorkerPool(self.data, nprocs=2) as pool:
+            self.assertEqual(pool.fft_workers, max(1, fft.NTHREADS // 2),
+                             msg='The FFT threads should be divided among the processes!')
+            self.assertEqual(pool.start_method, mp.get_start_method(),
+                             msg='The default start method of the platform should be used!')
+            for ramp_order in (None, 1):  # Several forward models share the running processes:
+                fwd_model_ref = ForwardModel(self.data, ramp_order=ramp_order)
+                fwd_model = DistributedForwardModel(self.data, ramp_order=ramp_order, pool=pool)
+                n, m = fwd_model.n, fwd_model.m
+                vector, vector_T = np.random.rand(n), np.random.rand(m)
+                assert_allclose(fwd_model.jac_dot(None, vector),
+                                fwd_model_ref.jac_dot(None, vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in jac_dot() with a pool!')
+                assert_allclose(fwd_model.jac_T_dot(None, vector_T),
+                                fwd_model_ref.jac_T_dot(None, vector_T), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in jac_T_dot() with a pool!')
+                fwd_model.finalize()
+                self.assertFalse(pool.closed, msg='finalize() should not close a given pool!')
+        self.assertTrue(pool.closed, msg='The pool should be closed after the with block!')
+        self.assertFalse(any(p.is_alive() for p in pool.processes),
+                         msg='The processes of the pool should have joined!')
+
+    def test_start_method(self):
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        for start_method in set(mp.get_all_start_methods()) & {'fork', 'spawn'}:
+            # Shared memory and the dynamic chunk counter have to reach the processes, too:
+            fwd_model = DistributedForwardModel(self.data, ramp_order=1, nprocs=2, shared=True,
+                                                dynamic=True, start_method=start_method)
+            try:
+                self.assertEqual(fwd_model.start_method, start_method)
+                n, m = fwd_model.n, fwd_model.m
+                vector, vector_T = np.random.rand(n), np.random.rand(m)
+                assert_allclose(fwd_model.jac_dot(None, vector),
+                                fwd_model_ref.jac_dot(None, vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in jac_dot() with '
+                                        '{}!'.format(start_method))
+                assert_allclose(fwd_model.jac_T_dot(None, vector_T),
+                                fwd_model_ref.jac_T_dot(None, vector_T), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in jac_T_dot() with '
+                                        '{}!'.format(start_method))
+            finally:
+                fwd_model.finalize()
+        with self.assertRaises(ValueError):
+            WorkerPool(self.data, nprocs=1, start_method='teleport')
+
+    def test_nprocs(self):
+        fwd_model = ThreadedForwardModel(self.data, nthreads=-1)
+        try:
+            self.assertEqual(fwd_model.nthreads, min(os.cpu_count(), self.data.count),
+                             msg='-1 should use all cpus (but not more threads than images)!')
+        finally:
+            fwd_model.finalize()
+        with self.assertRaises(ValueError):
+            WorkerPool(self.data, nprocs=0)
+        with self.assertRaises(ValueError):
+            ThreadedForwardModel(self.data, nthreads=0)
+
+    def test_split_images(self):
+        self.assertEqual(_split_images([1, 2, 3, 4, 5, 6, 7, 8, 9], 3), [(0, 5), (5, 7), (7, 9)],
+                         msg='Images are not split with the smallest maximum cost!')
+        self.assertEqual(_split_images([1, 1, 10], 3), [(0, 1), (1, 2), (2, 3)],
+                         msg='Every part should get at least one image!')
+        fwd_model = DistributedForwardModel(self.data, nprocs=-1)
+        fwd_model.finalize()
+        self.assertEqual(fwd_model.nprocs, 1, msg='At least one process should be created!')
+
+    def test_threaded(self):
+        self.data.append(self.phasemap, self.projector)  # Uneven number of images per thread
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        n, m = fwd_model_ref.n, fwd_model_ref.m
+        vector, vector_T = np.random.rand(n), np.random.rand(m)
+        for stacked, batched in ((False, False), (True, False), (False, True)):
+            fwd_model = ThreadedForwardModel(self.data, ramp_order=1, nthreads=2, stacked=stacked,
+                                             batched=batched)
+            try:
+                self.assertIsNot(fwd_model.sub_fwd_models[0].phasemappers[0],
+                                 fwd_model.sub_fwd_models[1].phasemappers[0],
+                                 msg='Threads should not share phasemappers (scratch buffers)!')
+                mapper, mapper_ref = fwd_model.sub_fwd_models[0].phasemappers[0], \
+                    self.data.phasemappers[0]
+                self.assertIsNot(mapper.u_mag, mapper_ref.u_mag,
+                                 msg='Threads should not share scratch arrays!')
+                self.assertIs(mapper.kernel.u_fft, mapper_ref.kernel.u_fft,
+                              msg='Threads should share the read-only kernel spectra!')
+                self.assertEqual(mapper.workers, max(1, fft.NTHREADS // 2),
+                                 msg='The FFT threads should be divided among the threads!')
+                assert_allclose(fwd_model(vector), fwd_model_ref(vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in threaded __call__()!')
+                assert_allclose(fwd_model.jac_dot(None, vector),
+                                fwd_model_ref.jac_dot(None, vector), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in threaded jac_dot()!')
+                assert_allclose(fwd_model.jac_T_dot(None, vector_T),
+                                fwd_model_ref.jac_T_dot(None, vector_T), atol=1E-7, rtol=1E-6,
+                                err_msg='Unexpected behaviour in threaded jac_T_dot()!')
+            finally:
+                fwd_model.finalize()
+
+    def test_thread_local_copy(self):
+        mapper = PhaseMapperRDFC(self.data.phasemappers[0].kernel, buffered=True)
+        mapper_copy = _thread_local_copy(mapper, {})
+        for name in ('u_mag', 'phase_fft', 'mag_adj'):
+            self.assertIsNot(getattr(mapper_copy, name), getattr(mapper, name),
+                             msg='Scratch array {} should be copied!'.format(name))
+        for name in ('u_fft_conj', 'v_fft_conj'):
+            self.assertIs(getattr(mapper_copy, name), getattr(mapper, name),
+                          msg='Read-only spectrum {} should be shared!'.format(name))
+
+    def test_normal_dot(self):
+        self.data.append(self.phasemap, self.projector)  # Uneven number of images per process
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        n, m = fwd_model_ref.n, fwd_model_ref.m
+        Se_inv = sparse.diags(np.random.rand(m)).tocsr()  # Block diagonal for all image splits
+        Se_inv_coupled = Se_inv + sparse.csr_matrix(([1.], ([0], [m - 1])), shape=(m, m))
+        vector = np.random.rand(n)
+        fwd_models = [ThreadedForwardModel(self.data, ramp_order=1, nthreads=2)]
+        for shared, dynamic in ((False, False), (True, True)):
+            fwd_models.append(DistributedForwardModel(self.data, ramp_order=1, nprocs=2,
+                                                      shared=shared, dynamic=dynamic))
+        try:
+            for fwd_model in fwd_models:
+                for matrix in (Se_inv, Se_inv_coupled):  # Coupled images use separate products!
+                    fwd_model.Se_inv = matrix
+                    result_ref = fwd_model_ref.jac_T_dot(
+                        None, matrix.dot(fwd_model_ref.jac_dot(None, vector)))
+                    for _ in range(2):  # Loaded blocks and shared memory slots are reused!
+                        # Single precision noise of the chained products scales with the
+                        # largest entries (small entries are sums of cancelling terms):
+                        assert_allclose(fwd_model.normal_dot(None, vector), result_ref,
+                                        atol=1E-7 * np.abs(result_ref).max(), rtol=1E-6,
+                                        err_msg='Unexpected behaviour in normal_dot()!')
+        finally:
+            for fwd_model in fwd_models:
+                fwd_model.finalize()
+
+    def test_mag_mip(self):
+        fwd_model_ref = ForwardModel(self.data, ramp_order=1)
+        mip_mapper = PhaseMapperMIP(self.a, self.phasemap.dim_uv, v_0=2)
+        count = self.mask.sum()
+        vector_mag, vector_mip = np.random.rand(3 * count), np.random.rand(count)
+        ramp_params = np.random.rand(fwd_model_ref.ramp.n)
+        elec_vec = np.zeros(self.dim)
+        elec_vec[self.mask] = vector_mip
+        phase_mip = mip_mapper.jac_dot(self.projector.jac_dot(elec_vec.ravel()))
+        result_ref = fwd_model_ref(np.concatenate((vector_mag, ramp_params)))
+        result_ref += np.tile(phase_mip, self.data.count)
+        vector = np.concatenate((vector_mag, vector_mip, ramp_params))
+        for compressed in (False, True):
+            fwd_model = ForwardModelMagMIP(self.data, ramp_order=1, v_0=2, compressed=compressed)
+            n, m = fwd_model.n, fwd_model.m
+            self.assertEqual(n, 4 * count + fwd_model.ramp.n)
+            assert_allclose(fwd_model(vector), result_ref, atol=1E-7, rtol=1E-6,
+                            err_msg='Unexpected behaviour in combined __call__()!')
+            vector_T = np.random.rand(m)
+            assert_allclose(fwd_model.jac_T_dot(None, vector_T).dot(vector),
+                            fwd_model.jac_dot(None, vector).dot(vector_T), rtol=1E-6,
+                            err_msg='Unexpected behaviour in combined jac_T_dot()!')
+
+
+    def test_mag_mip_reconstruction(self):
+        data = DataSet(self.a, self.dim, mask=self.mask)
+        for axis in ('z', 'y', 'x'):
+            projector = SimpleProjector(self.dim, axis=axis)
+            data.append(PhaseMap(self.a, np.zeros(projector.dim_uv)), projector)
+        fwd_model = ForwardModelMagMIP(data, ramp_order=0, v_0=2)
+        vector = np.random.RandomState(42).rand(fwd_model.n)
+        phase_vec = fwd_model(vector)
+        hp = data.hook_points
+        for i, phasemap in enumerate(data.phasemaps):  # Simulated measurements:
+            phasemap.phase = phase_vec[hp[i]:hp[i + 1]].reshape(phasemap.dim_uv)
+        fwd_model = ForwardModelMagMIP(data, ramp_order=0, v_0=2)
+        with self.assertRaises(TypeError):  # Would ignore the scalar field!
+            optimize_linear(Costfunction(fwd_model))
+        magdata, elecdata = optimize_linear_mag_mip(Costfunction(fwd_model), max_iter=200)
+        self.assertEqual(magdata.dim, self.dim)
+        self.assertEqual(elecdata.dim, self.dim)
+        vector_rec = np.concatenate((magdata.get_vector(self.mask), elecdata.get_vector(self.mask),
+                                     fwd_model.ramp.param_cache.ravel()))
+        assert_allclose(fwd_model(vector_rec), phase_vec, atol=1E-3,
+                        err_msg='Reconstruction does not reproduce the phase maps!')
+        self.assertGreater(np.abs(elecdata.field).max(), 0,
+                           msg='The scalar field should be reconstructed, too!')
 
 class TestCaseForwardModelCharge(unittest.TestCase):
     def setUp(self):
@@ -2,12 +2,17 @@
 """Testcase for the magdata module."""
 
 import os
+import pickle
+import tempfile
 import unittest
 
 import numpy as np
 from numpy.testing import assert_allclose
 
-from pyramid.kernel import Kernel, KernelCharge
+from pyramid import fft
+from pyramid.fielddata import VectorData
+from pyramid.kernel import Kernel, KernelCharge, KernelCache, lean_pickling
+from pyramid.phasemapper import PhaseMapperRDFC
 
 
 class TestCaseKernel(unittest.TestCase):
@@ -31,6 +36,70 @@ class TestCaseKernel(unittest.TestCase):
         assert_allclose(self.kernel.v_fft, ref_v_fft, atol=1E-7,
                         err_msg='Unexpected behavior in v_fft')
 
+    def test_lean(self):
+        kernel = Kernel(1., dim_uv=(4, 4), b_0=1., geometry='disc', lean=True)
+        self.assertEqual(kernel.arrays, ('u_fft', 'v_fft'))
+        self.assertEqual(kernel.u_fft.dtype, np.complex64)
+        assert_allclose(kernel.u_fft, self.kernel.u_fft, atol=1E-7,
+                        err_msg='Unexpected behavior in lean u_fft')
+        assert_allclose(kernel.v_fft, self.kernel.v_fft, atol=1E-7,
+                        err_msg='Unexpected behavior in lean v_fft')
+        assert_allclose(kernel.u, self.kernel.u, err_msg='Unexpected behavior in lean u')
+        assert_allclose(kernel.v, self.kernel.v, err_msg='Unexpected behavior in lean v')
+        u = kernel.u
+        self.assertIs(kernel.u, u, msg='Referenced lean u should not be regenerated!')
+        self.assertFalse(u.flags.writeable, msg='Shared lean u should be read-only!')
+        self.assertEqual(pickle.loads(pickle.dumps(kernel)).arrays, ('u_fft', 'v_fft'))
+        kernel_copy = pickle.loads(pickle.dumps(self.kernel))
+        self.assertFalse(kernel_copy.lean, msg='All arrays should be pickled by default!')
+        self.assertEqual(kernel_copy.arrays, Kernel.SHARED_ARRAYS)
+        with lean_pickling():
+            kernel_copy = pickle.loads(pickle.dumps(self.kernel))
+        self.assertTrue(kernel_copy.lean, msg='Only the spectra should be pickled!')
+        self.assertEqual(kernel_copy.nbytes, self.kernel.u_fft.nbytes + self.kernel.v_fft.nbytes)
+        assert_allclose(kernel_copy.u, self.kernel.u, err_msg='Unexpected behavior in pickled u')
+
+    def test_legacy_pickle(self):
+        # Kernels pickled by older versions have no `lean` and `dtype` attributes:
+        def old_state(names):
+            state = {key: value for key, value in self.kernel.__dict__.items()
+                     if key not in ('lean', 'dtype', '_shared', '_regenerated') + names}
+            state['u_fft'] = state['u_fft'].astype(np.complex128)  # Old spectra were double
+            state['v_fft'] = state['v_fft'].astype(np.complex128)
+            return state
+
+        kernel = Kernel.__new__(Kernel)
+        kernel.__setstate__(old_state(()))
+        self.assertFalse(kernel.lean)
+        self.assertEqual(kernel.dtype, self.kernel.u.dtype)
+        self.assertEqual(str(kernel), str(self.kernel))
+        kernel = Kernel.__new__(Kernel)
+        kernel.__setstate__(old_state(('u', 'v')))
+        self.assertTrue(kernel.lean)
+        self.assertEqual(kernel.dtype, np.float64)
+        mapper = PhaseMapperRDFC(kernel)
+        assert_allclose(mapper.jac_dot(np.ones(mapper.n)),
+                        PhaseMapperRDFC(self.kernel).jac_dot(np.ones(mapper.n)), atol=1E-7,
+                        err_msg='Unexpected behavior of an old pickled kernel!')
+
+    def test_padding(self):
+        self.assertEqual(fft.get_padded_shape((300, 33)), (600, 72))
+        self.assertEqual(fft.get_padded_shape((300, 33), 'pow2'), (1024, 128))
+        self.assertEqual(fft.get_padded_shape((300, 33), 'double'), (600, 66))
+        dim_pad = fft.get_padded_shape((13, 7), 'autotune')
+        self.assertTrue(all(p >= 2 * d - 1 and p % 2 == 0 for p, d in zip(dim_pad, (13, 7))))
+        self.assertEqual(fft.get_padded_shape((13, 7), 'autotune'), dim_pad)
+        magdata = VectorData(1., np.random.RandomState(0).rand(3, 1, 13, 7))
+        phasemaps = []
+        for padding in ('fast', 'pow2'):
+            fft.configure_padding(padding)
+            try:
+                phasemaps.append(PhaseMapperRDFC(Kernel(1., (13, 7)))(magdata).phase)
+            finally:
+                fft.configure_padding('fast')
+        assert_allclose(phasemaps[0], phasemaps[1], atol=1E-7,
+                        err_msg='Unexpected behavior in padding')
+
 
 class TestCaseKernelCharge(unittest.TestCase):
     def setUp(self):
@@ -47,3 +116,65 @@ class TestCaseKernelCharge(unittest.TestCase):
         assert_allclose(self.kernel.kc, ref_kc, err_msg='Unexpected behavior in kc')
         assert_allclose(self.kernel.kc_fft, ref_kc_fft, atol=1E-7,
                         err_msg='Unexpected behavior in kc_fft')
+
+
+class TestCaseKernelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = KernelCache(path=self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        self.tmpdir = None
+        self.cache = None
+
+    def test_get(self):
+        kernel = self.cache.get(1., (4, 4))
+        self.assertIs(self.cache.get(1, [4, 4], b_0=1), kernel, msg='Kernel should be reused!')
+        self.assertIsNot(self.cache.get(1., (4, 4), b_0=2.), kernel, msg='b_0 should matter!')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        kernel_ref = Kernel(1., (4, 4))
+        assert_allclose(kernel.u_fft, kernel_ref.u_fft, err_msg='Unexpected behavior in u_fft')
+
+    def test_disk(self):
+        kernel_ref = self.cache.get(1., (5, 6), prw_vec=(1, 2))
+        cache = KernelCache(path=self.tmpdir.name)
+        kernel = cache.get(1., (5, 6), prw_vec=(1, 2))
+        self.assertEqual((cache.hits, cache.misses), (1, 0), msg='Kernel should be loaded!')
+        for name in Kernel.SHARED_ARRAYS:
+            assert_allclose(getattr(kernel, name), getattr(kernel_ref, name),
+                            err_msg='Unexpected behavior in {}'.format(name))
+        self.assertEqual(kernel.slice_phase, kernel_ref.slice_phase)
+
+    def test_eviction(self):
+        cache = KernelCache(max_memory=1.5 * Kernel(1., (4, 4)).nbytes)
+        cache.get(1., (4, 4))
+        cache.get(2., (4, 4))
+        self.assertEqual(len(cache), 1, msg='Least recently used kernel should be evicted!')
+        self.assertLessEqual(cache.memory, cache.max_memory)
+
+    def test_disk_eviction(self):
+        self.cache.get(1., (4, 4))
+        self.cache.get(2., (4, 4))
+        filenames = [self.cache._get_filename(self.cache.get_key(a, (4, 4))) for a in (1., 2., 3.)]
+        for i, filename in enumerate(filenames[:2]):
+            os.utime(filename, (i, i))  # Second kernel is the most recently used...
+        size = os.path.getsize(filenames[0])
+        cache = KernelCache(path=self.tmpdir.name, max_disk=2.5 * size)
+        cache.get(1., (4, 4))  # ...until the first one is loaded again!
+        cache.get(3., (4, 4))
+        self.assertEqual([os.path.isfile(filename) for filename in filenames], [True, False, True],
+                         msg='Least recently used kernel file should be deleted!')
+        cache.clear(disk=True)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_shared(self):
+        cache = KernelCache(shared=True)
+        kernel = cache.get(1., (4, 4))
+        self.assertFalse(kernel.u_fft.flags.writeable, msg='Shared kernels should be read-only!')
+        state = pickle.dumps(kernel)
+        self.assertLess(len(state), kernel.nbytes, msg='Shared arrays should not be pickled!')
+        kernel_copy = pickle.loads(state)
+        for name in Kernel.SHARED_ARRAYS:
+            assert_allclose(getattr(kernel_copy, name), getattr(kernel, name),
+                            err_msg='Unexpected behavior in shared {}'.format(name))
@@ -7,6 +7,7 @@ import unittest
 import numpy as np
 from numpy.testing import assert_allclose
 
+from pyramid import fft
 from pyramid.kernel import Kernel, KernelCharge
 from pyramid.phasemapper import PhaseMapperRDFC, PhaseMapperFDFC, PhaseMapperMIP, PhaseMapperCharge
 from pyramid import load_phasemap, load_vectordata, load_scalardata
@@ -49,6 +50,134 @@ class TestCasePhaseMapperRDFC(unittest.TestCase):
         assert_allclose(jac_T, jac_T_ref, atol=1E-7,
                         err_msg='Unexpected behaviour in the the transposed jacobi matrix!')
 
+    def test_PhaseMapperRDFC_jac_dot_batch(self):
+        vectors = np.random.RandomState(42).rand(3, self.mapper.n)
+        result_ref = np.array([self.mapper.jac_dot(vector) for vector in vectors])
+        for _ in range(2):  # Batch buffers are reused!
+            assert_allclose(self.mapper.jac_dot_batch(vectors), result_ref, atol=1E-7,
+                            err_msg='Inconsistency between jac_dot() and jac_dot_batch()!')
+
+    def test_PhaseMapperRDFC_jac_T_dot_batch(self):
+        vectors = np.random.RandomState(42).rand(3, self.mapper.m)
+        result_ref = np.array([self.mapper.jac_T_dot(vector) for vector in vectors])
+        for _ in range(2):  # Batch buffers are reused!
+            assert_allclose(self.mapper.jac_T_dot_batch(vectors), result_ref, atol=1E-7,
+                            err_msg='Inconsistency between jac_T_dot() and jac_T_dot_batch()!')
+
+    def test_PhaseMapperRDFC_packed(self):
+        phase_ref = load_phasemap(os.path.join(self.path, 'phasemap.hdf5'))
+        jac_ref = np.load(os.path.join(self.path, 'jac.npy'))
+        for buffered in (False, True):
+            mapper = PhaseMapperRDFC(self.mapper.kernel, packed=True, buffered=buffered)
+            assert_allclose(mapper(self.mag_proj).phase, phase_ref.phase, atol=1E-7,
+                            err_msg='Unexpected behavior in packed __call__()!')
+            n, m = mapper.n, mapper.m
+            jac = np.array([mapper.jac_dot(np.eye(n)[:, i]) for i in range(n)]).T
+            jac_T = np.array([mapper.jac_T_dot(np.eye(m)[:, i]) for i in range(m)]).T
+            assert_allclose(jac, jac_ref, atol=1E-7,
+                            err_msg='Unexpected behaviour in the the packed jacobi matrix!')
+            assert_allclose(jac_T, jac_ref.T, atol=1E-7,
+                            err_msg='Unexpected behaviour in the the packed transposed jacobi '
+                                    'matrix!')
+
+    def test_PhaseMapperRDFC_packed_lean(self):
+        kernel = Kernel(self.mag_proj.a, self.mag_proj.dim[1:], lean=True)
+        mapper = PhaseMapperRDFC(kernel, packed=True)
+        self.assertEqual(len(kernel._regenerated), 0,
+                         msg='The packed kernel spectrum should only use the kernel spectra!')
+        kernel_fft = np.fft.fftn(self.mapper.kernel.u - 1j * self.mapper.kernel.v, kernel.dim_pad)
+        assert_allclose(mapper.kernel_fft_conj, np.conj(kernel_fft), atol=1E-6,
+                        err_msg='Unexpected spectrum of the packed kernel!')
+
+    def test_PhaseMapperRDFC_buffered(self):
+        mapper = PhaseMapperRDFC(self.mapper.kernel, buffered=True)
+        phase_ref = load_phasemap(os.path.join(self.path, 'phasemap.hdf5'))
+        assert_allclose(mapper(self.mag_proj).phase, phase_ref.phase, atol=1E-7,
+                        err_msg='Unexpected behavior in buffered __call__()!')
+        n, m = mapper.n, mapper.m
+        jac = np.array([mapper.jac_dot(np.eye(n)[:, i]) for i in range(n)]).T
+        jac_T = np.empty((n, m))
+        for i in range(m):
+            mapper.jac_T_dot(np.eye(m)[:, i], out=jac_T.T[i])
+        jac_ref = np.load(os.path.join(self.path, 'jac.npy'))
+        assert_allclose(jac, jac_ref, atol=1E-7,
+                        err_msg='Unexpected behaviour in the the buffered jacobi matrix!')
+        assert_allclose(jac_T, jac_ref.T, atol=1E-7,
+                        err_msg='Unexpected behaviour in the buffered transposed jacobi matrix!')
+
+    @unittest.skipIf(fft.pyfftw is None, 'pyFFTW is not installed')
+    def test_PhaseMapperRDFC_buffered_fftw(self):
+        backend = fft.BACKEND
+        fft.configure_backend('fftw')
+        try:
+            mapper = PhaseMapperRDFC(self.mapper.kernel, buffered=True)
+            n, m = mapper.n, mapper.m
+            jac_ref = np.load(os.path.join(self.path, 'jac.npy'))
+            for _ in range(2):  # The plans on the buffers are reused!
+                jac = np.array([mapper.jac_dot(np.eye(n)[:, i]) for i in range(n)]).T
+                jac_T = np.empty((n, m))
+                for i in range(m):
+                    mapper.jac_T_dot(np.eye(m)[:, i], out=jac_T.T[i])
+                assert_allclose(jac, jac_ref, atol=1E-6,
+                                err_msg='Unexpected behaviour in the buffered FFTW jacobi matrix!')
+                assert_allclose(jac_T, jac_ref.T, atol=1E-6,
+                                err_msg='Unexpected behaviour in the buffered FFTW transposed '
+                                        'jacobi matrix!')
+            outputs = [plan.get_output_array() for plan, _ in fft.plans.cache.values()]
+            for name in ('u_mag_fft', 'v_mag_fft', 'phase', 'phase_adj_fft', 'mag_adj'):
+                self.assertTrue(any(out is getattr(mapper, name) for out in outputs),
+                                msg='FFTW should write directly into {}!'.format(name))
+        finally:
+            fft.configure_backend(backend)
+
+    def test_PhaseMapperRDFC_workers(self):
+        mapper = PhaseMapperRDFC(self.mapper.kernel, workers=1)
+        vector, vector_T = np.random.rand(mapper.n), np.random.rand(mapper.m)
+        assert_allclose(mapper.jac_dot(vector), self.mapper.jac_dot(vector), atol=1E-7,
+                        err_msg='Unexpected behaviour in jac_dot() with one FFT thread!')
+        assert_allclose(mapper.jac_T_dot(vector_T), self.mapper.jac_T_dot(vector_T), atol=1E-7,
+                        err_msg='Unexpected behaviour in jac_T_dot() with one FFT thread!')
+
+    def test_PhaseMapperRDFC_dtype(self):
+        self.assertEqual(self.mapper.kernel.u_fft.dtype, np.complex64,
+                         msg='Kernel spectra should keep single precision!')
+        backend = fft.BACKEND
+        for test_backend in ('scipy', 'fftw'):  # The numpy backend always uses double precision
+            if test_backend == 'fftw' and fft.pyfftw is None:
+                continue
+            fft.configure_backend(test_backend)
+            try:
+                for mapper in (self.mapper, PhaseMapperRDFC(self.mapper.kernel, buffered=True)):
+                    msg = 'Output of {{}} should be float32 (buffered={}, backend={})!'.format(
+                        mapper.buffered, test_backend)
+                    self.assertEqual(mapper(self.mag_proj).phase.dtype, np.float32,
+                                     msg=msg.format('__call__()'))
+                    self.assertEqual(mapper.jac_dot(np.ones(mapper.n)).dtype, np.float32,
+                                     msg=msg.format('jac_dot()'))
+                    self.assertEqual(mapper.jac_T_dot(np.ones(mapper.m)).dtype, np.float32,
+                                     msg=msg.format('jac_T_dot()'))
+            finally:
+                fft.configure_backend(backend)
+
+    def test_PhaseMapperRDFC_backends(self):
+        phase_ref = load_phasemap(os.path.join(self.path, 'phasemap.hdf5'))
+        jac_ref = np.load(os.path.join(self.path, 'jac.npy'))
+        backend = fft.BACKEND
+        for test_backend in ('numpy', 'scipy'):
+            fft.configure_backend(test_backend, workers=2)
+            msg = 'Unexpected behavior in {{}} with the {} backend!'.format(test_backend)
+            try:
+                assert_allclose(self.mapper(self.mag_proj).phase, phase_ref.phase, atol=1E-6,
+                                err_msg=msg.format('__call__()'))
+                m = self.mapper.m
+                jac_T = np.array([self.mapper.jac_T_dot(np.eye(m)[:, i]) for i in range(m)]).T
+                assert_allclose(jac_T, jac_ref.T, atol=1E-6, err_msg=msg.format('jac_T_dot()'))
+            finally:
+                fft.configure_backend(backend)
+        if fft.scipy_fft is not None:  # Single precision is kept:
+            self.assertEqual(fft.rfftn(np.zeros((4, 4), dtype=fft.FLOAT), workers=2).dtype,
+                             fft.COMPLEX)
+
 
 class TestCasePhaseMapperFDFCpad0(unittest.TestCase):
     def setUp(self):
@@ -81,7 +210,18 @@ class TestCasePhaseMapperFDFCpad0(unittest.TestCase):
                         err_msg='Unexpected behaviour in the the jacobi matrix!')
 
     def test_PhaseMapperFDFC_jac_T_dot(self):
-        self.assertRaises(NotImplementedError, self.mapper.jac_T_dot, None)
+        m = self.mapper.m
+        jac_T = np.array([self.mapper.jac_T_dot(np.eye(m)[:, i]) for i in range(m)]).T
+        jac_T_ref = np.load(os.path.join(self.path, 'jac_fc.npy')).T
+        assert_allclose(jac_T, jac_T_ref, atol=1E-7,
+                        err_msg='Unexpected behaviour in the the transposed jacobi matrix!')
+
+    def test_PhaseMapperFDFC_jac_T_dot_odd(self):
+        mapper = PhaseMapperFDFC(self.mag_proj.a, (5, 7), padding=1)
+        vector, vector_adj = np.random.RandomState(42).rand(2, mapper.n)
+        assert_allclose(np.dot(mapper.jac_dot(vector), vector_adj[:mapper.m]),
+                        np.dot(vector, mapper.jac_T_dot(vector_adj[:mapper.m])), rtol=1E-6,
+                        err_msg='jac_T_dot() is not the adjoint of jac_dot() for odd dimensions!')
 
 
 class TestCasePhaseMapperFDFCpad1(unittest.TestCase):
@@ -115,7 +255,11 @@ class TestCasePhaseMapperFDFCpad1(unittest.TestCase):
                         err_msg='Unexpected behaviour in the the jacobi matrix!')
 
     def test_PhaseMapperFDFC_jac_T_dot(self):
-        self.assertRaises(NotImplementedError, self.mapper.jac_T_dot, None)
+        m = self.mapper.m
+        jac_T = np.array([self.mapper.jac_T_dot(np.eye(m)[:, i]) for i in range(m)]).T
+        jac_T_ref = np.load(os.path.join(self.path, 'jac_fc_pad1.npy')).T
+        assert_allclose(jac_T, jac_T_ref, atol=1E-7,
+                        err_msg='Unexpected behaviour in the the transposed jacobi matrix!')
 
 
 class TestCasePhaseMapperFDFCpad10(unittest.TestCase):
@@ -149,7 +293,11 @@ class TestCasePhaseMapperFDFCpad10(unittest.TestCase):
                         err_msg='Unexpected behaviour in the the jacobi matrix!')
 
     def test_PhaseMapperFDFC_jac_T_dot(self):
-        self.assertRaises(NotImplementedError, self.mapper.jac_T_dot, None)
+        m = self.mapper.m
+        jac_T = np.array([self.mapper.jac_T_dot(np.eye(m)[:, i]) for i in range(m)]).T
+        jac_T_ref = np.load(os.path.join(self.path, 'jac_fc_pad10.npy')).T
+        assert_allclose(jac_T, jac_T_ref, atol=1E-7,
+                        err_msg='Unexpected behaviour in the the transposed jacobi matrix!')
 
 
 class TestCasePhaseMapperMIP(unittest.TestCase):
@@ -171,10 +319,17 @@ class TestCasePhaseMapperMIP(unittest.TestCase):
         assert_allclose(phasemap.a, phase_ref.a, err_msg='Unexpected behavior in __call__()!')
 
     def test_jac_dot(self):
-        self.assertRaises(NotImplementedError, self.mapper.jac_dot, None)
+        phase = self.mapper(self.elec_proj).phase
+        thickness_vec = self.elec_proj.get_mask(self.mapper.threshold).ravel().astype(float)
+        phase_jac = self.mapper.jac_dot(thickness_vec).reshape(self.mapper.dim_uv)
+        assert_allclose(phase_jac, phase, atol=1E-7,
+                        err_msg='Inconsistency between __call__() and jac_dot()!')
 
     def test_jac_T_dot(self):
-        self.assertRaises(NotImplementedError, self.mapper.jac_T_dot, None)
+        vector = np.random.RandomState(42).rand(self.mapper.m)
+        jac = np.array([self.mapper.jac_dot(column) for column in np.eye(self.mapper.n)]).T
+        assert_allclose(self.mapper.jac_T_dot(vector), jac.T.dot(vector), atol=1E-7,
+                        err_msg='Unexpected behaviour in the transposed jacobi matrix!')
 
 
 class TestCasePhaseMapperCharge(unittest.TestCase):
@@ -214,3 +369,20 @@ class TestCasePhaseMapperCharge(unittest.TestCase):
         jac_T_ref = np.load(os.path.join(self.path, 'jac_charge.npy')).T
         assert_allclose(jac_T, jac_T_ref, atol=1E-7,
                         err_msg='Unexpected behaviour in the the transposed jacobi matrix!')
+
+    def test_PhaseMapperCharge_buffered(self):
+        mapper = PhaseMapperCharge(self.mapper.kernelcharge, buffered=True)
+        phase_ref = load_phasemap(os.path.join(self.path, 'charge_phase_ref.hdf5'))
+        assert_allclose(mapper(self.charge_proj).phase, phase_ref.phase, atol=1E-7,
+                        err_msg='Unexpected behavior in buffered __call__()!')
+        n = mapper.n
+        jac = np.empty((n, n))
+        jac_T = np.empty((n, n))
+        for i in range(n):
+            mapper.jac_dot(np.eye(n)[:, i], out=jac.T[i])
+            mapper.jac_T_dot(np.eye(n)[:, i], out=jac_T.T[i])
+        jac_charge_ref = np.load(os.path.join(self.path, 'jac_charge.npy'))
+        assert_allclose(jac, jac_charge_ref, atol=1E-7,
+                        err_msg='Unexpected behaviour in the the buffered jacobi matrix!')
+        assert_allclose(jac_T, jac_charge_ref.T, atol=1E-7,
+                        err_msg='Unexpected behaviour in the buffered transposed jacobi matrix!')
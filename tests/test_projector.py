@@ -2,14 +2,22 @@
 """Testcase for the projector module."""
 
 import os
+import pickle
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 import numpy as np
 from numpy import pi
 from numpy.testing import assert_allclose
 
-from pyramid.projector import XTiltProjector, YTiltProjector, SimpleProjector
-from pyramid import load_vectordata
+from pyramid.fielddata import VectorData, ScalarData
+from pyramid.projector import (XTiltProjector, YTiltProjector, SimpleProjector, RotTiltProjector,
+                               MatrixFreeRotTiltProjector, StackedProjector, ProjectorCache,
+                               make_projectors)
+from pyramid import load_vectordata, load_projector
+from pyramid import projector as projector_module
 
 
 class TestCaseSimpleProjector(unittest.TestCase):
@@ -88,6 +96,60 @@ class TestCaseSimpleProjector(unittest.TestCase):
         assert_allclose(jac_T_x, jac_T_x_ref,
                         err_msg='Unexpected behaviour in the the transp. jacobi matrix! (x-axis)')
 
+    def test_csr_dot_fallback(self):
+        projector = XTiltProjector(self.magdata.dim, pi / 6)
+        rng = np.random.RandomState(42)
+        vectors = [rng.rand(projector.n), rng.rand(projector.m).astype(np.float32)]
+        fields = rng.rand(projector.size_3d, 4)
+        vector_uvs = rng.rand(3 * projector.size_2d)
+
+        def results():
+            return [projector.jac_dot(vectors[0]), projector.jac_T_dot(vectors[1]),
+                    projector.jac_dot_combined(fields), projector.jac_T_dot_combined(vector_uvs)]
+
+        def changed_signature(*args):
+            raise TypeError('changed signature')
+
+        results_ref = results()
+        for routine in (None, changed_signature):  # Missing or incompatible private routines:
+            with mock.patch.object(projector_module, '_csr_matvec', routine), \
+                    mock.patch.object(projector_module, '_csr_matvecs', routine):
+                for result, result_ref in zip(results(), results_ref):
+                    assert_allclose(result, result_ref, rtol=1E-6,
+                                    err_msg='Unexpected behaviour of the matrix.dot fallback!')
+
+    def test_SimpleProjector_weight(self):
+        vec = np.random.RandomState(42).rand(3 * self.proj_z.size_3d)
+        for axis in ('z', 'y', 'x'):
+            projector = SimpleProjector(self.magdata.dim, axis=axis, dim_uv=(9, 11))
+            weight = projector.weight
+            vec_uv = weight.dot(vec.reshape(3, -1).T).T
+            assert_allclose(projector.jac_dot(vec[:projector.size_3d]), vec_uv[0],
+                            err_msg='Unexpected behaviour in jac_dot() ({}-axis)'.format(axis))
+            proj_vec = np.random.RandomState(42).rand(projector.size_2d)
+            assert_allclose(projector.jac_T_dot(proj_vec), weight.T.dot(proj_vec),
+                            err_msg='Unexpected behaviour in jac_T_dot() ({}-axis)'.format(axis))
+            with tempfile.TemporaryDirectory() as tmpdir:
+                filename = os.path.join(tmpdir, 'projector.hdf5')
+                projector.save(filename)
+                projector_load = load_projector(filename)
+            assert_allclose(projector_load.jac_dot(vec), projector.jac_dot(vec),
+                            err_msg='Unexpected behaviour in save/load! ({}-axis)'.format(axis))
+
+    def test_SimpleProjector_compress(self):
+        mask = np.random.RandomState(42).rand(*self.magdata.dim) > 0.5
+        vec = self.magdata.field_vec
+        vec_comp = vec.reshape(3, -1)[:, mask.ravel()].ravel()
+        for projector in (self.proj_z, self.proj_y, self.proj_x):
+            projector_comp = projector.compress(mask)
+            vec_masked = (vec.reshape(3, -1) * mask.ravel()).ravel()
+            assert_allclose(projector_comp.jac_dot(vec_comp), projector.jac_dot(vec_masked),
+                            err_msg='Unexpected behaviour in compress()!')
+            proj_vec = np.random.RandomState(42).rand(projector.m)
+            assert_allclose(projector_comp.jac_T_dot(proj_vec),
+                            projector.jac_T_dot(proj_vec).reshape(3, -1)[:, mask.ravel()].ravel(),
+                            err_msg='Unexpected behaviour in compress()!')
+
 @unittest.skip("Not implemented")
 class TestCaseXTiltProjector(unittest.TestCase):
     def setUp(self):
@@ -255,4 +317,294 @@ class TestCaseYTiltProjector(unittest.TestCase):
                         err_msg='Unexpected behaviour in the the transp. jacobi matrix! (90°)')
 
 
-# TODO: Test RotTiltProjector!!!
+class TestCaseTiltWeights(unittest.TestCase):
+    """Compare the tilt weights with the ones of the former per-voxel loop."""
+
+    # (dim, tilt, dim_uv, r), stored as 'x<i>' and 'y<i>' in ref_tilt_weights.npz:
+    CASES = [((4, 5, 6), 0.3, None, 0.5), ((4, 5, 6), -1.1, None, 0.5),
+             ((5, 7, 3), 2.6, (9, 9), 0.7), ((3, 4, 5), pi / 2, None, 0.3)]
+
+    def setUp(self):
+        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test_projector')
+        self.ref = np.load(os.path.join(self.path, 'ref_tilt_weights.npz'))
+
+    def tearDown(self):
+        self.path = None
+        self.ref = None
+
+    def test_weights(self):
+        for name, cls in (('x', XTiltProjector), ('y', YTiltProjector)):
+            for i, (dim, tilt, dim_uv, r) in enumerate(self.CASES):
+                weight = cls(dim, tilt, dim_uv, True, r).weight.toarray()  # Old positions!
+                assert_allclose(weight, self.ref['{}{}'.format(name, i)], atol=1e-12,
+                                err_msg='Unexpected weights of {}!'.format(cls.__name__))
+
+
+class TestCaseRotTiltProjector(unittest.TestCase):
+    def setUp(self):
+        self.dim = (6, 7, 8)
+
+    def tearDown(self):
+        self.dim = None
+
+    def assert_weights_equal(self, weight, weight_ref, err_msg):
+        np.testing.assert_array_equal(weight.indptr, weight_ref.indptr, err_msg=err_msg)
+        np.testing.assert_array_equal(weight.indices, weight_ref.indices, err_msg=err_msg)
+        np.testing.assert_array_equal(weight.data, weight_ref.data, err_msg=err_msg)
+
+    def test_legacy_pickle(self):
+        # Projectors pickled by older versions stored `weight` directly (no caches or buffers):
+        for projector in (RotTiltProjector(self.dim, pi / 4, 0.3, subcount=5),
+                          SimpleProjector(self.dim, axis='y')):
+            state = {key: value for key, value in projector.__dict__.items()
+                     if key not in ('_weight', '_weight_T', '_buffers', 'window', 'compressed')}
+            state['weight'] = projector.weight
+            projector_old = projector.__class__.__new__(projector.__class__)
+            projector_old.__setstate__(state)
+            vector = np.random.RandomState(42).rand(projector.n)
+            vector_T = np.random.RandomState(42).rand(projector.m)
+            for proj in (projector_old, pickle.loads(pickle.dumps(projector_old))):
+                self.assert_weights_equal(proj.weight, projector.weight,
+                                          err_msg='Unexpected weight of an old pickle!')
+                assert_allclose(proj.jac_dot(vector), projector.jac_dot(vector),
+                                err_msg='Unexpected behaviour in jac_dot() of an old pickle!')
+                assert_allclose(proj.jac_T_dot(vector_T), projector.jac_T_dot(vector_T),
+                                err_msg='Unexpected behaviour in jac_T_dot() of an old pickle!')
+
+    def test_RotTiltProjector_vectorized(self):
+        kwargs_list = [dict(rotation=0, tilt=0),
+                       dict(rotation=pi / 5, tilt=pi / 3, camera_rotation=0.2, subcount=5),
+                       dict(rotation=-1.1, tilt=0.4, dim_uv=(9, 11), R=0.7, center=(2.3, 3.9, 4.1))]
+        for kwargs in kwargs_list:
+            weight_ref = RotTiltProjector(self.dim, vectorized=False, **kwargs).weight
+            for chunk_size in (2, 3, 2**16):
+                weight = RotTiltProjector(self.dim, chunk_size=chunk_size, **kwargs).weight
+                self.assert_weights_equal(weight, weight_ref,
+                                          err_msg='Vectorized setup differs from loop! '
+                                                  '({}, chunk_size={})'.format(kwargs, chunk_size))
+
+    def test_RotTiltProjector_jac_dot(self):
+        projector = RotTiltProjector(self.dim, pi / 5, pi / 3, subcount=5)
+        weight = projector.weight.toarray()
+        jac = np.kron(np.asarray(projector.coeff), weight)  # Explicit jacobi matrix
+        vector = np.random.rand(projector.n)
+        assert_allclose(projector.jac_dot(vector), jac.dot(vector),
+                        err_msg='Unexpected behaviour in jac_dot()!')
+        out = np.empty(projector.m)
+        projector.jac_dot(vector, out=out)
+        assert_allclose(out, jac.dot(vector), err_msg='Unexpected behaviour in jac_dot()!')
+        scalar = np.random.rand(projector.size_3d)
+        assert_allclose(projector.jac_dot(scalar), weight.dot(scalar),
+                        err_msg='Unexpected behaviour in jac_dot()!')
+
+    def test_RotTiltProjector_jac_T_dot(self):
+        projector = RotTiltProjector(self.dim, pi / 5, pi / 3, subcount=5)
+        weight = projector.weight.toarray()
+        jac = np.kron(np.asarray(projector.coeff), weight)  # Explicit jacobi matrix
+        vector = np.random.rand(projector.m)
+        assert_allclose(projector.jac_T_dot(vector), jac.T.dot(vector),
+                        err_msg='Unexpected behaviour in jac_T_dot()!')
+        out = np.empty(projector.n)
+        for _ in range(2):  # Output has to be overwritten, not accumulated:
+            projector.jac_T_dot(vector, out=out)
+        assert_allclose(out, jac.T.dot(vector), err_msg='Unexpected behaviour in jac_T_dot()!')
+        scalar = np.random.rand(projector.size_2d)
+        assert_allclose(projector.jac_T_dot(scalar), weight.T.dot(scalar),
+                        err_msg='Unexpected behaviour in jac_T_dot()!')
+
+    def test_RotTiltProjector_compact(self):
+        projector = RotTiltProjector(self.dim, pi / 5, pi / 3, subcount=5)
+        vector = np.random.rand(projector.n)
+        result_ref = projector.jac_dot(vector)
+        projector.compact()
+        self.assertEqual(projector.weight.dtype, np.float32)
+        self.assertEqual(projector.weight.indices.dtype, np.int32)
+        assert_allclose(projector.jac_dot(vector), result_ref, rtol=1E-5, atol=1E-5,
+                        err_msg='Unexpected behaviour in compact()!')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'projector.hdf5')
+            projector.save(filename)
+            projector_load = load_projector(filename)
+        self.assertEqual(projector_load.weight.dtype, np.float32)
+        self.assertEqual(projector_load.weight.indices.dtype, np.int32)
+
+class TestCaseMatrixFreeRotTiltProjector(unittest.TestCase):
+    def setUp(self):
+        self.dim = (6, 7, 8)
+        self.kwargs = dict(rotation=-1.1, tilt=0.4, camera_rotation=0.2, dim_uv=(9, 11), R=0.7,
+                           center=(2.3, 3.9, 4.1), subcount=5)
+        self.projector_ref = RotTiltProjector(self.dim, **self.kwargs)
+        self.projector = MatrixFreeRotTiltProjector(self.dim, chunk_size=37, **self.kwargs)
+
+    def tearDown(self):
+        self.dim = None
+        self.kwargs = None
+        self.projector_ref = None
+        self.projector = None
+
+    def test_MatrixFreeRotTiltProjector_weight(self):
+        assert_allclose(self.projector.weight.toarray(), self.projector_ref.weight.toarray(),
+                        err_msg='Unexpected behaviour in weight!')
+
+    def test_MatrixFreeRotTiltProjector_jac_dot(self):
+        vector = np.random.rand(self.projector.n)
+        assert_allclose(self.projector.jac_dot(vector), self.projector_ref.jac_dot(vector),
+                        err_msg='Unexpected behaviour in jac_dot()!')
+        scalar = vector[:self.projector.size_3d]
+        assert_allclose(self.projector.jac_dot(scalar), self.projector_ref.jac_dot(scalar),
+                        err_msg='Unexpected behaviour in jac_dot()!')
+
+    def test_MatrixFreeRotTiltProjector_jac_T_dot(self):
+        vector = np.random.rand(self.projector.m)
+        assert_allclose(self.projector.jac_T_dot(vector), self.projector_ref.jac_T_dot(vector),
+                        err_msg='Unexpected behaviour in jac_T_dot()!')
+        scalar = vector[:self.projector.size_2d]
+        assert_allclose(self.projector.jac_T_dot(scalar), self.projector_ref.jac_T_dot(scalar),
+                        err_msg='Unexpected behaviour in jac_T_dot()!')
+
+    def test_MatrixFreeRotTiltProjector_compress(self):
+        mask = np.zeros(self.dim, dtype=bool)
+        mask[1:-2, 2:-1, 3:-1] = True
+        projector = self.projector.compress(mask)
+        projector_ref = self.projector_ref.compress(mask)
+        vector = np.random.rand(projector.n)
+        assert_allclose(projector.jac_dot(vector), projector_ref.jac_dot(vector),
+                        err_msg='Unexpected behaviour in compressed jac_dot()!')
+        vector = np.random.rand(projector.m)
+        assert_allclose(projector.jac_T_dot(vector), projector_ref.jac_T_dot(vector),
+                        err_msg='Unexpected behaviour in compressed jac_T_dot()!')
+
+    def test_MatrixFreeRotTiltProjector_save_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'projector.hdf5')
+            self.projector.save(filename)
+            projector = load_projector(filename)
+        self.assertIsInstance(projector, MatrixFreeRotTiltProjector)
+        vector = np.random.rand(projector.n)
+        assert_allclose(projector.jac_dot(vector), self.projector.jac_dot(vector),
+                        err_msg='Unexpected behaviour in save/load!')
+
+class TestCaseStackedProjector(unittest.TestCase):
+    def setUp(self):
+        self.dim = (6, 7, 8)
+        self.projectors = [RotTiltProjector(self.dim, pi / 5, pi / 3, subcount=5),
+                           RotTiltProjector(self.dim, -1.1, 0.4, dim_uv=(9, 11), subcount=5),
+                           XTiltProjector(self.dim, pi / 6),
+                           SimpleProjector(self.dim, axis='x')]
+        self.projector = StackedProjector(self.projectors)
+
+    def tearDown(self):
+        self.dim = None
+        self.projectors = None
+        self.projector = None
+
+    def test_StackedProjector_jac_dot(self):
+        vector = np.random.rand(self.projector.n)
+        result_ref = np.concatenate([p.jac_dot(vector) for p in self.projectors])
+        assert_allclose(self.projector.jac_dot(vector), result_ref,
+                        err_msg='Unexpected behaviour in jac_dot()!')
+        hp = self.projector.hook_points
+        assert_allclose(self.projector.jac_dot(vector)[hp[1]:hp[2]], result_ref[hp[1]:hp[2]],
+                        err_msg='Unexpected behaviour in hook_points!')
+
+    def test_StackedProjector_jac_T_dot(self):
+        vector = np.random.rand(self.projector.m)
+        hp = self.projector.hook_points
+        result_ref = sum(p.jac_T_dot(vector[hp[i]:hp[i + 1]])
+                         for i, p in enumerate(self.projectors))
+        assert_allclose(self.projector.jac_T_dot(vector), result_ref,
+                        err_msg='Unexpected behaviour in jac_T_dot()!')
+
+    def test_StackedProjector_compress(self):
+        mask = np.zeros(self.dim, dtype=bool)
+        mask[1:-2, 2:-1, 3:-1] = True
+        projector = self.projector.compress(mask)
+        vector = np.random.rand(projector.n)
+        result_ref = np.concatenate([p.compress(mask).jac_dot(vector) for p in self.projectors])
+        assert_allclose(projector.jac_dot(vector), result_ref,
+                        err_msg='Unexpected behaviour in compressed jac_dot()!')
+
+    def test_StackedProjector_call(self):
+        field = np.random.rand(3, *self.dim)
+        results = self.projector(VectorData(1., field))
+        results_scalar = self.projector(ScalarData(1., field[0]))
+        for projector, result, result_scalar in zip(self.projectors, results, results_scalar):
+            assert_allclose(result.field, projector(VectorData(1., field)).field,
+                            err_msg='Unexpected behaviour in __call__()!')
+            assert_allclose(result_scalar.field, projector(ScalarData(1., field[0])).field,
+                            err_msg='Unexpected behaviour in scalar __call__()!')
+
+    def test_StackedProjector_combined(self):
+        fields = np.random.rand(self.projector.size_3d, 4)
+        result_ref = np.concatenate([p.jac_dot_combined(fields) for p in self.projectors])
+        assert_allclose(self.projector.jac_dot_combined(fields), result_ref,
+                        err_msg='Unexpected behaviour in jac_dot_combined()!')
+        vector = np.random.rand(3 * self.projector.size_2d)
+        hp = self.projector.hook_points_combined
+        result_ref = sum(p.jac_T_dot_combined(vector[hp[i]:hp[i + 1]])
+                         for i, p in enumerate(self.projectors))
+        assert_allclose(self.projector.jac_T_dot_combined(vector), result_ref,
+                        err_msg='Unexpected behaviour in jac_T_dot_combined()!')
+
+
+class TestCaseProjectorCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dim = (4, 5, 6)
+        self.cache = ProjectorCache(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        self.tmpdir = None
+        self.dim = None
+        self.cache = None
+
+    def test_get(self):
+        projector = self.cache.get(RotTiltProjector, self.dim, pi / 4, 0.3, subcount=5)
+        self.assertEqual(self.cache.misses, 1)
+        # Equivalent geometry, given in a different way, should hit the memory cache:
+        projector_mem = self.cache.get(RotTiltProjector, self.dim, rotation=pi / 4, tilt=0.3,
+                                       subcount=5.0, camera_rotation=0, verbose=True)
+        self.assertIs(projector_mem, projector)
+        self.assertEqual(self.cache.hits, 1)
+        # A new cache with the same path should load the projector from disk:
+        cache = ProjectorCache(self.tmpdir.name)
+        projector_disk = cache.get(RotTiltProjector, self.dim, pi / 4, 0.3, subcount=5)
+        self.assertEqual(cache.hits, 1)
+        self.assertIsInstance(projector_disk, RotTiltProjector)
+        assert_allclose(projector_disk.weight.toarray(), projector.weight.toarray(),
+                        err_msg='Unexpected behaviour in ProjectorCache (disk)!')
+        assert_allclose(projector_disk.center, projector.center,
+                        err_msg='Unexpected behaviour in ProjectorCache (disk)!')
+        # Different geometry should be constructed:
+        projector_new = self.cache.get(RotTiltProjector, self.dim, pi / 4, 0.4, subcount=5)
+        self.assertIsNot(projector_new, projector)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_eviction(self):
+        cache = ProjectorCache(self.tmpdir.name, max_memory=1, max_disk=1)
+        cache.get(RotTiltProjector, self.dim, 0, 0)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 0)
+
+    def test_make_projectors(self):
+        args_list = [(self.dim, pi / 4, tilt) for tilt in (-0.5, 0, 0.5)]
+        kwargs_list = [dict(subcount=5)] * 3
+        projectors_ref = [RotTiltProjector(*args, **kwargs)
+                          for args, kwargs in zip(args_list, kwargs_list)]
+        self.cache.get(RotTiltProjector, *args_list[1], **kwargs_list[1])
+        with ThreadPoolExecutor(2) as executor:
+            results = [make_projectors(RotTiltProjector, args_list, kwargs_list, n_jobs=2),
+                       make_projectors(RotTiltProjector, args_list, kwargs_list, executor=executor),
+                       make_projectors(RotTiltProjector, args_list, kwargs_list,
+                                       projector_cache=self.cache)]
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        for projectors in results:
+            for projector, projector_ref in zip(projectors, projectors_ref):
+                self.assertEqual(projector.tilt, projector_ref.tilt)
+                assert_allclose(projector.weight.toarray(), projector_ref.weight.toarray(),
+                                err_msg='Unexpected behaviour in make_projectors()!')
+        with self.assertRaises(ValueError):
+            make_projectors(RotTiltProjector, args_list, kwargs_list, n_jobs=0)
+        projectors = make_projectors(RotTiltProjector, args_list[:1], kwargs_list[:1], n_jobs=-2)
+        self.assertEqual(projectors[0].tilt, projectors_ref[0].tilt)